@@ -0,0 +1,349 @@
+"""
+Benchmark the pyrma hot paths on synthetic data and compare the results with
+a stored baseline.
+
+Usage
+-----
+    python benchmarks/run.py [--nodes 5000] [--frames 200] [--only rma_next]
+                             [--baseline benchmarks/baseline.json]
+                             [--save-baseline] [--tolerance 0.25]
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import synthetic
+from pyrma import RMA, Mesh, MakeRMA, RMA_bc, ProcessRMA
+
+MB = 1024.0 * 1024.0
+
+
+class Benchmark:
+    """
+    A single benchmark
+
+    ...
+    Attributes
+    ----------
+    name: str
+        name of the benchmark
+    setup: function
+        function(workdir, config) returning the state passed to run
+    run: function
+        function(state) doing the work and returning a dict of unit:amount
+        processed (e.g. {'frames': 100, 'MB': 12.5})
+    """
+    def __init__(self, name, setup, run):
+        self.name = name
+        self.setup = setup
+        self.run = run
+
+
+def _rma_file(workdir, config, rma_type):
+    filename = os.path.join(workdir, 'bench_{}.rma'.format(rma_type))
+    if not os.path.exists(filename):
+        synthetic.write_rma(filename, rma_type, config['nodes'], config['frames'])
+    return filename
+
+
+def _mesh_file(workdir, config):
+    filename = os.path.join(workdir, 'bench.rm1')
+    if not os.path.exists(filename):
+        synthetic.write_mesh(filename, config['nodes'])
+    return filename
+
+
+def _size(filename):
+    return os.path.getsize(filename) / MB
+
+
+def _setup_rma(rma_type):
+    def setup(workdir, config):
+        return {'filename': _rma_file(workdir, config, rma_type)}
+    return setup
+
+
+def _run_rma_next(state):
+    R = RMA(state['filename'], verbose=False)
+    frames = 0
+    while R.next():
+        frames += 1
+    R.close()
+    return {'frames': frames, 'MB': _size(state['filename'])}
+
+
+def _setup_export(rma_type):
+    def setup(workdir, config):
+        filename = _rma_file(workdir, config, rma_type)
+        step = max(1, config['nodes'] // config['export_nodes'])
+        return {'filename': filename,
+                'nodes': list(range(1, config['nodes'] + 1, step)),
+                # relative name: rma11_to_csv prefixes the constituent to it
+                'output': 'export_{}.csv'.format(rma_type)}
+    return setup
+
+
+def _run_export(method, **kwargs):
+    def run(state):
+        P = ProcessRMA([state['filename']], state['nodes'])
+        getattr(P, method)(state['output'], **kwargs)
+        frames = _num_frames(state['filename'])
+        return {'frames': frames, 'MB': _size(state['filename'])}
+    return run
+
+
+def _num_frames(filename):
+    R = RMA(filename, verbose=False)
+    R.close()
+    return R.num_frames
+
+
+def _setup_mesh(workdir, config):
+    filename = _mesh_file(workdir, config)
+    return {'filename': filename, 'mesh': Mesh(filename),
+            'output': os.path.join(workdir, 'bench_saved.rm1'),
+            'queries': config['queries']}
+
+
+def _run_mesh_parse(state):
+    M = Mesh(state['filename'])
+    return {'nodes': len(M.nodes_list), 'MB': _size(state['filename'])}
+
+
+def _run_xy_to_node(state):
+    M = state['mesh']
+    xs = [M.nodes[n]['x'] + 1.0 for n in M.nodes_list[:state['queries']]]
+    ys = [M.nodes[n]['y'] + 1.0 for n in M.nodes_list[:state['queries']]]
+    for x, y in zip(xs, ys):
+        M.xy_to_node(x, y)
+    return {'queries': len(xs), 'nodes': len(xs) * len(M.nodes_list)}
+
+
+def _run_save_mesh(state):
+    state['mesh'].save_mesh(state['output'])
+    return {'nodes': len(state['mesh'].nodes_list), 'MB': _size(state['output'])}
+
+
+def _setup_bc(workdir, config):
+    elements = list(range(1, config['bc_elements'] + 1))
+    elt = os.path.join(workdir, 'bench.elt')
+    wqg = os.path.join(workdir, 'bench.wqg')
+    synthetic.write_elt(elt, elements, num_days=config['bc_days'])
+    synthetic.write_wqg(wqg, elements, num_days=config['bc_days'])
+    bc = RMA_bc()
+    bc.read_elts([elt])
+    bc.read_wqgs([wqg], ['SALIN', 'TEMP'])
+    return {'elt': elt, 'wqg': wqg, 'bc': bc,
+            'output_dir': os.path.join(workdir, 'bench_bc')}
+
+
+def _run_read_elts(state):
+    bc = RMA_bc()
+    bc.read_elts([state['elt']])
+    return {'records': bc.df.size, 'MB': _size(state['elt'])}
+
+
+def _run_read_wqgs(state):
+    bc = RMA_bc()
+    bc.read_wqgs([state['wqg']], ['SALIN', 'TEMP'])
+    return {'records': sum(len(df) for df in bc.df_wq_dict.values()), 'MB': _size(state['wqg'])}
+
+
+def _run_create_elts(state):
+    state['bc'].create_elts(state['output_dir'])
+    return {'records': state['bc'].df.size}
+
+
+def _run_create_wqgs(state):
+    state['bc'].create_wqgs(state['output_dir'])
+    return {'records': sum(len(df) for df in state['bc'].df_wq_dict.values())}
+
+
+def _setup_makerma(workdir, config):
+    rm2 = os.path.join(workdir, 'template.rm2')
+    r11 = os.path.join(workdir, 'template.r11')
+    synthetic.write_template(rm2)
+    synthetic.write_template(r11)
+    return {'rm2': rm2, 'r11': r11, 'years': config['years'],
+            'output_dir': os.path.join(workdir, 'bench_runfiles')}
+
+
+def _run_makerma(state):
+    start = datetime(2000, 1, 1)
+    end = datetime(2000 + state['years'] - 1, 12, 31)
+    MakeRMA(state['rm2']).generate_rm2(start, end, state['output_dir'])
+    MakeRMA(state['r11']).generate_r11(start, end, state['output_dir'])
+    return {'years': 2 * state['years']}
+
+
+BENCHMARKS = [
+    Benchmark('rma_next_rma2', _setup_rma('RMA2'), _run_rma_next),
+    Benchmark('rma_next_rma10', _setup_rma('RMA10'), _run_rma_next),
+    Benchmark('rma_next_rma11', _setup_rma('RMA11'), _run_rma_next),
+    Benchmark('rma2_to_csv', _setup_export('RMA2'), _run_export('rma2_to_csv')),
+    Benchmark('rma10_to_csv', _setup_export('RMA10'), _run_export('rma10_to_csv')),
+    Benchmark('rma11_to_csv', _setup_export('RMA11'), _run_export('rma11_to_csv')),
+    Benchmark('mesh_parse', _setup_mesh, _run_mesh_parse),
+    Benchmark('mesh_xy_to_node', _setup_mesh, _run_xy_to_node),
+    Benchmark('mesh_save', _setup_mesh, _run_save_mesh),
+    Benchmark('bc_read_elts', _setup_bc, _run_read_elts),
+    Benchmark('bc_read_wqgs', _setup_bc, _run_read_wqgs),
+    Benchmark('bc_create_elts', _setup_bc, _run_create_elts),
+    Benchmark('bc_create_wqgs', _setup_bc, _run_create_wqgs),
+    Benchmark('makerma_generate', _setup_makerma, _run_makerma),
+]
+
+
+def run_benchmark(benchmark, workdir, config, repeat=3):
+    """
+    Parameters
+    ----------
+    benchmark : Benchmark
+        benchmark to run
+    workdir : str
+        folder holding the synthetic data
+    config : dict
+        size of the synthetic data
+    repeat : int
+        number of timed runs (the best one is kept)
+
+    Returns
+    -------
+    dict with the best time (s), the throughput per unit and the peak memory (MB)
+    """
+    state = benchmark.setup(workdir, config)
+    best = None
+    amounts = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        amounts = benchmark.run(state)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # separate run so that tracemalloc does not distort the timings
+    tracemalloc.start()
+    benchmark.run(state)
+    peak = tracemalloc.get_traced_memory()[1] / MB
+    tracemalloc.stop()
+
+    throughput = {'{}/s'.format(unit): amount / best for unit, amount in amounts.items()}
+    return {'time': best, 'throughput': throughput, 'peak_MB': peak}
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Parameters
+    ----------
+    results : dict
+        benchmark name: result from run_benchmark
+    baseline : dict
+        stored results
+    tolerance : float
+        relative slow down (or memory increase) accepted before flagging a
+        regression
+
+    Returns
+    -------
+    list of (name, message) of the regressions
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or 'error' in result or 'error' in baseline[name]:
+            continue
+        ref = baseline[name]
+        if result['time'] > ref['time'] * (1 + tolerance):
+            regressions.append((name, 'time {:.3f}s vs {:.3f}s'.format(result['time'], ref['time'])))
+        if result['peak_MB'] > ref['peak_MB'] * (1 + tolerance) + 1.0:
+            regressions.append((name, 'peak memory {:.1f}MB vs {:.1f}MB'.format(result['peak_MB'], ref['peak_MB'])))
+    return regressions
+
+
+def _format(name, result, ref=None):
+    if 'error' in result:
+        return '{:<20} ERROR {}'.format(name, result['error'])
+    rates = ', '.join('{:.1f} {}'.format(v, k) for k, v in result['throughput'].items())
+    line = '{:<20} {:>9.4f}s {:>8.1f}MB  {}'.format(name, result['time'], result['peak_MB'], rates)
+    if ref and 'error' not in ref:
+        line += '  ({:+.1f}% vs baseline)'.format(100.0 * (result['time'] / ref['time'] - 1))
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark pyrma on synthetic data')
+    parser.add_argument('--nodes', type=int, default=5000, help='number of mesh/result nodes')
+    parser.add_argument('--frames', type=int, default=200, help='number of timesteps per result file')
+    parser.add_argument('--export-nodes', type=int, default=100, help='number of nodes exported to csv')
+    parser.add_argument('--queries', type=int, default=50, help='number of xy_to_node queries')
+    parser.add_argument('--bc-elements', type=int, default=5, help='number of boundary elements')
+    parser.add_argument('--bc-days', type=int, default=30, help='number of days in the boundary files')
+    parser.add_argument('--years', type=int, default=10, help='number of years generated by MakeRMA')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs per benchmark')
+    parser.add_argument('--only', nargs='*', help='names (or prefixes) of the benchmarks to run')
+    parser.add_argument('--baseline', default=os.path.join(HERE, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--workdir', help='folder for the synthetic data (default: temporary folder)')
+    args = parser.parse_args(argv)
+
+    config = {'nodes': args.nodes, 'frames': args.frames, 'export_nodes': args.export_nodes,
+              'queries': args.queries, 'bc_elements': args.bc_elements,
+              'bc_days': args.bc_days, 'years': args.years}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored.get('config') == config:
+            baseline = stored['results']
+        else:
+            print('Baseline {} was made with a different configuration - not compared'.format(args.baseline))
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='pyrma_bench_')
+    if not os.path.exists(workdir):
+        os.makedirs(workdir)
+
+    results = {}
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for benchmark in BENCHMARKS:
+            if args.only and not any(benchmark.name.startswith(o) for o in args.only):
+                continue
+            try:
+                results[benchmark.name] = run_benchmark(benchmark, workdir, config, args.repeat)
+            except Exception as e:
+                results[benchmark.name] = {'error': '{}: {}'.format(type(e).__name__, e)}
+            print(_format(benchmark.name, results[benchmark.name], baseline.get(benchmark.name)))
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = compare(results, baseline, args.tolerance)
+    for name, message in regressions:
+        print('REGRESSION {}: {}'.format(name, message))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'config': config, 'results': results}, f, indent=2)
+        print('Baseline saved to {}'.format(args.baseline))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""
+Generate synthetic RMA Modelling Suite inputs and results of configurable size
+for benchmarking: RMA2/RMA10/RMA11 result files (*.rma), meshes (*.rm1),
+boundary files (*.elt, *.wqg) and MakeRMA templates.
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import calendar
+import os
+from datetime import datetime, timedelta
+from struct import pack
+
+import numpy as np
+
+RMA_TYPES = ['RMA2', 'RMA10', 'RMA11']
+
+
+def grid_shape(num_nodes):
+    """
+    Parameters
+    ----------
+    num_nodes : int
+        approximate number of mesh nodes
+
+    Returns
+    -------
+    number of quadratic elements along x and y so that the mesh holds about
+    num_nodes nodes
+    """
+    # a nx x ny grid of 8-node quads holds about 3 * nx * ny nodes
+    n = max(1, int(round((num_nodes / 3.0) ** 0.5)))
+    return n, n
+
+
+def _grid_nodes(nx, ny):
+    """
+    Number the nodes of a nx x ny grid of 8-node quads (corner and mid-side
+    nodes only)
+
+    Returns
+    -------
+    dict of (i,j):node number and list of (node, x, y)
+    """
+    numbers = {}
+    coords = []
+    n = 0
+    for j in range(2 * ny + 1):
+        for i in range(2 * nx + 1):
+            if i % 2 and j % 2:
+                continue
+            n += 1
+            numbers[(i, j)] = n
+            coords.append((n, 10.0 * i, 10.0 * j))
+    return numbers, coords
+
+
+def write_mesh(filename, num_nodes=1000, num_1d=10):
+    """
+    Parameters
+    ----------
+    filename : str
+        name of the mesh file (*.rm1) to create
+    num_nodes : int
+        approximate number of nodes of the 2D part of the mesh
+    num_1d : int
+        number of 1D channel elements attached to the mesh
+
+    Returns
+    -------
+    number of nodes and number of elements written
+    """
+    nx, ny = grid_shape(num_nodes)
+    numbers, coords = _grid_nodes(nx, ny)
+
+    elements = []
+    for ej in range(ny):
+        for ei in range(nx):
+            i, j = 2 * ei, 2 * ej
+            ring = [(i, j), (i + 1, j), (i + 2, j), (i + 2, j + 1),
+                    (i + 2, j + 2), (i + 1, j + 2), (i, j + 2), (i, j + 1)]
+            elements.append(([numbers[p] for p in ring], 1))
+
+    channel = {}
+    node = len(coords)
+    first = numbers[(0, 0)]
+    for k in range(num_1d):
+        mid, end = node + 1, node + 2
+        coords.append((mid, -10.0 * (2 * k + 1), 0.0))
+        coords.append((end, -10.0 * (2 * k + 2), 0.0))
+        channel[mid] = channel[end] = [20.0, 0.0, 2.0, 2.0, 0.0, 0.0]
+        elements.append(([first, mid, end], 2))
+        first = end
+        node = end
+
+    with open(filename, 'w') as f:
+        f.write('SYNTHETIC MESH\n')
+        f.write('{:>10}{:>10}\n'.format(len(elements), len(coords)))
+        f.write('\n')
+        for e, (nodes, el_type) in enumerate(elements, start=1):
+            fields = ''.join('{:>5}'.format(n) for n in nodes + [0] * (8 - len(nodes)))
+            f.write('{:>5}{}{:>5}    0\n'.format(e, fields, el_type))
+        f.write(' 9999\n')
+        for n, x, y in coords:
+            z = -1.0 - 0.001 * y
+            if n in channel:
+                f.write('{:>10.0f}{:>16.3f}{:>20.3f}{:>14.3f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}         0    0.0000\n'.format(
+                        n, x, y, z, *channel[n]))
+            else:
+                f.write('{:>10.0f}{:>16.3f}{:>20.3f}{:>14.3f}                                                                     0    0.0000\n'.format(
+                        n, x, y, z))
+        f.write('      9999\n')
+        f.write('END OF MESH\n')
+
+    return len(coords), len(elements)
+
+
+def _header(rma_type, num_nodes, num_elements, constituents=()):
+    """
+    Build the 1000 bytes header of a RMA result file
+    """
+    header = [' '] * 1000
+
+    def put(start, text):
+        header[start:start + len(text)] = list(text)
+
+    put(0, '{:<10}'.format(rma_type))
+    put(40, '{:>10}'.format(num_nodes))
+    put(50, '{:>10}'.format(num_elements))
+    if rma_type == 'RMA11':
+        put(60, '{:>10}'.format(len(constituents)))
+        put(80, '{:>10}'.format(0))
+        for i, name in enumerate(constituents):
+            put(300 + 8 * i, '{:>8}'.format(name[:8]))
+    put(100, '{:<72}'.format('SYNTHETIC {} RESULTS'.format(rma_type)))
+    put(200, '{:<100}'.format('synthetic.rm1'))
+    return ''.join(header).encode('utf-8')
+
+
+def write_rma(filename, rma_type='RMA2', num_nodes=1000, num_frames=100,
+              num_elements=None, constituents=('SALINITY',), year=2000,
+              start_hour=0.0, timestep=0.25, seed=0):
+    """
+    Parameters
+    ----------
+    filename : str
+        name of the result file (*.rma) to create
+    rma_type : str
+        'RMA2', 'RMA10' or 'RMA11'
+    num_nodes : int
+        number of nodes written at each timestep
+    num_frames : int
+        number of timesteps
+    num_elements : int, optional
+        number of elements (default num_nodes // 3)
+    constituents : list of str
+        name of the RMA11 constituents
+    year : int
+        year written in each timestep
+    start_hour : float
+        time (in hours from the start of the year) of the first timestep
+    timestep : float
+        time between two timesteps (in h)
+    seed : int
+        seed of the random generator
+
+    Returns
+    -------
+    size of the file in bytes
+    """
+    if num_elements is None:
+        num_elements = max(1, num_nodes // 3)
+    rng = np.random.default_rng(seed)
+    np_ = num_nodes
+    nqal = len(constituents) + 5
+
+    with open(filename, 'wb') as f:
+        f.write(_header(rma_type, np_, num_elements, constituents))
+        for k in range(num_frames):
+            time = start_hour + k * timestep
+            if rma_type == 'RMA2':
+                f.write(pack('fii', time, np_, year))
+                values = rng.random((5 * np_,), dtype=np.float32)
+            elif rma_type == 'RMA11':
+                f.write(pack('fiii', time, nqal, np_, year))
+                values = rng.random((nqal * np_,), dtype=np.float32)
+            elif rma_type == 'RMA10':
+                f.write(pack('fiiii', time, np_, 6, num_elements, year))
+                values = rng.random((9 * np_ + num_elements,), dtype=np.float32)
+            else:
+                raise ValueError('Unknown RMA type: {}'.format(rma_type))
+            f.write(values.astype(np.float32).tobytes())
+
+    return os.path.getsize(filename)
+
+
+def write_yearly_rma(output_dir, rma_type='RMA2', num_nodes=1000, start_year=2000,
+                     num_years=2, frames_per_year=100, timestep=0.25, overlap=1, seed=0):
+    """
+    Write one result file per year, repeating the last `overlap` timesteps of a
+    file at the start of the next one (as done at each restart boundary). Each
+    file holds frames_per_year new timesteps following the previous file.
+
+    Returns
+    -------
+    list of the file names
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    filenames = []
+    last = None
+    for i, year in enumerate(range(start_year, start_year + num_years)):
+        filename = '{}/{}_{}.rma'.format(output_dir, rma_type, year)
+        if last is None:
+            start, frames = 0.0, frames_per_year
+        else:
+            # hours of the first repeated timestep, relative to the start of the year
+            first = last - timedelta(hours=(overlap - 1) * timestep)
+            start = (first - datetime(year, 1, 1)).total_seconds() / 3600
+            frames = frames_per_year + overlap
+        write_rma(filename, rma_type, num_nodes, frames, year=year,
+                  start_hour=start, timestep=timestep, seed=seed + i)
+        last = datetime(year, 1, 1) + timedelta(hours=start + (frames - 1) * timestep)
+        filenames.append(filename)
+    return filenames
+
+
+def write_elt(filename, elements=(1, 2, 3), year=2000, num_days=30, step_hours=1):
+    """
+    Parameters
+    ----------
+    filename : str
+        name of the elt file to create
+    elements : list of int
+        inflow elements
+    year : int
+        year of the file
+    num_days : int
+        number of days of data
+    step_hours : int
+        time between two records (in h)
+
+    Returns
+    -------
+    number of records written
+    """
+    records = 0
+    with open(filename, 'w') as f:
+        f.write('TE      SYNTHETIC BC\n')
+        for element in elements:
+            f.write('QEI{:>13}       1{:>8}\n'.format(element, year))
+            date = datetime(year, 1, 1)
+            while date < datetime(year, 1, 1) + timedelta(days=num_days):
+                flow = 10.0 + element + date.hour / 24.0
+                f.write('QE{:>6}{:>8}{:>+8.1E}\n'.format(date.timetuple().tm_yday, date.hour, flow))
+                date += timedelta(hours=step_hours)
+                records += 1
+        f.write('ENDDATA')
+    return records
+
+
+def write_wqg(filename, elements=(1, 2, 3), constituents=('SALIN', 'TEMP'), year=2000,
+              num_days=30, step_hours=1):
+    """
+    Parameters
+    ----------
+    filename : str
+        name of the wqg file to create
+    elements : list of int
+        inflow elements (type 3, flow and concentrations)
+    constituents : list of str
+        name of the constituents
+    year : int
+        year of the file
+    num_days : int
+        number of days of data
+    step_hours : int
+        time between two records (in h)
+
+    Returns
+    -------
+    number of records written
+    """
+    records = 0
+    with open(filename, 'w') as f:
+        for element in elements:
+            f.write('TI      Elements {}\n'.format(element))
+            f.write('{:<8}{:>8}{:>8}{:>8}\n'.format('QT', element, 3, year))
+            date = datetime(year, 1, 1)
+            while date < datetime(year, 1, 1) + timedelta(days=num_days):
+                flow = 10.0 + element
+                f.write('{:<5}{:>3}{:>8}{:>+8.1E}'.format('QD', date.timetuple().tm_yday, date.hour, flow))
+                for c in range(len(constituents)):
+                    f.write('{:>8.2E}'.format(1.0 + c))
+                f.write('\n')
+                date += timedelta(hours=step_hours)
+                records += 1
+        f.write('ENDDATA')
+    return records
+
+
+def write_template(filename, year=2000, runNumber='ABC001'):
+    """
+    Parameters
+    ----------
+    filename : str
+        name of the template (*.rm2 or *.r11) to create
+    year : int
+        first year of the template
+    runNumber : str
+        string to identify the simulation
+    """
+    n_days = 366 if calendar.isleap(year) else 365
+    with open(filename, 'w') as f:
+        f.write('T1      SYNTHETIC TEMPLATE {}\n'.format(year))
+        f.write('INBNRST   {}_{}.rst\n'.format(runNumber, year - 1))
+        f.write('OUTBNRST  {}_{}.rst\n'.format(runNumber, year))
+        f.write('ENDFIL\n')
+        f.write('LIMIT\n')
+        f.write('ENDLIMIT\n')
+        f.write('C0      SYNTHETIC {}\n'.format(year))
+        f.write('C1      0       0       {}\n'.format(year))
+        f.write('{:<32}{:>8}{:>8}\n'.format('C3      1       1', 96, 0))
+        f.write('{:<24}{:>8}{:>8}{:>8}\n'.format('AUT     1       1', year, n_days, 0))
+        f.write('{:<8}{:>8.3f}{:<8}{:>8}{:>8}{:>8}\n'.format('DT', 0.25, '', year, n_days, 24))
+        f.write('END\n')
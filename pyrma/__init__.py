@@ -1,5 +1,38 @@
-from .rma import RMA
-from .mesh import Mesh
-from .makeRMA import MakeRMA
-from .rma_bc import RMA_bc
-from .processRMA import ProcessRMA
+"""
+Python RMA toolbox
+
+The classes are imported on first use (e.g. pyrma.RMA), so that importing
+pyrma or running the command line interface stays fast and pandas is only
+loaded by RMA_bc.
+
+"""
+
+import importlib
+
+# public name: module defining it
+_EXPORTS = {'RMA': '.rma',
+            'Mesh': '.mesh',
+            'MakeRMA': '.makeRMA',
+            'RMA_bc': '.rma_bc',
+            'ProcessRMA': '.processRMA',
+            'Instrument': '.instrument',
+            'RMADataset': '.dataset',
+            'RMAArchive': '.archive',
+            'write_archive': '.archive',
+            'RMACatalogue': '.catalogue',
+            'write_subset': '.subset',
+            'NodeStore': '.nodestore'}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
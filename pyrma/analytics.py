@@ -0,0 +1,295 @@
+"""
+Streaming per-node threshold-exceedance and inundation-duration statistics of
+RMA results (e.g. hours of salinity above a threshold, wet fraction from the
+depth, longest continuous exceedance, number of exceedance events)
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import derived
+from .dataset import RMADataset
+
+
+class ExceedanceStats:
+    """
+    Per-node exceedance statistics updated one timestep at a time, with
+    O(nodes) memory. Statistics of consecutive periods (yearly files,
+    parallel workers) are combined with merge().
+
+    ...
+    Attributes
+    ----------
+    threshold: float
+        threshold value
+    above: bool
+        True to count the values above the threshold, False below
+    hours: float
+        total duration of the timesteps processed (in h)
+    duration: array
+        time spent in exceedance (in h)
+    events: array
+        number of exceedance events (continuous runs)
+    longest: array
+        longest continuous exceedance (in h)
+    leading: array
+        duration of the run in exceedance at the start of the period (in h)
+    current: array
+        duration of the run in exceedance at the end of the period (in h)
+    always: array of bool
+        True where every timestep of the period is in exceedance
+
+
+    Methods
+    -------
+    update(values, hours)
+        add a timestep
+    merge(other)
+        add the statistics of the following period
+    fraction()
+        fraction of the time in exceedance
+    results()
+        dict of the statistics
+    to_csv(output_name, nodes, mesh = None)
+        save the statistics of each node to a csv file
+    """
+    def __init__(self, num_nodes, threshold, above=True):
+        """
+        Parameters
+        ----------
+        num_nodes : int
+            number of nodes
+        threshold : float
+            threshold value
+        above : bool, optional - default True
+            True to count the values above the threshold, False below
+        """
+        self.threshold = threshold
+        self.above = above
+        self.hours = 0.0
+        self.duration = np.zeros(num_nodes)
+        self.events = np.zeros(num_nodes, dtype=np.int64)
+        self.longest = np.zeros(num_nodes)
+        self.leading = np.zeros(num_nodes)
+        self.current = np.zeros(num_nodes)
+        self.always = np.ones(num_nodes, dtype=bool)
+
+    def update(self, values, hours):
+        """
+        Parameters
+        ----------
+        values : array
+            values of the nodes at the timestep
+        hours : float
+            duration represented by the timestep (in h)
+        """
+        if self.above:
+            mask = values > self.threshold
+        else:
+            mask = values < self.threshold
+        self.events += mask & (self.current == 0)
+        self.current = np.where(mask, self.current + hours, 0.0)
+        np.maximum(self.longest, self.current, out=self.longest)
+        self.always &= mask
+        self.leading[self.always] += hours
+        self.duration[mask] += hours
+        self.hours += hours
+
+    def merge(self, other):
+        """
+        Parameters
+        ----------
+        other : ExceedanceStats
+            statistics of the period following this one
+
+        Returns
+        -------
+        self, updated with the statistics of both periods
+        """
+        joined = (self.current > 0) & (other.leading > 0)
+        self.events = self.events + other.events - joined
+        self.longest = np.maximum(np.maximum(self.longest, other.longest),
+                                  np.where(joined, self.current + other.leading, 0.0))
+        self.leading = np.where(self.always, self.leading + other.leading, self.leading)
+        self.current = np.where(other.always, self.current + other.current, other.current)
+        self.always = self.always & other.always
+        self.duration = self.duration + other.duration
+        self.hours += other.hours
+        return self
+
+    def fraction(self):
+        """
+        Returns
+        -------
+        array of the fraction of the time in exceedance
+        """
+        if self.hours == 0:
+            return np.zeros_like(self.duration)
+        return self.duration / self.hours
+
+    def results(self):
+        """
+        Returns
+        -------
+        dict of arrays: duration, fraction, events and longest
+        """
+        return {'duration': self.duration, 'fraction': self.fraction(),
+                'events': self.events, 'longest': self.longest}
+
+    def to_csv(self, output_name, nodes, mesh=None):
+        """
+        Parameters
+        ----------
+        output_name : str
+            name of the csv file
+        nodes : list of int
+            node numbers, in the order of the statistics arrays
+        mesh : Mesh, optional
+            mesh used to add the x and y coordinates of the nodes
+        """
+        results = self.results()
+        with open(output_name, 'w') as f:
+            columns = ['node'] + (['x', 'y'] if mesh is not None else []) + list(results)
+            f.write('{}\n'.format(','.join(columns)))
+            for i, node in enumerate(nodes):
+                row = [node]
+                if mesh is not None:
+                    row += [mesh.nodes[node]['x'], mesh.nodes[node]['y']]
+                row += [results[c][i] for c in results]
+                f.write('{}\n'.format(','.join(map(str, row))))
+
+
+def _durations(dataset):
+    """
+    Returns
+    -------
+    array of the duration of each timestep of the dataset (in h): time to the
+    next timestep, the last one lasting as long as the previous one
+    """
+    if len(dataset) < 2:
+        return np.zeros(len(dataset))
+    hours = np.diff(dataset.times) / np.timedelta64(1, 'h')
+    return np.append(hours, hours[-1])
+
+
+def _exceedance_part(filenames, key, threshold, above, nodes, start, stop, timestep, stride=1):
+    """
+    Statistics of the timesteps start to stop (every stride) of the dataset
+    (worker function)
+    """
+    with RMADataset(filenames) as dataset:
+        idx = None if nodes is None else np.asarray(nodes, dtype=np.int64) - 1
+        stats = ExceedanceStats(dataset.num_nodes if idx is None else len(idx), threshold, above)
+        durations = _durations(dataset) if timestep is None else None
+        for k in range(start, stop, stride):
+            if key in dataset.variables:
+                values = dataset.read_variable(k, key)
+            else:
+                values = derived.evaluate(key, dataset.isel(k)[1])
+            if durations is None:
+                hours = timestep * stride
+            else:
+                # the timestep stands for the timesteps skipped up to the next one
+                hours = float(durations[k:min(k + stride, stop)].sum())
+            stats.update(values if idx is None else values[idx], hours)
+    return stats
+
+
+def exceedance(filenames, key, threshold, above=True, nodes=-1, timestep=None, workers=1,
+               start=None, end=None, stride=1):
+    """
+    Parameters
+    ----------
+    filenames : list of str
+        result files in chronological order (timesteps repeated at restart
+        boundaries are removed)
+    key : str or int
+        variable name (e.g. 'depth', 'salinity'), derived variable (e.g.
+        'speed') or RMA11 constituent number
+    threshold : float
+        threshold value
+    above : bool, optional - default True
+        True to count the values above the threshold, False below
+    nodes : list of int, optional
+        nodes to process (default all the nodes)
+    timestep : float, optional
+        constant duration of a timestep (in h), default the time between each
+        timestep and the next one in the files
+    workers : int, optional - default 1
+        number of processes, each one processing a contiguous part of the run
+    start : datetime, optional
+        first date processed (default first timestep)
+    end : datetime, optional
+        last date processed, included (default last timestep)
+    stride : int, optional - default 1
+        process one timestep every stride timesteps (each one standing for
+        stride timesteps)
+
+    Returns
+    -------
+    ExceedanceStats
+    """
+    with RMADataset(filenames) as dataset:
+        first, last = 0, len(dataset)
+        if start is not None:
+            first = int(np.searchsorted(dataset.times, np.datetime64(start, 'ms'), side='left'))
+        if end is not None:
+            last = int(np.searchsorted(dataset.times, np.datetime64(end, 'ms'), side='right'))
+    if isinstance(nodes, int) and nodes == -1:
+        nodes = None
+
+    # parts start on a multiple of stride so that the timesteps processed do
+    # not depend on the number of workers
+    n_steps = max(0, (last - first + stride - 1) // stride)
+    bounds = first + stride * np.linspace(0, n_steps, max(1, workers) + 1).astype(int)
+    bounds[-1] = max(last, first)
+    parts = [(filenames, key, threshold, above, nodes, int(a), int(b), timestep, stride)
+             for a, b in zip(bounds[:-1], bounds[1:])]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_exceedance_part, *zip(*parts)))
+    else:
+        results = [_exceedance_part(*part) for part in parts]
+
+    stats = results[0]
+    for other in results[1:]:
+        stats.merge(other)
+    return stats
+
+
+def inundation(filenames, dry_depth=0.05, nodes=-1, timestep=None, workers=1,
+               start=None, end=None, stride=1):
+    """
+    Wet/dry statistics from the depth: duration, fraction of time wet, number
+    of wetting events and longest wet period of each node
+
+    Parameters
+    ----------
+    filenames : list of str
+        RMA2 or RMA10 result files in chronological order
+    dry_depth : float, optional - default 0.05
+        depth under which a node is dry
+    nodes : list of int, optional
+        nodes to process (default all the nodes)
+    timestep : float, optional
+        constant duration of a timestep (in h), default the time between each
+        timestep and the next one in the files
+    workers : int, optional - default 1
+        number of processes
+    start : datetime, optional
+        first date processed (default first timestep)
+    end : datetime, optional
+        last date processed, included (default last timestep)
+    stride : int, optional - default 1
+        process one timestep every stride timesteps
+
+    Returns
+    -------
+    ExceedanceStats
+    """
+    return exceedance(filenames, 'depth', dry_depth, True, nodes, timestep, workers,
+                      start, end, stride)
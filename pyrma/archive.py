@@ -0,0 +1,377 @@
+"""
+Chunked and compressed archive of RMA result files for long-term storage
+
+The values of each variable are split into chunks of time_block timesteps x
+node_block nodes. Each chunk is byte-shuffled (optionally quantised to a
+tolerance first) and compressed with zlib or lzma, so that the history of one
+node or one timestep only decompresses the chunks holding it.
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import json
+import lzma
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from struct import pack, unpack
+
+import numpy as np
+
+from .dataset import RMADataset
+from .rma import RMA, round_dates
+
+# the file starts with MAGIC, the version and the position of the JSON index
+# (version 2: each chunk records whether it is quantised)
+MAGIC = b'PYRMAARC'
+VERSION = 2
+
+CODECS = {'zlib': (lambda b, level: zlib.compress(b, level), zlib.decompress),
+          'lzma': (lambda b, level: lzma.compress(b, preset=level), lzma.decompress)}
+
+
+def _shuffle(a):
+    """
+    Group the 1st, 2nd, 3rd and 4th bytes of all the 4 bytes values together
+    """
+    return a.view(np.uint8).reshape(-1, 4).T.tobytes()
+
+
+def _unshuffle(b, dtype, shape):
+    return np.frombuffer(b, dtype=np.uint8).reshape(4, -1).T.copy().view(dtype).reshape(shape)
+
+
+def _tolerance(tolerance, key):
+    if isinstance(tolerance, dict):
+        return tolerance.get(key)
+    return tolerance
+
+
+def _quantise(chunk, tol):
+    """
+    Parameters
+    ----------
+    chunk : array
+        float32 values
+    tol : float
+        absolute error accepted on the values
+
+    Returns
+    -------
+    array of int32 of the quantised values, or None if the chunk holds values
+    which cannot be quantised (NaN, infinite or out of the int32 range)
+    """
+    q = np.round(chunk.astype(np.float64) / (2.0 * tol))
+    if not np.isfinite(q).all() or np.abs(q).max(initial=0) > np.iinfo(np.int32).max:
+        return None
+    return q.astype(np.int32)
+
+
+def write_archive(filenames, output, time_block=96, node_block=4096, tolerance=None,
+                  codec='zlib', level=6):
+    """
+    Parameters
+    ----------
+    filenames : str or list of str
+        result file(s) in chronological order (timesteps repeated at restart
+        boundaries are removed)
+    output : str
+        name of the archive to create
+    time_block : int, optional - default 96
+        number of timesteps per chunk
+    node_block : int, optional - default 4096
+        number of nodes per chunk
+    tolerance : float or dict, optional
+        absolute error accepted on the values (dict of variable:tolerance for
+        a tolerance per variable or constituent number), values are stored
+        losslessly if None and in the chunks which cannot be quantised (NaN,
+        infinite or too large for the tolerance)
+    codec : str, optional - default 'zlib'
+        'zlib' or 'lzma'
+    level : int, optional - default 6
+        compression level
+
+    Returns
+    -------
+    size of the archive in bytes
+    """
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    compress = CODECS[codec][0]
+    dataset = RMADataset(filenames)
+    header = dataset._open(0).header
+    keys = dataset.variables
+    n_nodes = dataset.num_nodes
+    n_frames = len(dataset)
+
+    index = {'header': header, 'codec': codec, 'time_block': time_block,
+             'node_block': node_block, 'num_frames': n_frames,
+             'variables': [], 'times': [], 'chunks': {}}
+    block = np.empty((len(keys), min(time_block, max(n_frames, 1)), n_nodes), dtype=np.float32)
+
+    with open(output, 'wb') as f:
+        f.write(MAGIC + pack('<IQ', VERSION, 0))
+        for tb, start in enumerate(range(0, n_frames, time_block)):
+            stop = min(start + time_block, n_frames)
+            for t in range(stop - start):
+                i, frame = dataset.locate(start + t)
+                R = dataset._open(i)
+                R.seek(frame)
+                R.next(nodes=[])
+                index['times'].append([R.year, float(R.time)])
+                for v, key in enumerate(keys):
+                    block[v, t] = R.values[key]
+
+            for v, key in enumerate(keys):
+                tol = _tolerance(tolerance, key)
+                for nb, n0 in enumerate(range(0, n_nodes, node_block)):
+                    chunk = block[v, :stop - start, n0:n0 + node_block]
+                    quantised = _quantise(chunk, tol) if tol else None
+                    if quantised is not None:
+                        chunk = quantised
+                    data = compress(_shuffle(np.ascontiguousarray(chunk)), level)
+                    index['chunks']['{}|{}|{}'.format(key, tb, nb)] = [f.tell(), len(data), quantised is not None]
+                    f.write(data)
+
+        for key in keys:
+            tol = _tolerance(tolerance, key)
+            index['variables'].append({'key': key, 'tolerance': tol or None})
+
+        position = f.tell()
+        f.write(json.dumps(index).encode('utf-8'))
+        f.seek(len(MAGIC))
+        f.write(pack('<IQ', VERSION, position))
+        size = f.seek(0, 2)
+
+    dataset.close()
+    return size
+
+
+class RMAArchive(RMA):
+    """
+    Read an archive created with write_archive with the same API as RMA
+    (next, seek, frame_date, date, read_variable, values, xvel, constit ...)
+
+    ...
+    Attributes
+    ----------
+    time_block: int
+        number of timesteps per chunk
+    node_block: int
+        number of nodes per chunk
+    num_frames: int
+        number of timesteps
+    cache_size: int
+        number of decompressed chunks kept in memory
+
+
+    Methods
+    -------
+    node_history(key, node)
+        return the values of one node for all the timesteps
+    """
+    def __init__(self, file, instrument=None, verbose=False, cache_size=64, hydro=None):
+        """
+        Parameters
+        ----------
+        file : str
+            name of the archive
+        instrument : Instrument, optional
+            collect timers and counters
+        verbose : bool, optional - default False
+            print the RMA11 header information
+        cache_size : int, optional - default 64
+            number of decompressed chunks kept in memory
+        hydro : str, list of str or RMADataset, optional
+            RMA2/RMA10 results matched by date to the RMA11 timesteps
+        """
+        self.filename = file
+        self.file = open(file, 'rb')
+        self.instrument = instrument
+        self.verbose = verbose
+        if hydro is not None and not hasattr(hydro, 'sel'):
+            hydro = RMADataset([hydro] if isinstance(hydro, str) else hydro)
+        self.hydro = hydro
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+        magic = self.file.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError('{} is not a pyrma archive'.format(file))
+        version, position = unpack('<IQ', self.file.read(12))
+        if version > VERSION:
+            raise ValueError('{} was written by a newer version of pyrma (archive version {})'.format(file, version))
+        self.file.seek(position)
+        self.index = json.loads(self.file.read().decode('utf-8'))
+
+        self._parse_header(self.index['header'])
+        self.time_block = self.index['time_block']
+        self.node_block = self.index['node_block']
+        self.num_frames = self.index['num_frames']
+        self.frame_size = 0
+        self._decompress = CODECS[self.index['codec']][1]
+        self._tolerance = {}
+        for v in self.index['variables']:
+            self._tolerance[v['key']] = v['tolerance']
+        self._frame = 0
+
+    def _chunk(self, key, tb, nb):
+        """
+        Parameters
+        ----------
+        key : str or int
+            variable name or constituent number
+        tb : int
+            index of the time block
+        nb : int
+            index of the node block
+
+        Returns
+        -------
+        array (timesteps, nodes) of the chunk
+        """
+        name = (key, tb, nb)
+        if name in self._cache:
+            self._cache.move_to_end(name)
+            return self._cache[name]
+
+        instrument = self.instrument
+        if instrument is not None:
+            t0 = instrument.start()
+        entry = self.index['chunks']['{}|{}|{}'.format(key, tb, nb)]
+        offset, length = entry[:2]
+        # version 1 archives quantise all the chunks of a variable with a tolerance
+        quantised = entry[2] if len(entry) > 2 else bool(self._tolerance[key])
+        self.file.seek(offset)
+        data = self.file.read(length)
+        if instrument is not None:
+            instrument.count('bytes_read', length)
+            t0 = instrument.stop('read', t0)
+
+        n_times = min(self.time_block, self.num_frames - tb * self.time_block)
+        n_nodes = min(self.node_block, self.num_nodes - nb * self.node_block)
+        if quantised:
+            chunk = _unshuffle(self._decompress(data), np.int32, (n_times, n_nodes))
+            chunk = (chunk * (2.0 * self._tolerance[key])).astype(np.float32)
+        else:
+            chunk = _unshuffle(self._decompress(data), np.float32, (n_times, n_nodes))
+        if instrument is not None:
+            instrument.stop('decode', t0)
+
+        self._cache[name] = chunk
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return chunk
+
+    def seek(self, frame):
+        """
+        Parameters
+        ----------
+        frame : int
+            index of the timestep read by the next call of next()
+        """
+        if frame < 0:
+            frame += self.num_frames
+        self._frame = frame
+
+    def frame_date(self, frame):
+        """
+        Parameters
+        ----------
+        frame : int
+            index of the timestep
+
+        Returns
+        -------
+        datetime of the timestep
+        """
+        year, time = self.index['times'][frame]
+        self._frame = (frame % self.num_frames) + 1
+        return datetime(year,1,1) + timedelta(hours = time)
+
+    def frame_dates(self):
+        """
+        Returns
+        -------
+        array of datetime64[ms] of all the timesteps, rounded to the second
+        as RMA.frame_dates()
+        """
+        times = np.array(self.index['times'], dtype=np.float64).reshape(-1, 2)
+        return round_dates(times[:, 0], times[:, 1])
+
+    def read_variable(self, frame, key, start=0, stop=None):
+        """
+        Parameters
+        ----------
+        frame : int
+            index of the timestep
+        key : str or int
+            variable name or constituent number
+        start : int, optional
+            index of the first node (node number - 1)
+        stop : int, optional
+            index after the last node (default num_nodes)
+
+        Returns
+        -------
+        array of float32
+        """
+        if stop is None:
+            stop = self.num_nodes
+        if frame < 0:
+            frame += self.num_frames
+        tb, t = divmod(frame, self.time_block)
+        parts = []
+        for nb in range(start // self.node_block, (stop - 1) // self.node_block + 1):
+            n0 = nb * self.node_block
+            chunk = self._chunk(key, tb, nb)
+            parts.append(chunk[t, max(start - n0, 0):stop - n0])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.float32)
+
+    def node_history(self, key, node):
+        """
+        Parameters
+        ----------
+        key : str or int
+            variable name or constituent number
+        node : int
+            node number
+
+        Returns
+        -------
+        array of float32 of the values of the node at every timestep
+        """
+        nb, n = divmod(node - 1, self.node_block)
+        n_blocks = (self.num_frames + self.time_block - 1) // self.time_block
+        return np.concatenate([self._chunk(key, tb, nb)[:, n] for tb in range(n_blocks)])
+
+    def next(self, nodes=-1):
+        if self._frame >= self.num_frames:
+            return False
+        if nodes == -1:
+            nodes = range(1, self.num_nodes + 1)
+
+        # the full timestep is decoded, nodes only limits the per-node dicts (as RMA)
+        self.year, self.time = self.index['times'][self._frame]
+        self.values = {}
+        for key in self.variables():
+            self.values[key] = self.read_variable(self._frame, key)
+        self._frame += 1
+        if self.type == 'RMA11     ' and self.hydro is not None:
+            self._add_hydro()
+
+        instrument = self.instrument
+        if instrument is not None:
+            t0 = instrument.start()
+        if self.type == 'RMA11     ':
+            for c in self.variables():
+                self.constit[c] = self._select(self.values[c], nodes)
+        else:
+            for key in self.variables():
+                setattr(self, key, self._select(self.values[key], nodes))
+        if instrument is not None:
+            instrument.stop('select', t0)
+            instrument.frame(self)
+        return True
+
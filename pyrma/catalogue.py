@@ -0,0 +1,269 @@
+"""
+Catalogue of RMA result files (*.rma) stored in a local SQLite index
+
+Only the 1000 bytes header and the headers of the first and last timesteps of
+each file are read; the number of timesteps is inferred from the file size.
+The index is refreshed incrementally (only the files whose modification time
+or size changed are read again).
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import fnmatch
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .rma import RMA
+
+COLUMNS = ['path', 'mtime', 'size', 'type', 'title', 'geometry', 'num_nodes',
+           'num_elements', 'num_constits', 'constit_names', 'num_frames',
+           'start', 'end', 'timestep', 'error']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    type TEXT,
+    title TEXT,
+    geometry TEXT,
+    num_nodes INTEGER,
+    num_elements INTEGER,
+    num_constits INTEGER,
+    constit_names TEXT,
+    num_frames INTEGER,
+    start TEXT,
+    end TEXT,
+    timestep REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS files_time ON files (start, end);
+CREATE INDEX IF NOT EXISTS files_nodes ON files (num_nodes);
+'''
+
+
+def _iso(date, rounded=False):
+    """
+    Parameters
+    ----------
+    date : datetime, datetime64 or str
+        date
+    rounded : bool, optional - default False
+        round to the second, as the dates of RMADataset
+
+    Returns
+    -------
+    str of the date in ISO format ('2000-01-01 00:06:00'), compared as
+    text in the queries
+    """
+    t = np.datetime64(date, 'us')
+    if rounded:
+        t = (t + np.timedelta64(500, 'ms')).astype('datetime64[s]')
+    return t.item().isoformat(' ')
+
+
+def read_info(path):
+    """
+    Parameters
+    ----------
+    path : str
+        result file
+
+    Returns
+    -------
+    dict of the catalogue columns of the file (error set if the file could
+    not be read)
+    """
+    info = dict.fromkeys(COLUMNS)
+    info['path'] = path
+    try:
+        stat = os.stat(path)
+        info.update({'mtime': stat.st_mtime, 'size': stat.st_size})
+        R = RMA(path, verbose=False)
+        try:
+            info['type'] = R.type.strip()
+            info['title'] = R.title.strip()
+            info['geometry'] = R.geometry.strip()
+            info['num_nodes'] = R.num_nodes
+            info['num_elements'] = R.num_elements
+            info['num_frames'] = R.num_frames
+            if R.type == 'RMA11     ':
+                info['num_constits'] = R.num_constits
+                info['constit_names'] = ','.join(name.strip() for name in R.constit_name[1:])
+            if R.num_frames > 0:
+                start = R.frame_date(0)
+                end = R.frame_date(-1)
+                info['start'] = _iso(start, rounded=True)
+                info['end'] = _iso(end, rounded=True)
+                if R.num_frames > 1:
+                    info['timestep'] = (end - start).total_seconds() / 3600.0 / (R.num_frames - 1)
+        finally:
+            R.close()
+    except Exception as e:
+        info['error'] = '{}: {}'.format(type(e).__name__, e)
+    return info
+
+
+def find_files(roots, pattern='*.rma'):
+    """
+    Parameters
+    ----------
+    roots : str or list of str
+        folders to search (recursively)
+    pattern : str, optional - default '*.rma'
+        file name pattern
+
+    Returns
+    -------
+    dict of path:(mtime, size)
+    """
+    if isinstance(roots, str):
+        roots = [roots]
+    files = {}
+    stack = [os.path.abspath(root) for root in roots]
+    while stack:
+        folder = stack.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif fnmatch.fnmatch(entry.name, pattern):
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_mtime, stat.st_size)
+    return files
+
+
+class RMACatalogue:
+    """
+    SQLite index of the headers of RMA result files
+
+    ...
+    Attributes
+    ----------
+    db: str
+        name of the SQLite database
+    connection: Connection
+        connection to the database
+
+
+    Methods
+    -------
+    update(roots, pattern = '*.rma', workers = 16)
+        add new or modified files to the index, remove deleted files
+    query(start = None, end = None, type = None, num_nodes = None, constituent = None, path = None)
+        return the files matching the criteria
+    close()
+        close the database
+    """
+    def __init__(self, db='pyrma_catalogue.sqlite'):
+        """
+        Parameters
+        ----------
+        db : str, optional - default 'pyrma_catalogue.sqlite'
+            name of the SQLite database (created if needed)
+        """
+        self.db = db
+        self.connection = sqlite3.connect(db)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def update(self, roots, pattern='*.rma', workers=16):
+        """
+        Parameters
+        ----------
+        roots : str or list of str
+            folders to search (recursively)
+        pattern : str, optional - default '*.rma'
+            file name pattern
+        workers : int, optional - default 16
+            number of threads reading the headers
+
+        Returns
+        -------
+        dict with the number of files 'added', 'updated', 'removed' and 'unchanged'
+        """
+        if isinstance(roots, str):
+            roots = [roots]
+        files = find_files(roots, pattern)
+
+        known = {}
+        for root in roots:
+            prefix = os.path.join(os.path.abspath(root), '')
+            for row in self.connection.execute(
+                    "SELECT path, mtime, size FROM files WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix)):
+                known[row['path']] = (row['mtime'], row['size'])
+
+        changed = [path for path, stat in files.items() if known.get(path) != stat]
+        removed = [path for path in known if path not in files]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            infos = list(executor.map(read_info, changed))
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO files ({}) VALUES ({})'.format(
+                    ','.join(COLUMNS), ','.join('?' * len(COLUMNS))),
+                [[info[c] for c in COLUMNS] for info in infos])
+            self.connection.executemany('DELETE FROM files WHERE path = ?',
+                                        [(path,) for path in removed])
+
+        added = sum(1 for path in changed if path not in known)
+        return {'added': added, 'updated': len(changed) - added,
+                'removed': len(removed), 'unchanged': len(files) - len(changed)}
+
+    def query(self, start=None, end=None, type=None, num_nodes=None, constituent=None, path=None):
+        """
+        Parameters
+        ----------
+        start : datetime or str, optional
+            keep the files with timesteps after start
+        end : datetime or str, optional
+            keep the files with timesteps before end
+        type : str, optional
+            'RMA2', 'RMA10' or 'RMA11'
+        num_nodes : int, optional
+            number of nodes
+        constituent : str, optional
+            name of a RMA11 constituent
+        path : str, optional
+            SQL LIKE pattern on the path (e.g. '%/scenario_A/%')
+
+        Returns
+        -------
+        list of dict of the catalogue columns, ordered by start date
+        """
+        conditions = ['error IS NULL']
+        parameters = []
+        if start is not None:
+            conditions.append('end >= ?')
+            parameters.append(_iso(start))
+        if end is not None:
+            conditions.append('start <= ?')
+            parameters.append(_iso(end))
+        if type is not None:
+            conditions.append('type = ?')
+            parameters.append(type)
+        if num_nodes is not None:
+            conditions.append('num_nodes = ?')
+            parameters.append(num_nodes)
+        if constituent is not None:
+            conditions.append("(',' || constit_names || ',') LIKE ?")
+            parameters.append('%,{},%'.format(constituent))
+        if path is not None:
+            conditions.append('path LIKE ?')
+            parameters.append(path)
+        rows = self.connection.execute(
+            'SELECT * FROM files WHERE {} ORDER BY start, path'.format(' AND '.join(conditions)),
+            parameters)
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """
+        close the database
+        """
+        self.connection.close()
@@ -0,0 +1,531 @@
+"""
+pyrma command line interface
+
+    pyrma export   result files to csv, archive or node-major store
+    pyrma stats    exceedance/inundation or scenario-baseline statistics
+    pyrma info     header information of result files
+    pyrma mesh     edit, subset and save a mesh (and subset result files)
+    pyrma bc       resample, convert and perturb ELT/WQG boundary files
+    pyrma makerun  yearly RMA2/RMA11 setup files from a template
+
+The pyrma modules are imported by the subcommands which use them, so that
+pandas is only loaded by 'pyrma bc'.
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+
+def _date(text):
+    """
+    Parameters
+    ----------
+    text : str
+        date in ISO format ('2000-01-01' or '2000-01-01 06:00')
+
+    Returns
+    -------
+    datetime
+    """
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid date: {}'.format(text))
+
+
+def _common_options(formats=None, nodes=True, processing=True, workers=None):
+    """
+    Parameters
+    ----------
+    formats : list of str, optional
+        choices of --format, the first one is the default (no --format if
+        None)
+    nodes : bool, optional - default True
+        add --nodes and --nodes-from
+    processing : bool, optional - default True
+        add --start, --end and --stride
+    workers : bool, optional
+        add --workers (default same as processing)
+
+    Returns
+    -------
+    parser of the options shared by the subcommands
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    group = parser.add_argument_group('common options')
+    if formats:
+        group.add_argument('--format', choices=formats, default=formats[0],
+                           help='output format (default {})'.format(formats[0]))
+    if nodes:
+        group.add_argument('--nodes', type=int, nargs='+',
+                           help='node numbers (default all the nodes)')
+        group.add_argument('--nodes-from',
+                           help='file listing the node numbers (first field of each line)')
+    if workers is None:
+        workers = processing
+    if workers:
+        group.add_argument('--workers', type=int, default=1,
+                           help='number of parallel workers (default 1)')
+    if processing:
+        group.add_argument('--start', type=_date, help='first date processed')
+        group.add_argument('--end', type=_date, help='last date processed (included)')
+        group.add_argument('--stride', type=int, default=1,
+                           help='process one timestep every STRIDE timesteps')
+    return parser
+
+
+# value of the options when they are not given, other than None, False or []
+DEFAULTS = {'workers': 1, 'stride': 1}
+
+
+def _reject(args, names, context):
+    """
+    Stop with an error if options which are not used in a context were given
+
+    Parameters
+    ----------
+    args : Namespace
+        parsed arguments
+    names : list of str
+        attributes of the options not used
+    context : str
+        command and options which do not use them (e.g. 'export --format store')
+    """
+    given = ['--' + name.replace('_', '-') for name in names
+             if getattr(args, name) not in (None, False, []) and getattr(args, name) != DEFAULTS.get(name)]
+    if given:
+        raise SystemExit('pyrma {}: {} not supported'.format(context, ', '.join(given)))
+
+
+def read_nodes(filename):
+    """
+    Parameters
+    ----------
+    filename : str
+        text or csv file, the first field of each line starting with a node
+        number is read (e.g. the node column of a statistics csv file)
+
+    Returns
+    -------
+    list of int
+    """
+    nodes = []
+    with open(filename) as f:
+        for line in f:
+            fields = line.replace(',', ' ').split()
+            if fields and fields[0].isdigit():
+                nodes.append(int(fields[0]))
+    return nodes
+
+
+def _nodes(args, num_nodes=None):
+    """
+    Returns
+    -------
+    nodes of --nodes and --nodes-from, all the nodes (1 to num_nodes) if
+    none given, or None if num_nodes is None
+    """
+    nodes = list(args.nodes or [])
+    if args.nodes_from:
+        nodes += read_nodes(args.nodes_from)
+    if nodes:
+        return nodes
+    if num_nodes is None:
+        return None
+    return list(range(1, num_nodes + 1))
+
+
+def _variables(variables, rma_type):
+    """
+    Parameters
+    ----------
+    variables : list of str
+        'name', or 'output=variable' (e.g. 'SAL=1' for a RMA11 constituent)
+    rma_type : str
+        type of the result files
+
+    Returns
+    -------
+    dict of output name: variable key
+    """
+    result = {}
+    for v in variables:
+        name, _, key = v.partition('=')
+        key = key or name
+        if key.isdigit():
+            key = int(key)
+        if rma_type == 'RMA11' and name.isdigit():
+            name = 'C{}'.format(name)
+        result[name] = key
+    return result
+
+
+def _export_part(filenames, output, rma_type, variables, nodes, options):
+    """
+    Export result files to csv (worker function)
+    """
+    from .processRMA import ProcessRMA
+    P = ProcessRMA(filenames, nodes, drop_overlap=options['drop_overlap'], hydro=options['hydro'],
+                   start=options['start'], end=options['end'], stride=options['stride'],
+                   verbose=False)
+    if options['period']:
+        P.resample_to_csv(output, variables, options['period'], options['stats'])
+    elif rma_type == 'RMA11':
+        P.rma11_to_csv(output, variables)
+    elif rma_type == 'RMA10':
+        P.rma10_to_csv(output, list(variables.values()))
+    else:
+        P.rma2_to_csv(output, list(variables.values()))
+
+
+def _concatenate(parts, output_dir, drop_overlap):
+    """
+    Join the csv files of consecutive parts of the run
+
+    Parameters
+    ----------
+    parts : list of str
+        folders of the parts, in chronological order
+    output_dir : str
+        folder of the joined files
+    drop_overlap : bool
+        skip the rows not later than the last one written
+    """
+    for name in sorted(os.listdir(parts[0])):
+        with open(os.path.join(output_dir, name), 'w') as out:
+            last = None
+            for k, part in enumerate(parts):
+                with open(os.path.join(part, name)) as f:
+                    header = f.readline()
+                    if k == 0:
+                        out.write(header)
+                    for line in f:
+                        date = line.split(',', 1)[0]
+                        if drop_overlap and last is not None and date <= last:
+                            continue
+                        last = date
+                        out.write(line)
+
+
+def export(args):
+    if args.format in ('archive', 'store'):
+        # the archive and the store hold all the nodes and timesteps of the files
+        unused = ['workers', 'nodes', 'nodes_from', 'start', 'end', 'stride', 'variables',
+                  'period', 'hydro', 'drop_overlap']
+        _reject(args, unused + (['tolerance'] if args.format == 'store' else []),
+                'export --format {}'.format(args.format))
+    else:
+        _reject(args, ['tolerance'], 'export --format csv')
+        if args.workers > 1 and (args.period or args.stride > 1):
+            # period statistics and strides run over the whole run at once
+            raise SystemExit('pyrma export: --workers not supported with --period or --stride')
+
+    if args.format == 'archive':
+        from .archive import write_archive
+        size = write_archive(args.files, args.output, tolerance=args.tolerance)
+        print('{}: {} bytes'.format(args.output, size))
+        return
+    if args.format == 'store':
+        from .nodestore import NodeStore
+        added = NodeStore(args.output).append(args.files)
+        print('{}: {} timesteps added'.format(args.output, added))
+        return
+
+    from .rma import RMA
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    R = RMA(args.files[0], verbose=False)
+    rma_type, num_nodes = R.type.strip(), R.num_nodes
+    R.close()
+    nodes = _nodes(args, num_nodes)
+    default = {'RMA2': ['xvel', 'yvel', 'depth', 'elevation'],
+               'RMA10': ['xvel', 'yvel', 'zvel', 'depth', 'elevation', 'salinity', 'temperature', 'sussed'],
+               'RMA11': ['1']}
+    variables = _variables(args.variables or default[rma_type], rma_type)
+    options = {'drop_overlap': args.drop_overlap, 'hydro': args.hydro, 'start': args.start,
+               'end': args.end, 'stride': args.stride, 'period': args.period, 'stats': args.stats}
+
+    workers = min(args.workers, len(args.files))
+    if workers <= 1:
+        _export_part(args.files, args.output, rma_type, variables, nodes, options)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    tmp = tempfile.mkdtemp(dir=output_dir or '.')
+    try:
+        groups = [args.files[i * len(args.files) // workers:(i + 1) * len(args.files) // workers]
+                  for i in range(workers)]
+        parts = [os.path.join(tmp, str(i)) for i in range(workers)]
+        for part in parts:
+            os.makedirs(part)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_export_part, group, os.path.join(part, os.path.basename(args.output)),
+                                       rma_type, variables, nodes, options)
+                       for group, part in zip(groups, parts)]
+            for future in futures:
+                future.result()
+        _concatenate(parts, output_dir or '.', args.drop_overlap)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def stats(args):
+    import numpy as np
+    from .rma import RMA
+    R = RMA(args.files[0], verbose=False)
+    num_nodes = R.num_nodes
+    R.close()
+    nodes = _nodes(args, num_nodes)
+    key = int(args.variable) if args.variable.isdigit() else args.variable
+
+    if args.baseline:
+        _reject(args, ['workers', 'threshold', 'below'], 'stats --baseline')
+        from .compare import difference
+        result = difference(args.files, args.baseline, key, args.thresholds, nodes,
+                            args.series, args.start, args.end, args.stride)
+        stat = args.stat or 'mean'
+    else:
+        from .analytics import exceedance
+        if args.threshold is None:
+            raise SystemExit('pyrma stats: --threshold or --baseline is required')
+        _reject(args, ['thresholds', 'series'], 'stats --threshold')
+        result = exceedance(args.files, key, args.threshold, not args.below, nodes,
+                            None, args.workers, args.start, args.end, args.stride)
+        stat = args.stat or 'fraction'
+
+    mesh = None
+    if args.mesh:
+        from .mesh import Mesh
+        mesh = Mesh(args.mesh)
+    if args.format == 'asc':
+        from .compare import write_ascii_grid
+        if mesh is None or args.cellsize is None:
+            raise SystemExit('pyrma stats: --format asc needs --mesh and --cellsize')
+        x, y = mesh.node_coordinates()
+        idx = np.asarray(nodes, dtype=np.int64) - 1
+        write_ascii_grid(args.output, x[idx], y[idx], np.asarray(result.results()[stat], dtype=float),
+                         args.cellsize)
+    else:
+        result.to_csv(args.output, nodes, mesh)
+
+
+def info(args):
+    from concurrent.futures import ThreadPoolExecutor
+    from .catalogue import COLUMNS, find_files, read_info
+    files = []
+    for path in args.files:
+        if os.path.isdir(path):
+            files += find_files([path], args.pattern)
+        else:
+            files.append(path)
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        infos = list(executor.map(read_info, files))
+
+    if args.format == 'json':
+        print(json.dumps(infos, indent=1))
+    elif args.format == 'csv':
+        print(','.join(COLUMNS))
+        for i in infos:
+            print(','.join('' if i[c] is None else str(i[c]) for c in COLUMNS))
+    else:
+        for i in infos:
+            print(i['path'])
+            for c in COLUMNS[3:]:
+                if i[c] not in (None, ''):
+                    print('    {:<14}{}'.format(c, i[c]))
+
+
+def mesh(args):
+    from .mesh import Mesh
+    M = Mesh(args.mesh)
+    if args.channel_width is not None:
+        M.update_channel_width(args.channel_width, args.width_method, args.width_types)
+    if args.depth:
+        depth = {}
+        with open(args.depth) as f:
+            for line in f:
+                fields = line.replace(',', ' ').split()
+                if len(fields) >= 2 and fields[0].isdigit():
+                    depth[int(fields[0])] = float(fields[1])
+        M.update_depth(depth)
+
+    polygon = None
+    if args.polygon:
+        with open(args.polygon) as f:
+            polygon = [tuple(map(float, line.replace(',', ' ').split()[:2])) for line in f
+                       if len(line.replace(',', ' ').split()) >= 2]
+    nodes = _nodes(args)
+    if args.bbox or polygon or args.types or nodes:
+        selected = M.select_nodes(args.bbox, polygon, args.types)
+        if nodes:
+            selected = sorted(set(selected) & set(nodes))
+        if args.nodes_out:
+            with open(args.nodes_out, 'w') as f:
+                f.write(''.join('{}\n'.format(n) for n in selected))
+        sub = M.submesh(selected)
+        if args.results:
+            from .subset import write_subset
+            os.makedirs(args.results_dir, exist_ok=True)
+            for filename in args.results:
+                output = os.path.join(args.results_dir, os.path.basename(filename))
+                write_subset(filename, output, sub.parent_nodes, sub.parent_elements)
+        print('{} nodes, {} elements kept'.format(len(sub.nodes), len(sub.elements)))
+        M = sub
+    M.save_mesh(args.output)
+
+
+def bc(args):
+    from .rma_bc import RMA_bc
+    B = RMA_bc()
+    if args.elt:
+        B.read_elts(args.elt)
+    if args.wqg:
+        B.read_wqgs(args.wqg, args.constituents)
+    if args.timestep:
+        B.resample(args.timestep, args.method, args.limit)
+
+    if args.members:
+        B.create_ensemble(args.members, args.output, args.scale, args.noise, seed=args.seed,
+                          elts=bool(args.elt), wqgs=bool(args.wqg))
+    elif args.format == 'csv':
+        os.makedirs(args.output, exist_ok=True)
+        if len(B.df.columns) > 0:
+            B.df.to_csv(os.path.join(args.output, 'flow.csv'))
+        for element, df in B.df_wq_dict.items():
+            df.to_csv(os.path.join(args.output, 'wq_{}.csv'.format(element)))
+    else:
+        if args.elt:
+            B.create_elts(args.output)
+        if args.wqg:
+            B.create_wqgs(args.output)
+
+
+def makerun(args):
+    from .makeRMA import MakeRMA
+    M = MakeRMA(args.template, args.run_number)
+    if M.type == 'r11':
+        M.generate_r11(args.start, args.end, args.output, args.timestep)
+    else:
+        M.generate_rm2(args.start, args.end, args.output, args.timestep)
+
+
+def parser():
+    """
+    Returns
+    -------
+    ArgumentParser of the pyrma command
+    """
+    p = argparse.ArgumentParser(prog='pyrma', description='Python RMA toolbox')
+    sub = p.add_subparsers(dest='command', metavar='command')
+    sub.required = True
+
+    s = sub.add_parser('export', parents=[_common_options(['csv', 'archive', 'store'])], help='export result files',
+                       description='Export RMA result files (in chronological order) to csv files, '
+                                   'a compressed archive or a node-major store')
+    s.add_argument('files', nargs='+', help='result files')
+    s.add_argument('-o', '--output', required=True,
+                   help='csv name (one file per variable), archive file or store folder')
+    s.add_argument('-v', '--variables', nargs='+',
+                   help="variables (raw or derived), 'NAME=number' for RMA11 constituents")
+    s.add_argument('--period', choices=['hourly', 'daily', 'monthly', 'yearly'],
+                   help='save period statistics instead of the timesteps')
+    s.add_argument('--stats', nargs='+', default=['mean', 'min', 'max'],
+                   help='statistics of --period (mean, min, max, sum, count)')
+    s.add_argument('--drop-overlap', action='store_true',
+                   help='skip the timesteps repeated at restart boundaries')
+    s.add_argument('--hydro', nargs='+', help='RMA2/RMA10 files matching RMA11 files (fluxes)')
+    s.add_argument('--tolerance', type=float, help='absolute error accepted by --format archive')
+    s.set_defaults(function=export)
+
+    s = sub.add_parser('stats', parents=[_common_options(['csv', 'asc'])], help='per-node statistics',
+                       description='Exceedance statistics of a variable, or statistics of the '
+                                   'difference with a baseline run')
+    s.add_argument('files', nargs='+', help='result files')
+    s.add_argument('-o', '--output', required=True, help='csv or asc file')
+    s.add_argument('-v', '--variable', default='depth', help='variable or constituent number')
+    s.add_argument('--threshold', type=float, help='exceedance threshold')
+    s.add_argument('--below', action='store_true', help='count the values below the threshold')
+    s.add_argument('--baseline', nargs='+', help='result files of the baseline run')
+    s.add_argument('--thresholds', type=float, nargs='+', default=[],
+                   help='change thresholds of the difference')
+    s.add_argument('--series', help='csv file of the difference at each timestep')
+    s.add_argument('--stat', help='statistic saved by --format asc')
+    s.add_argument('--mesh', help='mesh file (coordinates of the nodes)')
+    s.add_argument('--cellsize', type=float, help='cell size of --format asc')
+    s.set_defaults(function=stats)
+
+    s = sub.add_parser('info', parents=[_common_options(['text', 'json', 'csv'], False, False, True)],
+                       help='header information of result files')
+    s.add_argument('files', nargs='+', help='result files or folders')
+    s.add_argument('--pattern', default='*.rma', help='pattern of the files in the folders')
+    s.set_defaults(function=info)
+
+    s = sub.add_parser('mesh', parents=[_common_options(None, True, False)], help='edit and subset a mesh',
+                       description='Update the channel widths and depths of a mesh, and keep '
+                                   'the elements inside a box, a polygon or of some types')
+    s.add_argument('mesh', help='mesh file')
+    s.add_argument('-o', '--output', required=True, help='new mesh file')
+    s.add_argument('--channel-width', type=float, help='width change of the 1D channels')
+    s.add_argument('--width-method', choices=['constant', 'factor'], default='constant')
+    s.add_argument('--width-types', type=int, nargs='+', default=[1],
+                   help='element types of --channel-width')
+    s.add_argument('--depth', help='csv file of node,depth')
+    s.add_argument('--bbox', type=float, nargs=4, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'))
+    s.add_argument('--polygon', help='file of the x,y vertices of a polygon')
+    s.add_argument('--types', type=int, nargs='+', help='element types kept')
+    s.add_argument('--nodes-out', help='file to save the selected nodes')
+    s.add_argument('--results', nargs='+', help='result files to subset with the mesh')
+    s.add_argument('--results-dir', default='subset', help='folder of the subset result files')
+    s.set_defaults(function=mesh)
+
+    s = sub.add_parser('bc', parents=[_common_options(['elt', 'csv'], False, False)], help='convert boundary files',
+                       description='Read ELT/WQG files, resample them to a timestep and save '
+                                   'them as ELT/WQG or csv files, or as an ensemble')
+    s.add_argument('-o', '--output', required=True, help='output folder')
+    s.add_argument('--elt', nargs='+', help='elt files')
+    s.add_argument('--wqg', nargs='+', help='wqg files')
+    s.add_argument('--constituents', nargs='+', default=[], help='constituents of the wqg files')
+    s.add_argument('--timestep', help="timestep of the model (whole hours, e.g. '1h', '3h')")
+    s.add_argument('--method', default='time', help='interpolation method of --timestep')
+    s.add_argument('--limit', type=int, help='maximum number of consecutive missing values filled')
+    s.add_argument('--members', type=int, help='number of ensemble members')
+    s.add_argument('--scale', type=float, nargs=2, metavar=('LOW', 'HIGH'),
+                   help='range of the factor of each series of the members')
+    s.add_argument('--noise', type=float, help='relative noise of the members')
+    s.add_argument('--seed', type=int, help='seed of the random generator')
+    s.set_defaults(function=bc)
+
+    s = sub.add_parser('makerun', help='yearly setup files from a template')
+    s.add_argument('template', help='rm2 or r11 setup file of the first year')
+    s.add_argument('--start', type=_date, required=True, help='first day of the simulation')
+    s.add_argument('--end', type=_date, required=True, help='last day of the simulation')
+    s.add_argument('-o', '--output', default='runfiles', help='output folder')
+    s.add_argument('--run-number', default='ABC001', help='name of the simulation')
+    s.add_argument('--timestep', type=float, default=0.25, help='computational timestep (h)')
+    s.set_defaults(function=makerun)
+    return p
+
+
+def main(argv=None):
+    """
+    Parameters
+    ----------
+    argv : list of str, optional
+        arguments (default sys.argv[1:])
+    """
+    args = parser().parse_args(argv)
+    args.function(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""
+Scenario versus baseline comparison of RMA results: the two runs are read in
+lockstep (timesteps aligned by date) and the per-node difference statistics
+are computed in one pass, without exporting either run
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+from contextlib import nullcontext
+
+import numpy as np
+
+from . import derived
+from .dataset import RMADataset
+
+
+class PairedDataset:
+    """
+    Two RMADataset on the same mesh, restricted to their common timesteps
+
+    ...
+    Attributes
+    ----------
+    scenario: RMADataset
+        developed case
+    baseline: RMADataset
+        base case
+    times: array of datetime64
+        dates of the common timesteps
+    variables: list
+        keys of the variables available in both runs
+
+
+    Methods
+    -------
+    read(k, key, nodes = -1)
+        read a variable of the k-th common timestep in both runs
+    close()
+        close the files of the runs opened by the pair
+    """
+    def __init__(self, scenario, baseline, max_open=8):
+        """
+        Parameters
+        ----------
+        scenario : list of str or RMADataset
+            result files of the developed case, in chronological order
+        baseline : list of str or RMADataset
+            result files of the base case, in chronological order
+        max_open : int, optional - default 8
+            maximum number of result files kept open per run
+        """
+        # only the datasets opened here are closed by close()
+        self._opened = []
+        if not isinstance(scenario, RMADataset):
+            scenario = RMADataset(scenario, max_open)
+            self._opened.append(scenario)
+        if not isinstance(baseline, RMADataset):
+            baseline = RMADataset(baseline, max_open)
+            self._opened.append(baseline)
+        if scenario.num_nodes != baseline.num_nodes:
+            raise ValueError('The runs have a different number of nodes: {} and {}'.format(scenario.num_nodes, baseline.num_nodes))
+        self.scenario = scenario
+        self.baseline = baseline
+        self.times, self._k_scenario, self._k_baseline = np.intersect1d(
+            scenario.times, baseline.times, assume_unique=True, return_indices=True)
+        if len(self.times) == 0:
+            print('WARNING: the runs have no timestep in common')
+        self.variables = [v for v in scenario.variables if v in baseline.variables]
+
+    def __len__(self):
+        return len(self.times)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _read(self, dataset, k, key, idx):
+        if key in dataset.variables:
+            values = dataset.read_variable(k, key)
+        else:
+            values = derived.evaluate(key, dataset.isel(k)[1])
+        return values if idx is None else values[idx]
+
+    def read(self, k, key, nodes=-1):
+        """
+        Parameters
+        ----------
+        k : int
+            position of the timestep in the common timesteps
+        key : str or int
+            variable (raw or derived) or RMA11 constituent number
+        nodes : list of int, optional
+            nodes to extract (default all the nodes)
+
+        Returns
+        -------
+        array of the scenario values, array of the baseline values
+        """
+        idx = None if isinstance(nodes, int) and nodes == -1 else np.asarray(nodes, dtype=np.int64) - 1
+        return (self._read(self.scenario, int(self._k_scenario[k]), key, idx),
+                self._read(self.baseline, int(self._k_baseline[k]), key, idx))
+
+    def close(self):
+        """
+        close the files of the runs given as lists of files (the RMADataset
+        given are left open)
+        """
+        for dataset in self._opened:
+            dataset.close()
+
+
+class DifferenceStats:
+    """
+    Per-node statistics of the difference scenario - baseline updated one
+    timestep at a time, with O(nodes) memory
+
+    ...
+    Attributes
+    ----------
+    thresholds: list of float
+        change thresholds, a positive threshold counts the differences above
+        it and a negative threshold the differences below it
+    count: int
+        number of timesteps processed
+    total: array
+        sum of the differences
+    minimum: array
+        largest decrease
+    maximum: array
+        largest increase
+    peak: array
+        difference of largest magnitude (signed)
+    peak_time: array of datetime64
+        date of the difference of largest magnitude
+    exceedances: dict of array
+        key: threshold
+        number of timesteps beyond the threshold
+
+
+    Methods
+    -------
+    update(date, difference)
+        add a timestep
+    results()
+        dict of the statistics
+    to_csv(output_name, nodes, mesh = None)
+        save the statistics of each node to a csv file
+    to_raster(output_name, stat, mesh, nodes, cellsize)
+        save a statistic to an ESRI ASCII grid
+    """
+    def __init__(self, num_nodes, thresholds=[]):
+        """
+        Parameters
+        ----------
+        num_nodes : int
+            number of nodes
+        thresholds : list of float, optional
+            change thresholds
+        """
+        self.thresholds = list(thresholds)
+        self.count = 0
+        self.total = np.zeros(num_nodes)
+        self.minimum = np.full(num_nodes, np.inf)
+        self.maximum = np.full(num_nodes, -np.inf)
+        self.peak = np.zeros(num_nodes)
+        self.peak_time = np.full(num_nodes, np.datetime64('NaT'), dtype='datetime64[ms]')
+        self.exceedances = {t: np.zeros(num_nodes, dtype=np.int64) for t in self.thresholds}
+
+    def update(self, date, difference):
+        """
+        Parameters
+        ----------
+        date : datetime or datetime64
+            date of the timestep
+        difference : array
+            scenario - baseline values of the nodes
+        """
+        self.count += 1
+        self.total += difference
+        np.minimum(self.minimum, difference, out=self.minimum)
+        np.maximum(self.maximum, difference, out=self.maximum)
+        larger = np.abs(difference) > np.abs(self.peak)
+        self.peak[larger] = difference[larger]
+        self.peak_time[larger] = np.datetime64(date, 'ms')
+        for t, exceed in self.exceedances.items():
+            exceed += (difference > t) if t >= 0 else (difference < t)
+
+    def results(self):
+        """
+        Returns
+        -------
+        dict of arrays: mean, min, max, peak, peak_time and the number of
+        timesteps beyond each threshold ('exceed_{threshold}')
+        """
+        results = {'mean': self.total / max(self.count, 1), 'min': self.minimum,
+                   'max': self.maximum, 'peak': self.peak, 'peak_time': self.peak_time}
+        for t, exceed in self.exceedances.items():
+            results['exceed_{}'.format(t)] = exceed
+        return results
+
+    def to_csv(self, output_name, nodes, mesh=None):
+        """
+        Parameters
+        ----------
+        output_name : str
+            name of the csv file
+        nodes : list of int
+            node numbers, in the order of the statistics arrays
+        mesh : Mesh, optional
+            mesh used to add the x and y coordinates of the nodes
+        """
+        results = self.results()
+        with open(output_name, 'w') as f:
+            columns = ['node'] + (['x', 'y'] if mesh is not None else []) + list(results)
+            f.write('{}\n'.format(','.join(columns)))
+            for i, node in enumerate(nodes):
+                row = [node]
+                if mesh is not None:
+                    row += [mesh.nodes[node]['x'], mesh.nodes[node]['y']]
+                row += [results[c][i] for c in results]
+                f.write('{}\n'.format(','.join(map(str, row))))
+
+    def to_raster(self, output_name, stat, mesh, nodes, cellsize):
+        """
+        Parameters
+        ----------
+        output_name : str
+            name of the ESRI ASCII grid (*.asc)
+        stat : str
+            statistic to save (key of results(), except peak_time)
+        mesh : Mesh
+            mesh of the results
+        nodes : list of int
+            node numbers, in the order of the statistics arrays
+        cellsize : float
+            size of the cells
+        """
+        x, y = mesh.node_coordinates()
+        idx = np.asarray(nodes, dtype=np.int64) - 1
+        write_ascii_grid(output_name, x[idx], y[idx], self.results()[stat], cellsize)
+
+
+def write_ascii_grid(output_name, x, y, values, cellsize, nodata=-9999):
+    """
+    Save the mean of the point values falling in each cell to an ESRI ASCII
+    grid
+
+    Parameters
+    ----------
+    output_name : str
+        name of the grid (*.asc)
+    x : array
+        x of the points
+    y : array
+        y of the points
+    values : array
+        values of the points
+    cellsize : float
+        size of the cells
+    nodata : float, optional - default -9999
+        value of the cells without point
+    """
+    keep = np.isfinite(x) & np.isfinite(y) & np.isfinite(values)
+    x, y, values = x[keep], y[keep], np.asarray(values, dtype=float)[keep]
+    xll, yll = np.floor(x.min() / cellsize) * cellsize, np.floor(y.min() / cellsize) * cellsize
+    ncols = int(np.floor((x.max() - xll) / cellsize)) + 1
+    nrows = int(np.floor((y.max() - yll) / cellsize)) + 1
+    bins = [xll + cellsize * np.arange(ncols + 1), yll + cellsize * np.arange(nrows + 1)]
+    total = np.histogram2d(x, y, bins=bins, weights=values)[0]
+    count = np.histogram2d(x, y, bins=bins)[0]
+    with np.errstate(invalid='ignore'):
+        grid = np.where(count > 0, total / count, nodata)
+    with open(output_name, 'w') as f:
+        f.write('ncols {}\nnrows {}\nxllcorner {}\nyllcorner {}\ncellsize {}\nNODATA_value {}\n'.format(
+            ncols, nrows, xll, yll, cellsize, nodata))
+        # rows from north to south
+        for row in grid.T[::-1]:
+            f.write('{}\n'.format(' '.join('{:g}'.format(v) for v in row)))
+
+
+def difference(scenario, baseline, key, thresholds=[], nodes=-1, series_output=None,
+               start=None, end=None, stride=1):
+    """
+    Parameters
+    ----------
+    scenario : list of str or RMADataset
+        result files of the developed case, in chronological order
+    baseline : list of str or RMADataset
+        result files of the base case, in chronological order
+    key : str or int
+        variable (raw or derived, e.g. 'depth', 'speed') or RMA11 constituent
+        number
+    thresholds : list of float, optional
+        change thresholds (see DifferenceStats)
+    nodes : list of int, optional
+        nodes to process (default all the nodes)
+    series_output : str, optional
+        name of a csv file where the difference of the nodes at each
+        timestep is saved (one column per node)
+    start : datetime, optional
+        first date processed (default first common timestep)
+    end : datetime, optional
+        last date processed, included (default last common timestep)
+    stride : int, optional - default 1
+        process one common timestep every stride timesteps
+
+    Returns
+    -------
+    DifferenceStats
+    """
+    with PairedDataset(scenario, baseline) as pair:
+        if isinstance(nodes, int) and nodes == -1:
+            columns = range(1, pair.scenario.num_nodes + 1)
+        else:
+            columns = nodes
+        stats = DifferenceStats(len(columns), thresholds)
+        first, last = 0, len(pair)
+        if start is not None:
+            first = int(np.searchsorted(pair.times, np.datetime64(start, 'ms'), side='left'))
+        if end is not None:
+            last = int(np.searchsorted(pair.times, np.datetime64(end, 'ms'), side='right'))
+        with (open(series_output, 'w') if series_output is not None else nullcontext()) as f:
+            if f is not None:
+                f.write('Date,{}\n'.format(','.join(map(str, columns))))
+            for k in range(first, last, stride):
+                values, base = pair.read(k, key, nodes)
+                diff = values.astype(np.float64) - base
+                stats.update(pair.times[k], diff)
+                if f is not None:
+                    date = pair.times[k].astype('datetime64[s]').item()
+                    f.write('{},{}\n'.format(date, ','.join(map(str, diff.tolist()))))
+    return stats
@@ -0,0 +1,247 @@
+"""
+Virtual dataset spanning a list of RMA result files (*.rma), e.g. the yearly
+outputs of a run set up with MakeRMA
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .rma import open_results
+
+
+class RMADataset:
+    """
+    Single time axis over a list of RMA result files. Only the header of each
+    file and the headers of its timesteps (through a memory map) are read to
+    build the axis, the dates being rounded to the second; the timesteps
+    repeated at each restart boundary are removed.
+
+    ...
+    Attributes
+    ----------
+    filenames: list of str
+        list of the result files, in chronological order
+    times: array of datetime64
+        date of each timestep of the dataset
+    type: str
+        type of the result files
+    num_nodes: int
+        number of nodes
+    variables: list
+        keys of the variables (names, or constituent numbers for RMA11)
+    max_open: int
+        maximum number of result files kept open
+
+
+    Methods
+    -------
+    isel(index, nodes = -1)
+        read timesteps by position
+    sel(time, nodes = -1, method = None)
+        read timesteps by date
+    locate(index)
+        return the file and the timestep in the file of a position
+    read_variable(index, key, start = 0, stop = None)
+        read one variable of one timestep for a range of nodes
+    close()
+        close all the open files
+    """
+    def __init__(self, filenames, max_open=8):
+        """
+        Parameters
+        ----------
+        filenames : list of str
+            list of the result files, in chronological order
+        max_open : int, optional - default 8
+            maximum number of result files kept open
+        """
+        self.filenames = list(filenames)
+        if not self.filenames:
+            raise ValueError('RMADataset needs at least one result file')
+        self.max_open = max(1, max_open)
+        self._pool = OrderedDict()
+
+        times = []
+        self._skip = []
+        self._counts = []
+        last = None
+        for i, filename in enumerate(self.filenames):
+            R = self._open(i)
+            if i == 0:
+                self.type = R.type
+                self.num_nodes = R.num_nodes
+                self.num_constits = getattr(R, 'num_constits', 0)
+                self.constit_name = getattr(R, 'constit_name', [])
+                self.variables = R.variables()
+            file_times = R.frame_dates()
+            # drop the timesteps already covered by the previous files
+            skip = 0 if last is None else int(np.searchsorted(file_times, last, side='right'))
+            self._skip.append(skip)
+            self._counts.append(len(file_times) - skip)
+            times.append(file_times[skip:])
+            if len(file_times) > skip:
+                last = file_times[-1]
+
+        self.times = np.concatenate(times)
+        self._offsets = np.cumsum([0] + self._counts)
+
+    def _open(self, i):
+        """
+        Parameters
+        ----------
+        i : int
+            index of the file
+
+        Returns
+        -------
+        open RMA or RMAArchive object (the least recently used file is closed
+        when more than max_open files are open)
+        """
+        if i in self._pool:
+            self._pool.move_to_end(i)
+            return self._pool[i]
+        R = open_results(self.filenames[i], verbose=False)
+        self._pool[i] = R
+        while len(self._pool) > self.max_open:
+            _, old = self._pool.popitem(last=False)
+            old.close()
+        return R
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        return self.isel(slice(None))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def locate(self, index):
+        """
+        Parameters
+        ----------
+        index : int
+            position of the timestep in the dataset
+
+        Returns
+        -------
+        index of the file and index of the timestep in the file
+        """
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('timestep {} out of range ({} timesteps)'.format(index, len(self)))
+        i = int(np.searchsorted(self._offsets, index, side='right')) - 1
+        return i, self._skip[i] + index - int(self._offsets[i])
+
+    def _read(self, index, nodes):
+        i, frame = self.locate(index)
+        R = self._open(i)
+        R.seek(frame)
+        R.next(nodes=[])
+        if isinstance(nodes, int) and nodes == -1:
+            values = dict(R.values)
+        else:
+            idx = np.asarray(nodes, dtype=np.int64) - 1
+            values = {key: val[idx] for key, val in R.values.items()}
+        return self.times[index].item(), values
+
+    def read_variable(self, index, key, start=0, stop=None):
+        """
+        Parameters
+        ----------
+        index : int
+            position of the timestep in the dataset
+        key : str or int
+            variable name or constituent number
+        start : int, optional
+            index of the first node (node number - 1)
+        stop : int, optional
+            index after the last node (default num_nodes)
+
+        Returns
+        -------
+        array of float32 of the values of the nodes start + 1 to stop
+        """
+        i, frame = self.locate(index)
+        return self._open(i).read_variable(frame, key, start, stop)
+
+    def isel(self, index, nodes=-1):
+        """
+        Parameters
+        ----------
+        index : int, slice or list of int
+            position(s) of the timesteps in the dataset
+        nodes : list of int, optional
+            nodes to extract (default all the nodes)
+
+        Returns
+        -------
+        for an int: (datetime, dict of key:array of the node values) where the
+        keys are the variables names (RMA2, RMA10) or constituent numbers (RMA11)
+        otherwise a generator of (datetime, dict)
+        """
+        if isinstance(index, (int, np.integer)):
+            return self._read(int(index), nodes)
+        if isinstance(index, slice):
+            index = range(*index.indices(len(self)))
+        return (self._read(int(k), nodes) for k in index)
+
+    def sel(self, time, nodes=-1, method=None, tolerance=None):
+        """
+        Parameters
+        ----------
+        time : datetime, str or slice
+            date of the timestep, or slice(start, end) of dates (both included)
+        nodes : list of int, optional
+            nodes to extract (default all the nodes)
+        method : str, optional
+            None for an exact match or 'nearest'
+        tolerance : timedelta, optional
+            maximum distance between time and the timestep selected (default
+            1 second for an exact match, as the dates of the timesteps are
+            rounded to the second, and no limit for 'nearest')
+
+        Returns
+        -------
+        same as isel
+        """
+        if isinstance(time, slice):
+            start = 0 if time.start is None else np.searchsorted(self.times, _datetime64(time.start), side='left')
+            end = len(self) if time.stop is None else np.searchsorted(self.times, _datetime64(time.stop), side='right')
+            return self.isel(slice(int(start), int(end), time.step), nodes)
+
+        if method not in (None, 'nearest'):
+            raise ValueError("Unknown method: {} (None or 'nearest')".format(method))
+        if tolerance is None and method is None:
+            tolerance = timedelta(seconds=1)
+        t = _datetime64(time)
+        k = int(np.searchsorted(self.times, t))
+        candidates = [c for c in (k - 1, k) if 0 <= c < len(self)]
+        if candidates:
+            k = min(candidates, key=lambda c: abs(self.times[c] - t))
+        if not candidates or (tolerance is not None and abs(self.times[k] - t) > np.timedelta64(tolerance, 'ms')):
+            raise KeyError('no timestep at {}'.format(time))
+        return self.isel(k, nodes)
+
+    def close(self):
+        """
+        close all the open files
+        """
+        for R in self._pool.values():
+            R.close()
+        self._pool.clear()
+
+
+def _datetime64(time):
+    if isinstance(time, datetime):
+        return np.datetime64(time, 'ms')
+    return np.datetime64(time).astype('datetime64[ms]')
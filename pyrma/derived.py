@@ -0,0 +1,135 @@
+"""
+Derived quantities computed on each decoded timestep of RMA results (speed,
+direction, unit discharge, constituent mass flux ...)
+
+Derived variables are evaluated vectorised from RMA.values and can be used in
+place of the raw variables in the ProcessRMA exports and statistics.
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import re
+
+import numpy as np
+
+
+class Derived:
+    """
+    Declaration of a derived variable
+
+    ...
+    Attributes
+    ----------
+    name: str
+        name of the variable
+    requires: list
+        keys of the variables needed (raw or derived)
+    function: function
+        function(*arrays) returning the array of the variable
+    description: str
+        description and unit
+    """
+    def __init__(self, name, requires, function, description=''):
+        self.name = name
+        self.requires = list(requires)
+        self.function = function
+        self.description = description
+
+
+DERIVED = {}
+
+
+def register(name, requires, function, description=''):
+    """
+    Parameters
+    ----------
+    name : str
+        name of the derived variable
+    requires : list
+        keys of the variables needed (raw or derived)
+    function : function
+        function(*arrays) returning the array of the variable
+    description : str, optional
+        description and unit
+    """
+    DERIVED[name] = Derived(name, requires, function, description)
+
+
+register('speed', ['xvel', 'yvel'], np.hypot, 'velocity magnitude (m/s)')
+register('direction', ['xvel', 'yvel'],
+         lambda u, v: np.degrees(np.arctan2(u, v)) % 360.0,
+         'direction the flow goes to, clockwise from north (deg)')
+register('qx', ['depth', 'xvel'], np.multiply, 'unit discharge along x (m2/s)')
+register('qy', ['depth', 'yvel'], np.multiply, 'unit discharge along y (m2/s)')
+register('unit_discharge', ['depth', 'speed'], np.multiply, 'unit discharge magnitude (m2/s)')
+
+# mass flux of a RMA11 constituent number c (flux_c, flux_x_c and flux_y_c)
+# or of a RMA10 variable (e.g. flux_salinity)
+FLUX = re.compile(r'^flux(_[xy])?_(\w+)$')
+
+
+def _resolve(key):
+    """
+    Parameters
+    ----------
+    key : str
+        name of a derived variable
+
+    Returns
+    -------
+    Derived
+    """
+    if key in DERIVED:
+        return DERIVED[key]
+    match = FLUX.match(key) if isinstance(key, str) else None
+    if match:
+        component, c = match.group(1), match.group(2)
+        if c.isdigit():
+            c = int(c)
+        discharge = {None: 'unit_discharge', '_x': 'qx', '_y': 'qy'}[component]
+        return Derived(key, [c, discharge], np.multiply, 'mass flux of {}'.format(c))
+    raise KeyError('Unknown variable: {}'.format(key))
+
+
+def evaluate(key, values):
+    """
+    Parameters
+    ----------
+    key : str or int
+        raw variable (name or constituent number) or derived variable
+    values : dict of array
+        values of the timestep (RMA.values), derived variables computed are
+        added to it so they are only computed once per timestep
+
+    Returns
+    -------
+    array of the variable for all the nodes
+    """
+    if key in values:
+        return values[key]
+    derived = _resolve(key)
+    values[key] = derived.function(*[evaluate(k, values) for k in derived.requires])
+    return values[key]
+
+
+def is_available(key, variables):
+    """
+    Parameters
+    ----------
+    key : str or int
+        raw or derived variable
+    variables : list
+        keys of the raw variables available
+
+    Returns
+    -------
+    True if the variable can be evaluated from the raw variables
+    """
+    if key in variables:
+        return True
+    try:
+        derived = _resolve(key)
+    except KeyError:
+        return False
+    return all(is_available(k, variables) for k in derived.requires)
@@ -0,0 +1,196 @@
+"""
+Progress and profiling instrumentation of the RMA readers and exports
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import json
+from time import perf_counter
+
+STAGES = ['read', 'decode', 'select', 'format', 'write']
+
+
+class Instrument:
+    """
+    Collect per-stage timers, counters and progress of a RMA reader or a
+    ProcessRMA export. Readers and exports only check `instrument is not None`,
+    so nothing is measured (and nothing is paid) when no instrument is given.
+
+    ...
+    Attributes
+    ----------
+    timers: dict of float
+        key: stage ('read', 'decode', 'select', 'format', 'write')
+        time spent in each stage (in s)
+    counters: dict of int
+        'bytes_read', 'frames', 'rows_written' and 'files'
+    progress: function
+        callback progress(event, info) called with event 'file' when a file
+        is opened, 'frame' every `every` frames and 'end' when finished
+    every: int
+        number of frames between two 'frame' progress calls
+    summary_output: str or file object
+        where to write the JSON summary when finish() is called
+
+
+    Methods
+    -------
+    start()
+        return the current clock value
+    stop(stage, start)
+        add the time elapsed since start to a stage, return the current clock
+    count(counter, n = 1)
+        increment a counter
+    file(filename, index, total)
+        report the start of a file
+    frame(R)
+        report a decoded frame
+    summary()
+        return a dict summarising the timers and counters
+    finish()
+        report the end and write the summary
+    """
+    def __init__(self, progress=None, every=1, summary_output=None):
+        """
+        Parameters
+        ----------
+        progress : function, optional
+            callback progress(event, info)
+        every : int, optional - default 1
+            number of frames between two 'frame' progress calls
+        summary_output : str or file object, optional
+            file name (appended to) or open file to write the JSON summary
+        """
+        self.timers = dict.fromkeys(STAGES, 0.0)
+        self.counters = {'bytes_read': 0, 'frames': 0, 'rows_written': 0, 'files': 0}
+        self.progress = progress
+        self.every = max(1, int(every))
+        self.summary_output = summary_output
+        self.filename = None
+        self._file_frames = 0
+        self._t0 = perf_counter()
+
+    def start(self):
+        """
+        Returns
+        -------
+        current clock value (s)
+        """
+        return perf_counter()
+
+    def stop(self, stage, start):
+        """
+        Parameters
+        ----------
+        stage : str
+            stage to charge with the elapsed time
+        start : float
+            clock value at the start of the stage
+
+        Returns
+        -------
+        current clock value (s), to be used as start of the next stage
+        """
+        now = perf_counter()
+        self.timers[stage] = self.timers.get(stage, 0.0) + now - start
+        return now
+
+    def count(self, counter, n=1):
+        """
+        Parameters
+        ----------
+        counter : str
+            name of the counter
+        n : int
+            increment
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def file(self, filename, index=0, total=1):
+        """
+        Parameters
+        ----------
+        filename : str
+            name of the file being opened
+        index : int
+            position of the file in the list being processed
+        total : int
+            number of files being processed
+        """
+        self.filename = filename
+        self._file_frames = 0
+        self.counters['files'] += 1
+        if self.progress is not None:
+            self.progress('file', {'filename': filename, 'index': index, 'total': total,
+                                   'elapsed': perf_counter() - self._t0})
+
+    def frame(self, R):
+        """
+        Parameters
+        ----------
+        R : RMA
+            reader holding the frame just decoded
+        """
+        self.counters['frames'] += 1
+        self._file_frames += 1
+        if self.progress is not None and self._file_frames % self.every == 0:
+            self.progress('frame', {'filename': self.filename, 'frame': self._file_frames,
+                                    'frames': self.counters['frames'],
+                                    'year': R.year, 'time': R.time,
+                                    'elapsed': perf_counter() - self._t0})
+
+    def summary(self):
+        """
+        Returns
+        -------
+        dict of the timers, counters and derived throughputs
+        """
+        elapsed = perf_counter() - self._t0
+        summary = {'elapsed': elapsed,
+                   'timers': dict(self.timers),
+                   'counters': dict(self.counters)}
+        if elapsed > 0:
+            summary['frames_per_s'] = self.counters['frames'] / elapsed
+            summary['MB_per_s'] = self.counters['bytes_read'] / elapsed / 1024.0 / 1024.0
+        return summary
+
+    def finish(self):
+        """
+        Report the end of the processing and write the JSON summary (one line)
+        to summary_output if set
+
+        Returns
+        -------
+        summary dict
+        """
+        summary = self.summary()
+        if self.progress is not None:
+            self.progress('end', summary)
+        if self.summary_output is not None:
+            line = json.dumps(summary) + '\n'
+            if hasattr(self.summary_output, 'write'):
+                self.summary_output.write(line)
+            else:
+                with open(self.summary_output, 'a') as f:
+                    f.write(line)
+        return summary
+
+
+def print_progress(event, info):
+    """
+    Simple progress callback printing files and frames
+
+    Parameters
+    ----------
+    event : str
+        'file', 'frame' or 'end'
+    info : dict
+        information about the event
+    """
+    if event == 'file':
+        print('Processing File {} ({}/{})'.format(info['filename'], info['index'] + 1, info['total']))
+    elif event == 'frame':
+        print('  frame {} - year {} time {:.2f} h'.format(info['frame'], info['year'], info['time']))
+    else:
+        print('Processed {} frames in {:.1f} s'.format(info['counters']['frames'], info['elapsed']))
@@ -10,6 +10,13 @@ Read and Update RMA mesh file (ASCII format)
 import numpy as np
 import re
 
+from .operators import SparseOperator
+from .section import CrossSection
+
+# weights of the corner and mid-side nodes giving the mean over a quadratic
+# element: 3-node line, 6-node triangle and 8-node quadrilateral
+QUADRATIC_WEIGHTS = {3: (1.0 / 6.0, 2.0 / 3.0), 6: (0.0, 1.0 / 3.0), 8: (-1.0 / 12.0, 1.0 / 3.0)}
+
 class Mesh:
     """
     Read RMA results files step by step
@@ -51,6 +58,36 @@ class Mesh:
         
     save_mesh(output='new_mesh.rm1')
        save the mesh
+       
+    node_coordinates()
+        return the arrays of the x and y coordinates of the nodes
+        
+    edges()
+        return the nodes of the edges of the 2D elements
+        
+    interpolation_weights(x,y)
+        return the interpolation weights of the nodes at a point
+        
+    cross_section(polyline, name = None)
+        return the CrossSection of a polyline
+        
+    element_areas(elements = None)
+        return the plan areas of the 2D elements
+        
+    element_operator(weighting = 'uniform', elements = None)
+        return the node to element averaging operator
+        
+    zone_operator(zones = None, weighting = 'uniform', total = False)
+        return the area-weighted node to zone operator
+        
+    select_nodes(bbox = None, polygon = None, element_types = None)
+        return the nodes inside a box, a polygon and/or elements of some types
+        
+    submesh(nodes)
+        return the renumbered mesh of the elements made of the nodes
+        
+    to_arrays()
+        return the nodes and elements packed in numpy arrays
 
 
     """
@@ -68,15 +105,23 @@ class Mesh:
         """
         method to process the meshfile
         
+        """ 
+        with open(self.name,'r') as f:
+            self.lines = f.readlines()
+        self._parse_lines()
+        
+    def _parse_lines(self):
+        """
+        method to read the elements and nodes from the lines of the meshfile
+        
         """ 
         self.elements = {}
         self.elements_type = {}
         self.nodes = {}
         self.elements_1D = []
         self.elements_2D = []
-        
-        with open(self.name,'r') as f:
-            self.lines = f.readlines()
+        # element edges and node coordinates of interpolation_weights
+        self._edge_cache = None
         
         elementSection = True
         nodeSection = False    
@@ -249,14 +294,374 @@ class Mesh:
         """ 
         self.nodes_lines = []
         for node in self.nodes_list:
-            if 'channel' in self.nodes[node]:
-                self.nodes_lines.append('{:>10.0f}{:>16.3f}{:>20.3f}{:>14.3f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}         0    0.0000\n'.format(
-                        node,self.nodes[node]['x'],self.nodes[node]['y'],self.nodes[node]['z'],*self.nodes[node]['channel']))
-            else:
-                self.nodes_lines.append('{:>10.0f}{:>16.3f}{:>20.3f}{:>14.3f}                                                                     0    0.0000\n'.format(
-                        node,self.nodes[node]['x'],self.nodes[node]['y'],self.nodes[node]['z']))
+            self.nodes_lines.append(self._node_line(node, self.nodes[node]))
                 
+    def _node_line(self, number, node):
+        """
+        Parameters
+        ----------
+        number : int
+            node number
+        node : dict
+            x, y, z (and channel) of the node
             
+        Returns
+        -------
+        line of the node in the meshfile
+        """ 
+        if 'channel' in node:
+            return '{:>10.0f}{:>16.3f}{:>20.3f}{:>14.3f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}         0    0.0000\n'.format(
+                    number,node['x'],node['y'],node['z'],*node['channel'])
+        return '{:>10.0f}{:>16.3f}{:>20.3f}{:>14.3f}                                                                     0    0.0000\n'.format(
+                number,node['x'],node['y'],node['z'])
+                
+    def node_coordinates(self):
+        """
+        Returns
+        -------
+        arrays of the x and y coordinates of the nodes (node n at index n - 1,
+        nan for the numbers without node)
+        """
+        size = max(self.nodes_list) if self.nodes_list else 0
+        x = np.full(size, np.nan)
+        y = np.full(size, np.nan)
+        idx = np.array(self.nodes_list, dtype=np.int64) - 1
+        x[idx] = [self.nodes[n]['x'] for n in self.nodes_list]
+        y[idx] = [self.nodes[n]['y'] for n in self.nodes_list]
+        return x, y
+    
+    def _element_edges(self, elements = None):
+        """
+        Parameters
+        ----------
+        elements : list of int, optional
+            elements to use (default 2D elements)
             
+        Returns
+        -------
+        arrays of the element and the two nodes of each side of the elements
+        (consecutive nodes, i.e. corner to mid-side node for quadratic
+        elements)
+        """
+        if elements is None:
+            elements = self.elements_2D
+        el, a, b = [], [], []
+        for element in elements:
+            nodes = self.elements[element]
+            el.extend([element] * len(nodes))
+            a.extend(nodes)
+            b.extend(nodes[1:] + nodes[:1])
+        return (np.array(el, dtype=np.int64), np.array(a, dtype=np.int64),
+                np.array(b, dtype=np.int64))
         
+    def edges(self):
+        """
+        Returns
+        -------
+        arrays of the two nodes of each edge of the 2D elements (edges shared
+        by two elements are only returned once)
+        """
+        el, a, b = self._element_edges()
+        pairs = np.unique(np.column_stack([np.minimum(a, b), np.maximum(a, b)]), axis=0)
+        return pairs[:, 0], pairs[:, 1]
+    
+    def interpolation_weights(self, x, y):
+        """
+        Parameters
+        ----------
+        x : float
+            x coordinate
+        y : float
+            y coordinate
+            
+        Returns
+        -------
+        dict of node:weight of the nodes of the 2D element holding the point,
+        empty if the point is outside the mesh. The weights are the inverse
+        squared distances to all the nodes of the element (corner and
+        mid-side), not the element shape functions: they are exact at the
+        nodes and for a constant field, and approximate a linear field inside
+        the element.
+        """
+        if self._edge_cache is None:
+            el, a, b = self._element_edges()
+            X, Y = self.node_coordinates()
+            elements, index = np.unique(el, return_inverse=True)
+            self._edge_cache = (X, Y, X[a - 1], Y[a - 1], X[b - 1], Y[b - 1], elements, index)
+        X, Y, x1, y1, x2, y2, elements, index = self._edge_cache
+        if len(elements) == 0:
+            return {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crosses = ((y1 > y) != (y2 > y)) & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+        inside = np.bincount(index, weights=crosses, minlength=len(elements)) % 2 == 1
+        if not inside.any():
+            return {}
+        nodes = self.elements[int(elements[np.argmax(inside)])]
+        d2 = np.array([(X[n - 1] - x)**2 + (Y[n - 1] - y)**2 for n in nodes])
+        if d2.min() == 0:
+            return {nodes[int(np.argmin(d2))]: 1.0}
+        w = 1 / d2
+        return {n: wn for n, wn in zip(nodes, w / w.sum())}
+    
+    def cross_section(self, polyline, name = None):
+        """
+        Parameters
+        ----------
+        polyline : list of (x, y)
+            points of the section, positive fluxes go from the left to the
+            right of the polyline
+        name : str, optional
+            name of the section
             
+        Returns
+        -------
+        CrossSection with the intersected edges, lengths, normals and the
+        sparse operator integrating a flux through the section
+        """
+        return CrossSection(self, polyline, name)
+    
+    def element_areas(self, elements = None):
+        """
+        Parameters
+        ----------
+        elements : list of int, optional
+            elements (default 2D elements)
+            
+        Returns
+        -------
+        array of the plan area of each element (shoelace formula on the
+        nodes of the element)
+        """
+        if elements is None:
+            elements = self.elements_2D
+        el, a, b = self._element_edges(elements)
+        X, Y = self.node_coordinates()
+        cross = X[a - 1] * Y[b - 1] - X[b - 1] * Y[a - 1]
+        order = {element: i for i, element in enumerate(elements)}
+        rows = np.array([order[e] for e in el], dtype=np.int64)
+        return np.abs(0.5 * np.bincount(rows, weights=cross, minlength=len(elements)))
+    
+    def _node_weights(self, element, weighting):
+        """
+        Parameters
+        ----------
+        element : int
+            element number
+        weighting : str or tuple
+            'uniform', 'corner', 'quadratic' or (corner weight, mid-side weight)
+            
+        Returns
+        -------
+        list of the nodes and list of their weights (sum of 1)
+        """
+        nodes = self.elements[element]
+        if weighting == 'uniform' or len(nodes) < 3:
+            weights = [1.0] * len(nodes)
+        elif weighting == 'corner':
+            # corner nodes are the 1st, 3rd ... nodes of quadratic elements
+            weights = [1.0 - i % 2 for i in range(len(nodes))]
+        elif weighting == 'quadratic':
+            if len(nodes) not in QUADRATIC_WEIGHTS:
+                weights = [1.0] * len(nodes)
+            else:
+                corner, mid = QUADRATIC_WEIGHTS[len(nodes)]
+                weights = [mid if i % 2 else corner for i in range(len(nodes))]
+        else:
+            corner, mid = weighting
+            weights = [mid if i % 2 else corner for i in range(len(nodes))]
+        total = sum(weights)
+        return nodes, [w / total for w in weights]
+    
+    def element_operator(self, weighting = 'uniform', elements = None):
+        """
+        Parameters
+        ----------
+        weighting : str or tuple, optional - default 'uniform'
+            'uniform' (mean of all the nodes), 'corner' (mean of the corner
+            nodes), 'quadratic' (exact mean over 3, 6 and 8 nodes quadratic
+            elements) or (corner weight, mid-side weight)
+        elements : list of int, optional
+            elements (default all the 1D and 2D elements)
+            
+        Returns
+        -------
+        SparseOperator (one row per element, labels: element numbers) giving
+        the element values from the node values of a timestep
+        """
+        if elements is None:
+            elements = self.elements_1D + self.elements_2D
+        rows, cols, weights = [], [], []
+        for i, element in enumerate(elements):
+            nodes, w = self._node_weights(element, weighting)
+            rows.extend([i] * len(nodes))
+            cols.extend([n - 1 for n in nodes])
+            weights.extend(w)
+        return SparseOperator(rows, cols, weights, len(elements), list(elements))
+    
+    def zone_operator(self, zones = None, weighting = 'uniform', total = False):
+        """
+        Parameters
+        ----------
+        zones : dict of list of int, optional
+            key: zone name
+            2D elements of the zone (default one zone per element type), the
+            1D elements are ignored and a zone without 2D element raises a
+            ValueError
+        weighting : str or tuple, optional - default 'uniform'
+            weighting of the nodes within each element (see element_operator)
+        total : bool, optional - default False
+            False for the area-weighted mean of each zone, True for the
+            area integral (e.g. volume from the depth)
+            
+        Returns
+        -------
+        SparseOperator (one row per zone, labels: zone names)
+        """
+        if zones is None:
+            zones = {}
+            for element in self.elements_2D:
+                zones.setdefault(self.elements_type[element], []).append(element)
+        elements_2D = set(self.elements_2D)
+        rows, cols, weights = [], [], []
+        for i, (zone, elements) in enumerate(zones.items()):
+            elements = [e for e in elements if e in elements_2D]
+            if not elements:
+                raise ValueError('Zone {} has no 2D element'.format(zone))
+            areas = self.element_areas(elements)
+            scale = areas if total else areas / areas.sum()
+            for element, area in zip(elements, scale):
+                nodes, w = self._node_weights(element, weighting)
+                rows.extend([i] * len(nodes))
+                cols.extend([n - 1 for n in nodes])
+                weights.extend([area * wn for wn in w])
+        return SparseOperator(rows, cols, weights, len(zones), list(zones))
+    
+    def select_nodes(self, bbox = None, polygon = None, element_types = None):
+        """
+        Parameters
+        ----------
+        bbox : tuple, optional
+            (xmin, ymin, xmax, ymax) of the box
+        polygon : list of (x, y), optional
+            vertices of the polygon
+        element_types : list of int, optional
+            element types (nodes of the elements of these types)
+            
+        Returns
+        -------
+        sorted list of the nodes meeting all the criteria given
+        """
+        nodes = np.array(sorted(self.nodes_list), dtype=np.int64)
+        X, Y = self.node_coordinates()
+        x, y = X[nodes - 1], Y[nodes - 1]
+        keep = np.ones(len(nodes), dtype=bool)
+        if bbox is not None:
+            xmin, ymin, xmax, ymax = bbox
+            keep &= (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+        if polygon is not None:
+            keep &= points_in_polygon(x, y, polygon)
+        if element_types is not None:
+            typed = set()
+            for element, nodes_element in self.elements.items():
+                if self.elements_type[element] in element_types:
+                    typed.update(nodes_element)
+            keep &= np.isin(nodes, list(typed))
+        return nodes[keep].tolist()
+    
+    def submesh(self, nodes):
+        """
+        Parameters
+        ----------
+        nodes : list of int
+            nodes to keep
+            
+        Returns
+        -------
+        Mesh of the elements whose nodes are all in the list, with the
+        elements and nodes renumbered from 1 (in the order of the original
+        numbers), to be written with save_mesh. Its attributes parent_nodes and
+        parent_elements give the original number of each new node and
+        element (new number - 1 = index). The number of elements and nodes
+        of the second line is updated and the sections following the nodes,
+        which refer to the original numbers, are not copied.
+        """
+        nodes = set(nodes)
+        parent_elements = [e for e in sorted(self.elements_list)
+                           if self.elements[e] and all(n in nodes for n in self.elements[e])]
+        parent_nodes = sorted(set(n for e in parent_elements for n in self.elements[e]))
+        number = {n: i + 1 for i, n in enumerate(parent_nodes)}
+        
+        element_lines = {int(l[:5]): l for l in self.lines[3:self.end_elementSection] if len(l) > 6}
+        lines = self.lines[:3]
+        lines[1] = '{:>10}{:>10}{}\n'.format(len(parent_elements), len(parent_nodes),
+                                             lines[1].rstrip('\n')[20:])
+        for i, element in enumerate(parent_elements):
+            fields = [number[n] for n in self.elements[element]]
+            fields += [0] * (8 - len(fields))
+            lines.append('{:>5}{}{}'.format(i + 1, ''.join('{:>5}'.format(n) for n in fields),
+                                            element_lines[element][45:]))
+        lines.extend(self.lines[self.end_elementSection:self.end_elementSection + 1])
+        lines.extend(self._node_line(number[n], self.nodes[n]) for n in parent_nodes)
+        lines.extend(self.lines[self.end_nodeSection:self.end_nodeSection + 1])
+        
+        mesh = Mesh.__new__(Mesh)
+        mesh.name = self.name
+        mesh.lines = lines
+        mesh._parse_lines()
+        mesh.parent_nodes = parent_nodes
+        mesh.parent_elements = parent_elements
+        return mesh
+
+    
+    def to_arrays(self):
+        """
+        Returns
+        -------
+        dict of arrays (e.g. to share the mesh between processes, see
+        pyrma.shared):
+            nodes: node numbers
+            x, y, z: coordinates and bed level (node n at index n - 1, nan for
+            the numbers without node)
+            elements: element numbers
+            element_types: type of each element
+            connectivity: nodes of each element (elements x 8, 0 padded)
+        """
+        x, y = self.node_coordinates()
+        z = np.full(len(x), np.nan)
+        nodes = np.array(self.nodes_list, dtype=np.int64)
+        z[nodes - 1] = [self.nodes[n]['z'] for n in self.nodes_list]
+        connectivity = np.zeros((len(self.elements_list), 8), dtype=np.int64)
+        for i, element in enumerate(self.elements_list):
+            connectivity[i, :len(self.elements[element])] = self.elements[element]
+        return {'nodes': nodes, 'x': x, 'y': y, 'z': z,
+                'elements': np.array(self.elements_list, dtype=np.int64),
+                'element_types': np.array([self.elements_type[e] for e in self.elements_list], dtype=np.int64),
+                'connectivity': connectivity}
+
+
+def points_in_polygon(x, y, polygon):
+    """
+    Parameters
+    ----------
+    x : array
+        x of the points
+    y : array
+        y of the points
+    polygon : list of (x, y)
+        vertices of the polygon
+        
+    Returns
+    -------
+    array of bool, True for the points inside the polygon (ray casting,
+    vectorised over the points)
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    polygon = np.asarray(polygon, dtype=float)
+    inside = np.zeros(x.shape, dtype=bool)
+    x1, y1 = polygon[-1]
+    for x2, y2 in polygon:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crosses = ((y1 > y) != (y2 > y)) & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+        inside ^= crosses
+        x1, y1 = x2, y2
+    return inside
@@ -0,0 +1,233 @@
+"""
+Node-major storage of RMA results: the timesteps of the result files are
+transposed block by block into on-disk arrays of shape (nodes x timesteps), so
+that the full history of a node is a contiguous read
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import json
+import os
+
+import numpy as np
+
+from . import derived
+from .dataset import RMADataset
+
+INDEX = 'index.json'
+
+
+class NodeStore:
+    """
+    Directory of node-major arrays (*.npy) built from RMA result files. Each
+    call to append() adds a segment (e.g. a year of results) holding one
+    array per variable; compact() merges the segments into a single one.
+
+    ...
+    Attributes
+    ----------
+    path: str
+        directory of the store
+    type: str
+        type of the result files
+    num_nodes: int
+        number of nodes
+    variables: list
+        keys of the variables (names, or constituent numbers for RMA11)
+    segments: list of str
+        names of the segments, in chronological order
+    times: array of datetime64
+        date of each timestep of the store
+
+
+    Methods
+    -------
+    append(filenames, time_block = 256)
+        transpose result files into a new segment
+    history(key, nodes, start = None, end = None)
+        return the dates and the values of nodes over time
+    compact(node_block = 4096)
+        merge all the segments into one
+    """
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            directory of the store, created on the first append if needed
+        """
+        self.path = path
+        self.type = None
+        self.num_nodes = None
+        self.variables = []
+        self.segments = []
+        self._times = []
+        index = os.path.join(path, INDEX)
+        if os.path.exists(index):
+            with open(index) as f:
+                info = json.load(f)
+            self.type = info['type']
+            self.num_nodes = info['num_nodes']
+            self.variables = info['variables']
+            self.segments = info['segments']
+            self._times = [np.load(self._file('times', s)) for s in self.segments]
+        self.times = self._concat_times()
+
+    def __len__(self):
+        return len(self.times)
+
+    def _concat_times(self):
+        if not self._times:
+            return np.array([], dtype='datetime64[ms]')
+        return np.concatenate(self._times)
+
+    def _file(self, key, segment):
+        return os.path.join(self.path, '{}.{}.npy'.format(key, segment))
+
+    def _save_index(self):
+        info = {'type': self.type, 'num_nodes': self.num_nodes,
+                'variables': self.variables, 'segments': self.segments}
+        tmp = os.path.join(self.path, INDEX + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp, os.path.join(self.path, INDEX))
+
+    def append(self, filenames, time_block=256):
+        """
+        Parameters
+        ----------
+        filenames : str or list of str
+            result files in chronological order, the timesteps already in
+            the store are skipped
+        time_block : int, optional - default 256
+            number of timesteps transposed at once (memory used: time_block x
+            nodes x variables float32)
+
+        Returns
+        -------
+        number of timesteps added
+        """
+        if isinstance(filenames, str):
+            filenames = [filenames]
+        with RMADataset(filenames) as dataset:
+            if self.type is None:
+                self.type = dataset.type.strip()
+                self.num_nodes = dataset.num_nodes
+                self.variables = list(dataset.variables)
+            elif dataset.num_nodes != self.num_nodes or dataset.type.strip() != self.type:
+                raise ValueError('The results ({}, {} nodes) do not match the store ({}, {} nodes)'.format(
+                    dataset.type.strip(), dataset.num_nodes, self.type, self.num_nodes))
+            first = 0
+            if len(self.times):
+                first = int(np.searchsorted(dataset.times, self.times[-1], side='right'))
+            num_frames = len(dataset) - first
+            if num_frames <= 0:
+                return 0
+
+            os.makedirs(self.path, exist_ok=True)
+            segment = '{:04d}'.format(int(self.segments[-1]) + 1 if self.segments else 0)
+            # arrays are written to temporary files, renamed once complete
+            arrays = {key: np.lib.format.open_memmap(self._file(key, segment) + '.tmp', mode='w+',
+                                                     dtype=np.float32, shape=(self.num_nodes, num_frames))
+                      for key in self.variables}
+            block = {key: np.empty((time_block, self.num_nodes), dtype=np.float32) for key in self.variables}
+            for t0 in range(0, num_frames, time_block):
+                t1 = min(t0 + time_block, num_frames)
+                for k, (date, values) in enumerate(dataset.isel(slice(first + t0, first + t1))):
+                    for key in self.variables:
+                        block[key][k] = values[key]
+                for key in self.variables:
+                    arrays[key][:, t0:t1] = block[key][:t1 - t0].T
+            for array in arrays.values():
+                array.flush()
+            arrays.clear()
+            for key in self.variables:
+                os.replace(self._file(key, segment) + '.tmp', self._file(key, segment))
+            times = dataset.times[first:]
+            np.save(self._file('times', segment), times)
+
+        self.segments.append(segment)
+        self._times.append(times)
+        self.times = self._concat_times()
+        self._save_index()
+        return num_frames
+
+    def _key(self, key):
+        # constituent numbers are stored as int (RMA11)
+        if isinstance(key, str) and key.isdigit() and int(key) in self.variables:
+            return int(key)
+        return key
+
+    def _raw_history(self, key, idx, start, end):
+        parts = []
+        offset = 0
+        for segment, times in zip(self.segments, self._times):
+            a, b = max(start - offset, 0), min(end - offset, len(times))
+            if a < b:
+                array = np.load(self._file(key, segment), mmap_mode='r')
+                parts.append(np.array(array[idx, a:b]))
+            offset += len(times)
+        if not parts:
+            return np.empty((len(idx), 0), dtype=np.float32)
+        return np.concatenate(parts, axis=1)
+
+    def history(self, key, nodes, start=None, end=None):
+        """
+        Parameters
+        ----------
+        key : str or int
+            variable (raw or derived) or RMA11 constituent number
+        nodes : int or list of int
+            node number(s)
+        start : datetime or str, optional
+            first date (default first timestep)
+        end : datetime or str, optional
+            last date, included (default last timestep)
+
+        Returns
+        -------
+        array of the dates, array of the values (nodes x timesteps, or
+        timesteps for a single node)
+        """
+        single = isinstance(nodes, (int, np.integer))
+        idx = np.atleast_1d(np.asarray(nodes, dtype=np.int64)) - 1
+        a = 0 if start is None else int(np.searchsorted(self.times, np.datetime64(start, 'ms'), side='left'))
+        b = len(self) if end is None else int(np.searchsorted(self.times, np.datetime64(end, 'ms'), side='right'))
+        key = self._key(key)
+        if key in self.variables:
+            values = self._raw_history(key, idx, a, b)
+        else:
+            raw = {k: self._raw_history(k, idx, a, b) for k in self.variables}
+            values = derived.evaluate(key, raw)
+        return self.times[a:b], values[0] if single else values
+
+    def compact(self, node_block=4096):
+        """
+        Parameters
+        ----------
+        node_block : int, optional - default 4096
+            number of nodes copied at once
+        """
+        if len(self.segments) < 2:
+            return
+        segment = '{:04d}'.format(int(self.segments[-1]) + 1)
+        for key in self.variables:
+            array = np.lib.format.open_memmap(self._file(key, segment) + '.tmp', mode='w+',
+                                              dtype=np.float32, shape=(self.num_nodes, len(self)))
+            for n0 in range(0, self.num_nodes, node_block):
+                n1 = min(n0 + node_block, self.num_nodes)
+                array[n0:n1] = self._raw_history(key, np.arange(n0, n1), 0, len(self))
+            array.flush()
+            del array
+        for key in self.variables:
+            os.replace(self._file(key, segment) + '.tmp', self._file(key, segment))
+        np.save(self._file('times', segment), self.times)
+
+        old = self.segments
+        self.segments = [segment]
+        self._times = [self.times]
+        self._save_index()
+        for s in old:
+            for key in self.variables + ['times']:
+                os.remove(self._file(key, s))
@@ -0,0 +1,97 @@
+"""
+Sparse linear operators applied to the node values of each RMA timestep
+(cross-section integrals, node to element averages ...)
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import numpy as np
+
+
+class SparseOperator:
+    """
+    Sparse matrix (rows x nodes) in coordinate format, applied to the values
+    of all the nodes of a timestep with a single weighted bincount
+
+    ...
+    Attributes
+    ----------
+    rows: array of int
+        row of each coefficient
+    cols: array of int
+        index of the node of each coefficient (node number - 1)
+    weights: array of float
+        coefficients
+    num_rows: int
+        number of rows (outputs)
+    labels: list
+        name of each row (e.g. element numbers), None if not set
+
+
+    Methods
+    -------
+    apply(values)
+        return the array of the rows
+    stack(operators) (static method)
+        return the operator made of the rows of all the operators
+    """
+    def __init__(self, rows, cols, weights, num_rows, labels=None):
+        """
+        Parameters
+        ----------
+        rows : list of int
+            row of each coefficient
+        cols : list of int
+            index of the node of each coefficient (node number - 1)
+        weights : list of float
+            coefficients
+        num_rows : int
+            number of rows
+        labels : list, optional
+            name of each row
+        """
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.num_rows = num_rows
+        self.labels = labels
+
+    def apply(self, values):
+        """
+        Parameters
+        ----------
+        values : array
+            values of all the nodes (node n at index n - 1)
+
+        Returns
+        -------
+        array of the num_rows outputs
+        """
+        return np.bincount(self.rows, weights=self.weights * values[self.cols],
+                           minlength=self.num_rows)
+
+    @staticmethod
+    def stack(operators):
+        """
+        Parameters
+        ----------
+        operators : list of SparseOperator
+            operators to stack
+
+        Returns
+        -------
+        SparseOperator whose rows are the rows of all the operators, in order
+        """
+        rows, cols, weights, labels = [], [], [], []
+        offset = 0
+        for op in operators:
+            labels.extend(op.labels if op.labels is not None else range(offset, offset + op.num_rows))
+            rows.append(op.rows + offset)
+            cols.append(op.cols)
+            weights.append(op.weights)
+            offset += op.num_rows
+        if not operators:
+            return SparseOperator([], [], [], 0)
+        return SparseOperator(np.concatenate(rows), np.concatenate(cols),
+                              np.concatenate(weights), offset, labels)
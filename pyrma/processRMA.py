@@ -7,12 +7,13 @@ Convert a list of RMA Modelling Suite (RMA-2, RMA-11 and RMA-10) result files
 #Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
 
 
-from .rma import RMA
-from datetime import datetime, timedelta
+import os
+from .rma import open_results, round_dates
+from .dataset import RMADataset
+from . import derived
 import numpy as np
-from .mesh import Mesh
-import pandas as pd
-from datetime import datetime, timedelta
+from .resample import Resampler
+from .section import SectionSet, section_variables
 
 class ProcessRMA:
     """
@@ -25,7 +26,21 @@ class ProcessRMA:
        list of all the files to process
     nodes: list of int
        list of all the nodes
-
+    instrument: Instrument
+       timers, counters and progress callback (None to disable)
+    drop_overlap: bool
+       skip the timesteps not later than the last one written (timesteps
+       repeated at restart boundaries)
+    hydro: RMADataset
+       hydrodynamic results combined with RMA11 results (None if not used)
+    start: datetime
+       first date exported (None for the first timestep)
+    end: datetime
+       last date exported (None for the last timestep)
+    stride: int
+       export one timestep every stride timesteps
+    verbose: bool
+       print the header of each rma file opened
 
     
     Methods
@@ -39,20 +54,51 @@ class ProcessRMA:
     rma10_to_csv(output_name,parameters = ['xvel','yvel','zvel',
                     'depth','elevation','salinity','temperature','sussed'])
        save rma10 result files into a csv file
+    resample_to_csv(output_name,parameters = ['depth'],period = 'daily',stats = ['mean','min','max'])
+       save hourly/daily/monthly/yearly statistics into csv files
+    sections_to_csv(output_name,sections,parameters = ['discharge'])
+       save the discharge or mass flux through cross-sections into csv files
+    operator_to_csv(output_name,operator,parameters = ['depth'])
+       save element or zone values into csv files
     makeRaster(mesh_name,filenames,parameter,percentiles,bins=(60,60)) (static method)
 
     """    
-    def __init__(self,filenames, nodes):
+    def __init__(self,filenames, nodes, instrument = None, drop_overlap = False, hydro = None,
+                 start = None, end = None, stride = 1, verbose = True):
         """
         Parameters
         ----------
         filenames : list of str
-            List of all the rma files
+            List of all the rma files (or archives, see archive.write_archive)
         nodes : list of int
             List of all the nodes number to extract data
+        instrument : Instrument, optional
+            collect timers, counters and progress of the exports
+        drop_overlap : bool, optional - default False
+            skip the timesteps repeated at the start of each file
+        hydro : list of str, optional
+            RMA2/RMA10 files matching RMA11 files, to export constituent
+            fluxes (e.g. 'flux_1')
+        start : datetime, optional
+            first date exported (default first timestep)
+        end : datetime, optional
+            last date exported, included (default last timestep)
+        stride : int, optional - default 1
+            export one timestep every stride timesteps
+        verbose : bool, optional - default True
+            print the header of each rma file opened
         """ 
         self.filenames = filenames
         self.nodes = nodes
+        self.instrument = instrument
+        self.drop_overlap = drop_overlap
+        self.start = start
+        self.end = end
+        self.stride = stride
+        self.verbose = verbose
+        self.hydro = None
+        if hydro is not None:
+            self.hydro = RMADataset(hydro)
         
     def update_nodes(self,nodes):
         """
@@ -70,7 +116,8 @@ class ProcessRMA:
         output_name : str
             List of all the elt files
         parameters: list of str
-            List of all the parameters to save
+            List of all the parameters to save (raw or derived variables,
+            e.g. 'speed', 'direction', 'unit_discharge', see derived.DERIVED)
         """ 
         pre = output_name[:-4]
         suf = output_name[-4:]
@@ -79,23 +126,9 @@ class ProcessRMA:
                   'depth':'{}_depth{}'.format(pre,suf),
                   'elevation':'{}_elevation{}'.format(pre,suf)
                 }
-        fnames = {}
-        for param in parameters:
-            fnames[param] = open(fnames_dict[param],'w')
-            fnames[param].write('Date,{}\n'.format(','.join(map(str,self.nodes))))
-                
-        for filename in self.filenames:
-            R=RMA(filename)
-
-            while R.next():
-                date_step = datetime(R.year,1,1) + timedelta(hours = R.time)
-                for param in parameters:   
-                    param_val = getattr(R,param)
-                    param_nodes = [param_val[n] for n in self.nodes]
-                    fnames[param].write('{},{}\n'.format(date_step,','.join(map(str,param_nodes))))
-                    
-        for param in parameters:
-            fnames[param].close()
+        sink = CSVSink({param: fnames_dict.get(param, '{}_{}{}'.format(pre,param,suf)) for param in parameters}, self.nodes)
+        self._export(sink, {param: param for param in parameters})
+        sink.close()
             
                 
     def rma11_to_csv(self,output_name,dict_constituents = {'SALINITY':1}):
@@ -105,7 +138,8 @@ class ProcessRMA:
         output_name : str
             List of all the elt files
         dict_constituents: dict
-            dictionary linking constituent name and number to be output
+            dictionary linking constituent name and number to be output (or
+            derived variable, e.g. {'SALT_FLUX':'flux_1'} with hydro set)
         """ 
         pre = output_name[:-4]
         suf = output_name[-4:]
@@ -113,25 +147,11 @@ class ProcessRMA:
         list_constituents_name = [name for name,val in dict_constituents.items()]
         fnames_dict = {}
         for name,val in dict_constituents.items():
-            fnames_dict[name] = '{}_{}{}'.format(name,pre,suf)
+            fnames_dict[name] = os.path.join(os.path.dirname(pre), '{}_{}{}'.format(name,os.path.basename(pre),suf))
 
-        fnames = {}
-        for param in list_constituents_name:
-            fnames[param] = open(fnames_dict[param],'w')
-            fnames[param].write('Date,{}\n'.format(','.join(map(str,self.nodes))))
-                
-        for filename in self.filenames:
-            R=RMA(filename)
-
-            while R.next():
-                date_step = datetime(R.year,1,1) + timedelta(hours = R.time)
-                for param,val in dict_constituents.items():   
-                    param_val = R.constit[val]
-                    param_nodes = [param_val[n] for n in self.nodes]
-                    fnames[param].write('{},{}\n'.format(date_step,','.join(map(str,param_nodes))))
-                    
-        for key,val in fnames.items():
-            val.close()
+        sink = CSVSink({param: fnames_dict[param] for param in list_constituents_name}, self.nodes)
+        self._export(sink, dict_constituents)
+        sink.close()
     
     def rma10_to_csv(self,output_name,parameters = ['xvel','yvel','zvel',
                     'depth','elevation','salinity','temperature','sussed']):
@@ -141,7 +161,8 @@ class ProcessRMA:
         output_name : str
             List of all the elt files
         parameters: list of str
-            List of all the parameters to save
+            List of all the parameters to save (raw or derived variables,
+            e.g. 'speed', 'direction', 'unit_discharge', see derived.DERIVED)
         """ 
         pre = output_name[:-4]
         suf = output_name[-4:]
@@ -154,22 +175,327 @@ class ProcessRMA:
                   'temperature':'{}_temperature{}'.format(pre,suf),
                   'sussed':'{}_sussed{}'.format(pre,suf)
                 }
-        fnames = {}
+        sink = CSVSink({param: fnames_dict.get(param, '{}_{}{}'.format(pre,param,suf)) for param in parameters}, self.nodes)
+        self._export(sink, {param: param for param in parameters})
+        sink.close()
+
+    def resample_to_csv(self,output_name,parameters = ['depth'],period = 'daily',
+                        stats = ['mean','min','max']):
+        """
+        Save period statistics (one row per hour, day, month or year) of the
+        result files to csv files, without exporting the timesteps. Periods
+        spanning two files are handled and the timesteps repeated at restart
+        boundaries are skipped.
+        
+        Parameters
+        ----------
+        output_name : str
+            name of the output, '{name}_{parameter}_{period}_{stat}.csv' files
+            are created
+        parameters : list of str or dict
+            List of the variables to resample, or dictionary linking an output
+            name and a variable name, derived variable or constituent number
+            (e.g. {'SALINITY':1})
+        period : str
+            'hourly', 'daily', 'monthly' or 'yearly'
+        stats : list of str
+            statistics to save ('mean', 'min', 'max', 'sum', 'count')
+        """ 
+        if not isinstance(parameters, dict):
+            parameters = {param: param for param in parameters}
+        pre = output_name[:-4]
+        suf = output_name[-4:]
+        fnames_dict = {}
         for param in parameters:
-            fnames[param] = open(fnames_dict[param],'w')
-            fnames[param].write('Date,{}\n'.format(','.join(map(str,self.nodes))))
+            for stat in stats:
+                fnames_dict[(param, stat)] = '{}_{}_{}_{}{}'.format(pre,param,period,stat,suf)
+        sink = CSVSink(fnames_dict, self.nodes)
+        
+        index = np.asarray(self.nodes, dtype=np.int64) - 1
+        resamplers = {param: Resampler(len(index), period, stats) for param in parameters}
+        
+        def write(param, finished):
+            if finished is not None:
+                start, results = finished
+                self._write(sink, start, {(param, stat): results[stat].tolist() for stat in stats})
                 
-        for filename in self.filenames:
-            R=RMA()
-            R.open(filename)
+        for R in self._frames(drop_overlap = True):
+            # rounded as the dates of RMADataset, 23:59:59.99 belongs to the next day
+            date_step = round_dates([R.year], [R.time])[0].item()
+            for param, key in parameters.items():
+                write(param, resamplers[param].update(date_step, derived.evaluate(key, R.values)[index]))
+        for param in parameters:
+            write(param, resamplers[param].flush())
+            
+        sink.close()
+        if self.instrument is not None:
+            self.instrument.finish()
 
-            while R.next():
-                date_step = datetime(R.year,1,1) + timedelta(hours = R.time)
-                for param in parameters:   
-                    param_val = getattr(R,param)
-                    param_nodes = [param_val[n] for n in self.nodes]
-                    fnames[param].write('{},{}\n'.format(date_step,','.join(map(str,param_nodes))))
+    def sections_to_csv(self,output_name,sections,parameters = ['discharge']):
+        """
+        Save the discharge (or mass flux) through cross-sections at each
+        timestep to csv files, one column per section. All the sections are
+        evaluated in a single pass through the files.
+        
+        Parameters
+        ----------
+        output_name : str
+            name of the output, '{name}_{parameter}.csv' files are created
+        sections : list of CrossSection
+            sections (see Mesh.cross_section)
+        parameters : list of str
+            'discharge' or mass fluxes ('flux_1' for the RMA11 constituent 1
+            with hydro set, 'flux_salinity' for RMA10)
+        """ 
+        pre = output_name[:-4]
+        suf = output_name[-4:]
+        section_set = SectionSet(sections)
+        sink = CSVSink({param: '{}_{}{}'.format(pre,param,suf) for param in parameters}, section_set.names)
+        components = {param: section_variables(param) for param in parameters}
+        
+        for R in self._frames():
+            rows = {}
+            for param, (key_x, key_y) in components.items():
+                rows[param] = section_set.apply(derived.evaluate(key_x, R.values),
+                                                derived.evaluate(key_y, R.values)).tolist()
+            self._write(sink, R.date(), rows)
+            
+        sink.close()
+        if self.instrument is not None:
+            self.instrument.finish()
+
+    def operator_to_csv(self,output_name,operator,parameters = ['depth']):
+        """
+        Save values computed from the nodes by a sparse operator (element
+        means, zone means or totals, see Mesh.element_operator and
+        Mesh.zone_operator) at each timestep to csv files, one column per
+        element or zone.
+        
+        Parameters
+        ----------
+        output_name : str
+            name of the output, '{name}_{parameter}.csv' files are created
+        operator : SparseOperator
+            operator applied to each timestep (labels used as column names)
+        parameters : list of str or dict
+            List of the variables (raw or derived), or dictionary linking an
+            output name and a variable name or constituent number
+        """ 
+        if not isinstance(parameters, dict):
+            parameters = {param: param for param in parameters}
+        pre = output_name[:-4]
+        suf = output_name[-4:]
+        labels = operator.labels if operator.labels is not None else range(1, operator.num_rows + 1)
+        sink = CSVSink({param: '{}_{}{}'.format(pre,param,suf) for param in parameters}, labels)
+        
+        for R in self._frames():
+            rows = {}
+            for param, key in parameters.items():
+                rows[param] = operator.apply(derived.evaluate(key, R.values)).tolist()
+            self._write(sink, R.date(), rows)
+            
+        sink.close()
+        if self.instrument is not None:
+            self.instrument.finish()
+
+    def _frames(self, drop_overlap = None):
+        """
+        Generator going through the timesteps of all the files
+        
+        Parameters
+        ----------
+        drop_overlap : bool, optional
+            skip the timesteps not later than the previous one (default
+            drop_overlap attribute)
+            
+        Yields
+        ------
+        RMA object holding the timestep (values attribute), between the start
+        and end dates and every stride timesteps
+        """
+        if drop_overlap is None:
+            drop_overlap = self.drop_overlap
+        instrument = self.instrument
+        last_date = None
+        count = 0
+        
+        for i, filename in enumerate(self.filenames):
+            if instrument is not None:
+                instrument.file(filename, i, len(self.filenames))
+            R = open_results(filename, instrument = instrument, verbose = self.verbose,
+                             hydro = self.hydro)
+            if self.end is not None and R.num_frames > 0 and R.frame_date(0) > self.end:
+                R.close()
+                break
+            if self.start is not None and R.num_frames > 0 and R.frame_date(-1) < self.start:
+                R.close()
+                continue
+            # first timestep not before start, found from the timestep headers
+            first = 0
+            if self.start is not None:
+                last = R.num_frames
+                while first < last:
+                    mid = (first + last) // 2
+                    if R.frame_date(mid) < self.start:
+                        first = mid + 1
+                    else:
+                        last = mid
+            R.seek(first)
+            
+            # nodes are selected from R.values, no need to build dicts
+            while R.next(nodes = []):
+                date_step = R.date()
+                if drop_overlap:
+                    if last_date is not None and date_step <= last_date:
+                        continue
+                    last_date = date_step
+                if self.start is not None and date_step < self.start:
+                    continue
+                if self.end is not None and date_step > self.end:
+                    break
+                count += 1
+                if (count - 1) % self.stride:
+                    continue
+                yield R
+            R.close()
+            
+    def _write(self, sink, date_step, rows):
+        """
+        Parameters
+        ----------
+        sink : CSVSink
+            output
+        date_step : datetime
+            date of the rows
+        rows : dict of list
+            key: output name
+            values of the row
+        """
+        instrument = self.instrument
+        if instrument is not None:
+            t0 = instrument.start()
+        rows = {name: sink.format_row(date_step, values) for name, values in rows.items()}
+        if instrument is not None:
+            t0 = instrument.stop('format', t0)
+        for name, row in rows.items():
+            sink.write_row(name, row)
+        if instrument is not None:
+            instrument.stop('write', t0)
+            instrument.count('rows_written', len(rows))
+
+    def _export(self, sink, variables):
+        """
+        Write one row per timestep of all the files to the sink
+        
+        Parameters
+        ----------
+        sink : CSVSink
+            output
+        variables : dict
+            key: output name
+            key of the variable in RMA.values (name or constituent number)
+        """
+        instrument = self.instrument
+        index = np.asarray(self.nodes, dtype=np.int64) - 1
+        
+        for R in self._frames():
+            if instrument is not None:
+                t0 = instrument.start()
+            rows = {}
+            for name, key in variables.items():
+                rows[name] = derived.evaluate(key, R.values)[index].tolist()
+            if instrument is not None:
+                instrument.stop('select', t0)
+            self._write(sink, R.date(), rows)
                     
-        for param in parameters:
-            fnames[param].close()
-            
\ No newline at end of file
+        if instrument is not None:
+            instrument.finish()
+
+
+class CSVSink:
+    """
+    Output of ProcessRMA: one csv file per output name, with a Date column
+    and one column per node (or element, zone ...)
+    
+    ...
+    Attributes
+    ----------
+    files: dict of file
+        key: output name
+        open csv file
+    columns: list
+        column names (after Date)
+    
+    
+    Methods
+    -------
+    format_row(date, values)
+        return a formatted csv row
+    write_row(name, row)
+        write a formatted row to an output
+    write(name, date, values)
+        format and write a row to an output
+    close()
+        close all the files
+    """
+    def __init__(self, fnames, columns):
+        """
+        Parameters
+        ----------
+        fnames : dict of str
+            key: output name
+            name of the csv file
+        columns : list
+            column names (after Date)
+        """
+        self.columns = columns
+        self.files = {}
+        for name, fname in fnames.items():
+            self.files[name] = open(fname,'w')
+            self.files[name].write('Date,{}\n'.format(','.join(map(str,columns))))
+            
+    def format_row(self, date, values):
+        """
+        Parameters
+        ----------
+        date : datetime
+            date of the row
+        values : list
+            values of the row
+        
+        Returns
+        -------
+        str of the csv row
+        """
+        return '{},{}\n'.format(date,','.join(map(str,values)))
+    
+    def write_row(self, name, row):
+        """
+        Parameters
+        ----------
+        name : str
+            output name
+        row : str
+            formatted csv row
+        """
+        self.files[name].write(row)
+        
+    def write(self, name, date, values):
+        """
+        Parameters
+        ----------
+        name : str
+            output name
+        date : datetime
+            date of the row
+        values : list
+            values of the row
+        """
+        self.write_row(name, self.format_row(date, values))
+        
+    def close(self):
+        """
+        close all the files
+        """
+        for f in self.files.values():
+            f.close()
@@ -0,0 +1,128 @@
+"""
+Streaming temporal resampling of RMA results: hourly, daily, monthly or
+yearly mean/min/max/sum of each node, computed as the timesteps are read
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+from datetime import datetime
+
+import numpy as np
+
+# start of the period holding a date
+PERIODS = {'hourly': lambda d: datetime(d.year, d.month, d.day, d.hour),
+           'daily': lambda d: datetime(d.year, d.month, d.day),
+           'monthly': lambda d: datetime(d.year, d.month, 1),
+           'yearly': lambda d: datetime(d.year, 1, 1)}
+
+STATS = ['mean', 'min', 'max', 'sum', 'count']
+
+
+class Resampler:
+    """
+    Accumulate the values of the timesteps of a calendar period in
+    preallocated arrays and return the statistics when the period ends
+
+    ...
+    Attributes
+    ----------
+    period: str
+        'hourly', 'daily', 'monthly' or 'yearly'
+    stats: list of str
+        statistics to compute ('mean', 'min', 'max', 'sum', 'count')
+    start: datetime
+        start of the period being accumulated
+
+
+    Methods
+    -------
+    update(date, values)
+        add a timestep, return (start, stats) of the previous period when a new
+        period starts
+    flush()
+        return (start, stats) of the period being accumulated
+    """
+    def __init__(self, num_values, period='daily', stats=['mean', 'min', 'max']):
+        """
+        Parameters
+        ----------
+        num_values : int
+            number of values of each timestep (e.g. number of nodes)
+        period : str, optional - default 'daily'
+            'hourly', 'daily', 'monthly' or 'yearly'
+        stats : list of str, optional - default ['mean', 'min', 'max']
+            statistics to compute
+        """
+        if period not in PERIODS:
+            raise ValueError('The period: {} is not implemented - select one of {}'.format(period, list(PERIODS)))
+        for stat in stats:
+            if stat not in STATS:
+                raise ValueError('The statistic: {} is not implemented - select in {}'.format(stat, STATS))
+        self.period = period
+        self.stats = list(stats)
+        self._period_start = PERIODS[period]
+        self.start = None
+        self._sum = np.zeros(num_values)
+        self._min = np.full(num_values, np.inf)
+        self._max = np.full(num_values, -np.inf)
+        self._count = 0
+
+    def _reset(self):
+        self._sum[:] = 0.0
+        self._min[:] = np.inf
+        self._max[:] = -np.inf
+        self._count = 0
+
+    def _results(self):
+        results = {}
+        for stat in self.stats:
+            if stat == 'mean':
+                results[stat] = self._sum / self._count
+            elif stat == 'min':
+                results[stat] = self._min.copy()
+            elif stat == 'max':
+                results[stat] = self._max.copy()
+            elif stat == 'sum':
+                results[stat] = self._sum.copy()
+            else:
+                results[stat] = np.full(len(self._sum), self._count)
+        return results
+
+    def update(self, date, values):
+        """
+        Parameters
+        ----------
+        date : datetime
+            date of the timestep
+        values : array
+            values of the timestep
+
+        Returns
+        -------
+        None, or (start, dict of stat:array) of the previous period when the
+        timestep starts a new period
+        """
+        start = self._period_start(date)
+        finished = None
+        if self.start is not None and start != self.start:
+            finished = self.flush()
+        self.start = start
+        self._sum += values
+        np.minimum(self._min, values, out=self._min)
+        np.maximum(self._max, values, out=self._max)
+        self._count += 1
+        return finished
+
+    def flush(self):
+        """
+        Returns
+        -------
+        None if no timestep was added, otherwise (start, dict of stat:array)
+        of the period being accumulated, which is reset
+        """
+        if self._count == 0:
+            return None
+        finished = (self.start, self._results())
+        self._reset()
+        return finished
@@ -1,11 +1,87 @@
 from struct import unpack
+from datetime import datetime, timedelta
+import os
+import numpy
+from . import derived
+
+# order of the per-node values of a RMA10 timestep
+RMA10_VARIABLES = ['xvel', 'yvel', 'depth', 'salinity', 'temperature', 'sussed', 'zvel', 'elevation']
+
+# size (in bytes) of the header of the file and of each timestep
+HEADER_SIZE = 1000
+FRAME_HEADER_SIZE = {'RMA2      ': 12, 'RMA11     ': 16, 'RMA10     ': 20}
+FRAME_HEADER_FORMAT = {'RMA2      ': 'fii', 'RMA11     ': 'fiii', 'RMA10     ': 'fiiii'}
 
 # Updated 18/07/2021 MD: Rewrote BM pyrma script to increase performance
 
+
+def round_dates(years, hours):
+    """
+    Parameters
+    ----------
+    years : array of int
+        year of the timesteps
+    hours : array of float
+        hours of the timesteps from the start of their year
+
+    Returns
+    -------
+    array of datetime64[ms] of the timesteps, rounded to the second
+    """
+    years = (numpy.asarray(years, dtype=numpy.int64) - 1970).astype('datetime64[Y]').astype('datetime64[ms]')
+    seconds = numpy.round(numpy.asarray(hours, dtype=numpy.float64) * 3600).astype(numpy.int64)
+    return years + seconds.astype('timedelta64[s]')
+
+
+def open_results(file, instrument=None, verbose=True, hydro=None):
+    """
+    Parameters
+    ----------
+    file : str
+        RMA2, RMA10 or RMA11 result file, or archive created with
+        archive.write_archive
+    instrument : Instrument, optional
+        collect timers and counters
+    verbose : bool, optional - default True
+        print the RMA11 header information
+    hydro : str, list of str or RMADataset, optional
+        RMA2/RMA10 results matched by date to the RMA11 timesteps
+
+    Returns
+    -------
+    RMA or RMAArchive reading the file
+    """
+    from .archive import MAGIC, RMAArchive
+    with open(file, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return RMAArchive(file, instrument, verbose, hydro=hydro)
+    return RMA(file, instrument, verbose, hydro)
+
+
 class RMA:
-    def __init__(self,file):
+    def __init__(self,file,instrument=None,verbose=True,hydro=None):
+        self.filename = file
         self.file = open(file, 'rb')
-        self.header = self.file.read(1000).decode("utf-8")
+        self.instrument = instrument
+        self.verbose = verbose
+        # RMA2/RMA10 results matched by date to the RMA11 timesteps
+        if hydro is not None and not hasattr(hydro, 'sel'):
+            from .dataset import RMADataset
+            hydro = RMADataset([hydro] if isinstance(hydro, str) else hydro)
+        self.hydro = hydro
+        self._parse_header(self.file.read(HEADER_SIZE).decode("utf-8"))
+        self._layout()
+        
+    def _parse_header(self, header):
+        """
+        Parameters
+        ----------
+        header : str
+            1000 characters header of the result file
+        """
+        verbose = self.verbose
+        self.header = header
         self.type = self.header[0:10]
         self.title = self.header[100:172]
         self.geometry = self.header[200:300]
@@ -22,6 +98,9 @@ class RMA:
         self.temperature = {}
         self.salinity = {}
         self.sussed = {}
+        self.values = {}
+        self._nodes = None
+        self._index = None
         
         if self.type == 'RMA11     ':
             self.num_constits = int(self.header[60:70])
@@ -32,8 +111,9 @@ class RMA:
             self.constit_name = []
             self.constit_name.append("NULL")
             i = 1
-            print(self.num_constits)
-            print(self.header[300:1000])
+            if verbose:
+                print(self.num_constits)
+                print(self.header[300:1000])
                         
             while i <= self.num_constits:
                 # print self.header[300:400]
@@ -42,7 +122,8 @@ class RMA:
                     self.constit_name.append("  BSHEAR")
                     self.constit_name.append("BedThick")
                     j = 1
-                    print(self.num_sedlayers)
+                    if verbose:
+                        print(self.num_sedlayers)
                     while j <= self.num_sedlayers:
                         self.constit_name.append(" L%dThick" % j)
                         j = j + 1
@@ -50,9 +131,172 @@ class RMA:
             self.constit = {}
             for i in range(1,self.num_constits + 1):
                 self.constit[i] = {}
-                
+        
+    def _layout(self):
+        """
+        method to get the size of a timestep (in bytes) from the first
+        timestep and the number of timesteps from the size of the file
+        """
+        self.frame_header_size = FRAME_HEADER_SIZE.get(self.type, 0)
+        self.frame_size = 0
+        self.num_frames = 0
+        t = self.file.read(self.frame_header_size)
+        self.file.seek(HEADER_SIZE)
+        if self.frame_header_size == 0 or len(t) < self.frame_header_size:
+            return
+        
+        if self.type == 'RMA2      ':
+            np = unpack('fii', t)[1]
+            self.frame_size = 12 + 20 * np
+        elif self.type == 'RMA11     ':
+            nqal, np = unpack('fiii', t)[1:3]
+            self.frame_size = 16 + 4 * nqal * np
+        elif self.type == 'RMA10     ':
+            np, ndf, ne = unpack('fiiii', t)[1:4]
+            self.frame_size = 20 + 4 * (9 * np + ne)
+        self.num_frames = (os.path.getsize(self.filename) - HEADER_SIZE) // self.frame_size
+        
+    def seek(self, frame):
+        """
+        Parameters
+        ----------
+        frame : int
+            index of the timestep read by the next call of next()
+        """
+        if frame < 0:
+            frame += self.num_frames
+        self.file.seek(HEADER_SIZE + frame * self.frame_size)
+        
+    def frame_date(self, frame):
+        """
+        Parameters
+        ----------
+        frame : int
+            index of the timestep
+            
+        Returns
+        -------
+        datetime of the timestep, read from its header only (the next call of
+        next() reads the following timestep)
+        """
+        if frame < 0:
+            frame += self.num_frames
+        self.file.seek(HEADER_SIZE + frame * self.frame_size)
+        a = unpack(FRAME_HEADER_FORMAT[self.type], self.file.read(self.frame_header_size))
+        self.file.seek(HEADER_SIZE + (frame + 1) * self.frame_size)
+        # TETT first, IYRR last in the header of all the result types
+        return datetime(a[-1],1,1) + timedelta(hours = a[0])
+    
+    def frame_dates(self):
+        """
+        Returns
+        -------
+        array of datetime64[ms] of all the timesteps, read from their headers
+        only and rounded to the second (the hours are stored as float32, e.g.
+        0.1 h is read as 00:05:59.99999)
+        """
+        if self.num_frames == 0:
+            return numpy.array([], dtype='datetime64[ms]')
+        # TETT first, IYRR last in the header of all the result types
+        headers = numpy.dtype({'names': ['time', 'year'], 'formats': ['=f4', '=i4'],
+                               'offsets': [0, self.frame_header_size - 4], 'itemsize': self.frame_size})
+        a = numpy.memmap(self.filename, dtype=headers, mode='r', offset=HEADER_SIZE, shape=(self.num_frames,))
+        dates = round_dates(a['year'], a['time'])
+        del a
+        return dates
+
+    def date(self):
+        """
+        Returns
+        -------
+        datetime of the last timestep read
+        """
+        return datetime(self.year,1,1) + timedelta(hours = self.time)
+        
+    def variables(self):
+        """
+        Returns
+        -------
+        list of the keys of the variables of a timestep (names for RMA2 and
+        RMA10, constituent numbers for RMA11), as used in values
+        """
+        if self.type == 'RMA2      ':
+            return ['xvel', 'yvel', 'depth', 'elevation']
+        if self.type == 'RMA10     ':
+            return list(RMA10_VARIABLES)
+        if self.type == 'RMA11     ':
+            return list(range(1, self.num_constits + 1))
+        return []
+        
+    def _variable_layout(self, key):
+        """
+        Parameters
+        ----------
+        key : str or int
+            variable name or constituent number
+            
+        Returns
+        -------
+        position of the first value (in floats after the timestep header),
+        number of floats between two nodes and position within the node
+        """
+        np = self.num_nodes
+        if self.type == 'RMA2      ':
+            if key == 'elevation':
+                return 3 * np, 1, 0
+            return 0, 3, ['xvel', 'yvel', 'depth'].index(key)
+        if self.type == 'RMA10     ':
+            return 0, 8, RMA10_VARIABLES.index(key)
+        if self.type == 'RMA11     ':
+            if not 1 <= key <= self.num_constits:
+                raise KeyError(key)
+            return np * (key + 4), 1, 0
+        raise KeyError(key)
+        
+    def read_variable(self, frame, key, start=0, stop=None):
+        """
+        Read one variable of one timestep for a contiguous range of nodes,
+        without reading the rest of the timestep
+        
+        Parameters
+        ----------
+        frame : int
+            index of the timestep
+        key : str or int
+            variable name or constituent number (see variables())
+        start : int, optional
+            index of the first node (node number - 1)
+        stop : int, optional
+            index after the last node (default num_nodes)
+            
+        Returns
+        -------
+        array of float32
+        """
+        if stop is None:
+            stop = self.num_nodes
+        base, stride, comp = self._variable_layout(key)
+        if frame < 0:
+            frame += self.num_frames
+        self.file.seek(HEADER_SIZE + frame * self.frame_size + self.frame_header_size
+                       + 4 * (base + start * stride))
+        count = (stop - start) * stride
+        b = numpy.frombuffer(self.file.read(4 * count), dtype=numpy.float32)
+        if self.instrument is not None:
+            self.instrument.count('bytes_read', 4 * count)
+        return b[comp::stride]
+        
+    def close(self):
+        """
+        close the result file
+        """
+        self.file.close()
                 
     def next(self,nodes=-1):  
+        instrument = self.instrument
+        if instrument is not None:
+            t0 = instrument.start()
+            
         if nodes == -1:
             nodes = range(1, self.num_nodes+1)
                                         
@@ -71,14 +315,27 @@ class RMA:
                 
                 if (np != self.num_nodes):
                     print("Warning - NP (%d) on this timestep does not match header (%d)" % (np, self.num_nodes))
-                fmt = '%df' % 5 * np
                 
-                b = unpack(fmt, self.file.read(20 * np))
+                buffer = self.file.read(20 * np)
+                if len(buffer) < 20 * np:
+                    return False
+                if instrument is not None:
+                    instrument.count('bytes_read', 12 + len(buffer))
+                    t0 = instrument.stop('read', t0)
+                    
+                b = numpy.frombuffer(buffer, dtype=numpy.float32)
+                vel = b[:3 * np].reshape(np, 3)
+                self.values = {'xvel': vel[:, 0],
+                               'yvel': vel[:, 1],
+                               'depth': vel[:, 2],
+                               'elevation': b[np * 3:np * 4]}
+                if instrument is not None:
+                    t0 = instrument.stop('decode', t0)
                 
-                self.xvel = {node: b[(node - 1) * 3] for node in nodes}
-                self.yvel = {node: b[(node - 1) * 3 + 1] for node in nodes}
-                self.depth = {node: b[(node - 1) * 3 + 2] for node in nodes}
-                self.elevation = {node: b[np * 3 + (node - 1)] for node in nodes }
+                self.xvel = self._select(self.values['xvel'], nodes)
+                self.yvel = self._select(self.values['yvel'], nodes)
+                self.depth = self._select(self.values['depth'], nodes)
+                self.elevation = self._select(self.values['elevation'], nodes)
 
 
         if self.type == 'RMA11     ':
@@ -98,11 +355,24 @@ class RMA:
                     nqal - 5, self.num_constits))
                 if (np != self.num_nodes):
                     print("Warning - NP (%d) on this timestep does not match header (%d)" % (np, self.num_nodes))
-                fmt = '%df' % nqal * np 
-                b = unpack(fmt, self.file.read(4 * nqal * np))
                 
+                buffer = self.file.read(4 * nqal * np)
+                if len(buffer) < 4 * nqal * np:
+                    return False
+                if instrument is not None:
+                    instrument.count('bytes_read', 16 + len(buffer))
+                    t0 = instrument.stop('read', t0)
+                    
+                b = numpy.frombuffer(buffer, dtype=numpy.float32)
+                self.values = {c: b[np * ((c - 1) + 5):np * (c + 5)] for c in range(1, self.num_constits + 1)}
+                if instrument is not None:
+                    t0 = instrument.stop('decode', t0)
+                
+                if self.hydro is not None:
+                    self._add_hydro()
+                    
                 for c in range(1, self.num_constits + 1):
-                    self.constit[c] = {node:b[np * ((c - 1) + 5) + (node - 1)] for node in nodes}
+                    self.constit[c] = self._select(self.values[c], nodes)
                     
                     
         if self.type == 'RMA10     ':
@@ -122,17 +392,83 @@ class RMA:
                     print("Warning - NP1 (%d) on this timestep does not match header (%d)" % (np, self.num_nodes))
                     
                 tempRead = np * (3 + ndf) + ne
-                fmt = '%df' % tempRead
-                b = unpack(fmt, self.file.read(4 * tempRead))
-
-                self.xvel = {node:b[(node - 1) * 8] for node in nodes}
-                self.yvel = {node:b[1 + (node - 1) * 8] for node in nodes}
-                self.depth = {node:b[2 + (node - 1) * 8] for node in nodes}
-                self.salinity = {node:b[3 + (node - 1) * 8] for node in nodes}
-                self.temperature = {node:b[4 + (node - 1) * 8] for node in nodes}
-                self.sussed = {node:b[5 + (node - 1) * 8] for node in nodes}
-                self.zvel = {node:b[6 + (node - 1) * 8] for node in nodes}
-                self.elevation = {node:b[7 + (node - 1) * 8] for node in nodes}
+                buffer = self.file.read(4 * tempRead)
+                if len(buffer) < 4 * tempRead:
+                    return False
+                if instrument is not None:
+                    instrument.count('bytes_read', 20 + len(buffer))
+                    t0 = instrument.stop('read', t0)
+                    
+                b = numpy.frombuffer(buffer, dtype=numpy.float32)
+                vsing = b[:8 * np].reshape(np, 8)
+                self.values = {name: vsing[:, i] for i, name in enumerate(RMA10_VARIABLES)}
+                if instrument is not None:
+                    t0 = instrument.stop('decode', t0)
+
+                self.xvel = self._select(self.values['xvel'], nodes)
+                self.yvel = self._select(self.values['yvel'], nodes)
+                self.depth = self._select(self.values['depth'], nodes)
+                self.salinity = self._select(self.values['salinity'], nodes)
+                self.temperature = self._select(self.values['temperature'], nodes)
+                self.sussed = self._select(self.values['sussed'], nodes)
+                self.zvel = self._select(self.values['zvel'], nodes)
+                self.elevation = self._select(self.values['elevation'], nodes)
                 
+        if instrument is not None:
+            instrument.stop('select', t0)
+            instrument.frame(self)
 
         return True
+    
+    def _add_hydro(self):
+        """
+        method to add the hydrodynamic variables of the hydro results at the
+        date of the timestep to values (nearest hydrodynamic timestep within 1
+        second, the hours of both files being stored as float32)
+        """
+        date_step = self.date()
+        try:
+            hydro_values = self.hydro.sel(date_step, method='nearest', tolerance=timedelta(seconds=1))[1]
+        except KeyError:
+            raise KeyError('No hydrodynamic timestep at {} to match {}'.format(date_step, self.filename))
+        for key, val in hydro_values.items():
+            self.values.setdefault(key, val)
+            
+    def get(self, key, nodes=-1):
+        """
+        Parameters
+        ----------
+        key : str or int
+            raw variable (name or constituent number) or derived variable
+            (see derived.DERIVED, e.g. 'speed', 'unit_discharge', 'flux_1')
+        nodes : list of int, optional
+            nodes to select (default all the nodes)
+            
+        Returns
+        -------
+        dict of node:value of the last timestep read
+        """
+        values = derived.evaluate(key, self.values)
+        if nodes == -1:
+            nodes = range(1, self.num_nodes+1)
+        return self._select(values, nodes)
+        
+    def _select(self, values, nodes):
+        """
+        Parameters
+        ----------
+        values : array
+            values of one variable for all the nodes (node n at index n - 1)
+        nodes : list of int
+            nodes to keep
+            
+        Returns
+        -------
+        dict of node:value
+        """
+        if isinstance(nodes, range) and nodes.start == 1 and nodes.step == 1:
+            return dict(zip(nodes, values[:len(nodes)].tolist()))
+        if nodes is not self._nodes:
+            self._nodes = nodes
+            self._index = numpy.asarray(nodes, dtype=numpy.int64) - 1
+        return dict(zip(nodes, values[self._index].tolist()))
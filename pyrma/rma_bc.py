@@ -5,6 +5,7 @@ Read and Update RMA Modelling Suite input ELT and WQG boundary files
 #Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
        
 
+import numpy as np
 import pandas as pd
 import os
 from datetime import timedelta, datetime
@@ -49,6 +50,10 @@ class RMA_bc:
         save to elt file
     create_wqgs(output_dir='output_bc')
        save to wqg file
+    resample(timestep = timedelta(hours = 1), method = 'time', limit = None, fill = 'nearest')
+       put df and df_wq_dict on a regular time grid
+    create_ensemble(members, output_dir = 'ensemble', scale = None, noise = None, ...)
+       save perturbed elt and wqg files for each ensemble member
     """
     
     def __init__(self):
@@ -92,7 +97,7 @@ class RMA_bc:
             if filename == filenames[0]:
                 self.df = df2
             else:
-                self.df = self.df.append(df2)
+                self.df = pd.concat([self.df, df2])
         self.elements = [*self.df]
         #return self.df
     
@@ -202,19 +207,30 @@ class RMA_bc:
         output_dir : str (default: 'output_bc')
             name of the folder to save the elt files
         """        
+        self._write_elts(output_dir, self.df)
+        
+    def _write_elts(self, output_dir, df):
+        """
+        Parameters
+        ----------
+        output_dir : str
+            name of the folder to save the elt files
+        df : dataframe
+            flow of the elements
+        """        
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
             
-        startyear = self.df.index[0].year
-        endyear = self.df.index[-1].year
+        startyear = df.index[0].year
+        endyear = df.index[-1].year
         years = range(startyear,endyear+1)
         for year in years:
             with open('{}/{}.elt'.format(output_dir,year),'w') as f:
                 f.write('TE      BC GENERATED - {}\n'.format(datetime.now()))
                 for element in self.elements:
                     f.write('QEI{:>13}       1{:>8}\n'.format(element,year))            
-                    mask = self.df.index.year == year
-                    data = self.df.loc[mask][element]
+                    mask = df.index.year == year
+                    data = df.loc[mask][element]
                     
                     day = data.index.dayofyear
                     
@@ -230,11 +246,24 @@ class RMA_bc:
         output_dir : str (default: 'output_bc')
             name of the folder to save the wqg files
         """       
+        self._write_wqgs(output_dir, self.df, self.df_wq_dict)
+        
+    def _write_wqgs(self, output_dir, df, df_wq_dict):
+        """
+        Parameters
+        ----------
+        output_dir : str
+            name of the folder to save the wqg files
+        df : dataframe
+            flow of the elements
+        df_wq_dict : dict of dataframe
+            concentrations of the constituents of each element
+        """       
         #ideas to improve, convert each row to string before processing. using list comprehension
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
-        startyear = self.df.index[0].year
-        endyear = self.df.index[-1].year
+        startyear = df.index[0].year
+        endyear = df.index[-1].year
         years = range(startyear,endyear+1)
         
         for year in years:
@@ -242,13 +271,13 @@ class RMA_bc:
                 for element,type_el in self.type_dict.items():
                     f.write('TI      Elements {}\n'.format(element))
                     f.write('{:<8}{:>8}{:>8}{:>8}\n'.format('QT',element,abs(type_el),year))            
-                    mask = self.df_wq_dict[element].index.year == year
-                    data_wq= self.df_wq_dict[element].loc[mask]  
+                    mask = df_wq_dict[element].index.year == year
+                    data_wq= df_wq_dict[element].loc[mask]  
                     
                     for i,row in data_wq.iterrows():
                         
                         if type_el != 1:
-                            flow = self.df.loc[i,element]
+                            flow = df.loc[i,element]
                             f.write('{:<5}{:>3}{:>8}{:>+8.1E}'.format('QD',i.dayofyear,i.hour,flow))
                         else:
                             f.write('{:<5}{:>3}{:>8}'.format('QD',i.dayofyear,i.hour))
@@ -261,9 +290,182 @@ class RMA_bc:
                         
                         
                 f.write('ENDDATA')
-    
+                
+    def resample(self, timestep = timedelta(hours = 1), method = 'time', limit = None, fill = 'nearest'):
+        """
+        Parameters
+        ----------
+        timestep : timedelta or str, optional (default: 1 hour)
+            timestep of the model, a whole number of hours as the elt and wqg
+            files store the hour of each record (e.g. timedelta(hours = 1) or
+            '3h')
+        method : str, optional (default: 'time')
+            interpolation between the records: 'time' (linear in time),
+            'nearest', 'ffill' (previous record) or any method of
+            DataFrame.interpolate
+        limit : int, optional
+            maximum number of consecutive missing values filled in each gap,
+            the rest of longer gaps is left empty (default no limit)
+        fill : str or float, optional (default: 'nearest')
+            value before the first and after the last record: 'nearest' for
+            the first/last record, a value, or None to leave them empty
+        """
+        timestep = pd.Timedelta(timestep)
+        if timestep <= pd.Timedelta(0) or timestep % pd.Timedelta(hours = 1) != pd.Timedelta(0):
+            raise ValueError('The timestep must be a whole number of hours, got {}'.format(timestep))
+        frames = [self.df] + list(self.df_wq_dict.values())
+        frames = [df for df in frames if len(df.index) > 0]
+        if not frames:
+            return
+        start = min(df.index.min() for df in frames)
+        end = max(df.index.max() for df in frames)
+        index = pd.date_range(pd.Timestamp(start).floor(timestep), pd.Timestamp(end).ceil(timestep), freq=timestep)
+        
+        if len(self.df.index) > 0:
+            self.df = _resample(self.df, index, method, limit, fill)
+        for element, df in self.df_wq_dict.items():
+            self.df_wq_dict[element] = _resample(df, index, method, limit, fill)
+            
+    def create_ensemble(self, members, output_dir = 'ensemble', scale = None, noise = None,
+                        elements = None, constituents = None, seed = None,
+                        elts = True, wqgs = True):
+        """
+        Save the elt and wqg files of each ensemble member in
+        {output_dir}/member_{number}. Each member perturbs all the selected
+        elements and constituents at once (one array operation per element),
+        and is written before the next one is generated.
         
+        Parameters
+        ----------
+        members : int
+            number of members
+        output_dir : str, optional (default: 'ensemble')
+            name of the folder of the members
+        scale : tuple of float, optional
+            (low, high) range of the factor applied to each flow and
+            concentration series, drawn uniformly for each member
+        noise : float, optional
+            standard deviation of a relative noise applied to each value
+            (value x (1 + noise x N(0,1)))
+        elements : list of int, optional
+            elements perturbed (default all)
+        constituents : list of str, optional
+            constituents perturbed (default all)
+        seed : int, optional
+            seed of the random generator
+        elts : Bool, optional (default: True)
+            save the elt files
+        wqgs : Bool, optional (default: True)
+            save the wqg files (concentrations are kept positive)
+            
+        Returns
+        -------
+        list of the folders of the members
+        """
+        rng = np.random.default_rng(seed)
+        folders = []
+        for member in range(1, members + 1):
+            folder = os.path.join(output_dir, 'member_{:03d}'.format(member))
+            df = self.df
+            if len(df.columns) > 0:
+                mask = _column_mask(df.columns, elements)
+                df = pd.DataFrame(_perturb(df.to_numpy(dtype=float), mask, scale, noise, rng),
+                                  index=df.index, columns=df.columns)
+            if elts:
+                self._write_elts(folder, df)
+            if wqgs:
+                df_wq_dict = {}
+                for element, df_wq in self.df_wq_dict.items():
+                    mask = _column_mask(df_wq.columns, constituents)
+                    if elements is not None and element not in elements and abs(element) not in elements:
+                        mask[:] = False
+                    values = _perturb(df_wq.to_numpy(dtype=float), mask, scale, noise, rng)
+                    df_wq_dict[element] = pd.DataFrame(np.maximum(values, 0.0), index=df_wq.index,
+                                                       columns=df_wq.columns)
+                self._write_wqgs(folder, df, df_wq_dict)
+            folders.append(folder)
+        return folders
+    
+
+def _resample(df, index, method, limit, fill):
+    """
+    Parameters
+    ----------
+    df : dataframe
+        records (irregular dates)
+    index : DatetimeIndex
+        dates of the regular grid
+    method : str
+        interpolation method
+    limit : int
+        maximum number of consecutive missing values filled
+    fill : str or float
+        value before the first and after the last record
         
+    Returns
+    -------
+    dataframe on the grid
+    """
+    df = df[~df.index.duplicated(keep='last')].sort_index().astype(float)
+    df = df.reindex(df.index.union(index))
+    if method in ('ffill', 'pad'):
+        df = df.ffill(limit = limit)
+    else:
+        df = df.interpolate(method = method, limit = limit, limit_area = 'inside')
+    df = df.reindex(index)
+    if fill is not None:
+        # only the missing values before the first and after the last record,
+        # the gaps left by limit stay empty
+        for column in df.columns:
+            first = df[column].first_valid_index()
+            last = df[column].last_valid_index()
+            if first is None:
+                if fill != 'nearest':
+                    df[column] = float(fill)
+                continue
+            before, after = df.index < first, df.index > last
+            if fill == 'nearest':
+                df.loc[before, column] = df.loc[first, column]
+                df.loc[after, column] = df.loc[last, column]
+            else:
+                df.loc[before | after, column] = fill
+    return df
+
+
+def _column_mask(columns, selection):
+    """
+    Returns
+    -------
+    array of bool, True for the columns perturbed
+    """
+    if selection is None:
+        return np.ones(len(columns), dtype=bool)
+    return np.isin(np.asarray(columns), list(selection))
+
+
+def _perturb(values, mask, scale, noise, rng):
+    """
+    Parameters
+    ----------
+    values : array
+        timesteps x columns
+    mask : array of bool
+        columns perturbed
+    scale : tuple of float
+        (low, high) range of the factor of each column
+    noise : float
+        standard deviation of the relative noise
+    rng : Generator
+        random generator
         
-                
-        
\ No newline at end of file
+    Returns
+    -------
+    array of the perturbed values
+    """
+    factor = np.ones(values.shape)
+    if scale is not None:
+        factor = factor * np.where(mask, rng.uniform(scale[0], scale[1], values.shape[1]), 1.0)
+    if noise is not None:
+        factor = factor * np.where(mask, 1.0 + noise * rng.standard_normal(values.shape), 1.0)
+    return values * factor
+
@@ -0,0 +1,226 @@
+"""
+Cross-sections of a RMA mesh: discharge and mass flux through a polyline,
+precomputed once as a sparse operator applied to each timestep
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import numpy as np
+
+from .operators import SparseOperator
+
+# variables integrated through the sections: (x component, y component)
+SECTION_VARIABLES = {'discharge': ('qx', 'qy')}
+
+
+def section_variables(key):
+    """
+    Parameters
+    ----------
+    key : str
+        'discharge' or a mass flux ('flux_1', 'flux_salinity' ...)
+
+    Returns
+    -------
+    keys of the x and y components of the flux per unit width
+    """
+    if key in SECTION_VARIABLES:
+        return SECTION_VARIABLES[key]
+    if key.startswith('flux_'):
+        return 'flux_x_' + key[5:], 'flux_y_' + key[5:]
+    raise KeyError('Unknown section variable: {}'.format(key))
+
+
+class CrossSection:
+    """
+    Polyline across a mesh, integrating the flux per unit width (e.g. depth x
+    velocity) along the polyline. Positive fluxes go from the left to the
+    right of the polyline (looking from its first to its last point).
+
+    ...
+    Attributes
+    ----------
+    name: str
+        name of the section
+    polyline: array
+        (x, y) of the points of the polyline
+    points: array
+        (x, y) of the points where the values are interpolated (intersections
+        with the mesh edges and vertices of the polyline inside the mesh)
+    distance: array
+        distance of the points along the polyline
+    edges: list of tuple
+        nodes of the edge intersected at each point (None for the vertices)
+    weights: list of dict
+        interpolation weights node:weight of each point
+    lengths: array
+        length of each piece of the polyline between two points
+    normals: array
+        unit normal (x, y) of each piece
+    operator_x: SparseOperator
+        operator integrating the x component of the flux
+    operator_y: SparseOperator
+        operator integrating the y component of the flux
+
+
+    Methods
+    -------
+    apply(qx, qy)
+        return the flux through the section
+    """
+    def __init__(self, mesh, polyline, name=None):
+        """
+        Parameters
+        ----------
+        mesh : Mesh
+            mesh of the results
+        polyline : list of (x, y)
+            points of the polyline (at least 2)
+        name : str, optional
+            name of the section
+        """
+        self.name = name
+        self.polyline = np.asarray(polyline, dtype=float)
+        if len(self.polyline) < 2:
+            raise ValueError('A cross-section needs at least 2 points')
+
+        x, y = mesh.node_coordinates()
+        a, b = mesh.edges()
+        P = np.column_stack([x[a - 1], y[a - 1]])
+        Q = np.column_stack([x[b - 1], y[b - 1]])
+        E = Q - P
+
+        points, distance, edges, weights, piece = [], [], [], [], []
+        start = 0.0
+        for k in range(len(self.polyline) - 1):
+            A, B = self.polyline[k], self.polyline[k + 1]
+            r = B - A
+            seg_points = []
+            # vertices of the polyline inside the mesh are interpolated in
+            # their element
+            w = mesh.interpolation_weights(A[0], A[1])
+            if w:
+                seg_points.append((0.0, A, None, w))
+            denom = r[0] * E[:, 1] - r[1] * E[:, 0]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                AP = P - A
+                t = (AP[:, 0] * E[:, 1] - AP[:, 1] * E[:, 0]) / denom
+                u = (AP[:, 0] * r[1] - AP[:, 1] * r[0]) / denom
+            hit = np.nonzero((np.abs(denom) > 1e-12) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1))[0]
+            for i in hit[np.argsort(t[hit], kind='stable')]:
+                # points on a node are found on all the edges sharing it
+                if seg_points and abs(t[i] - seg_points[-1][0]) < 1e-9:
+                    continue
+                seg_points.append((t[i], A + t[i] * r, (int(a[i]), int(b[i])),
+                                   {int(a[i]): 1.0 - u[i], int(b[i]): u[i]}))
+            if k == len(self.polyline) - 2:
+                w = mesh.interpolation_weights(B[0], B[1])
+                if w and (not seg_points or seg_points[-1][0] < 1 - 1e-9):
+                    seg_points.append((1.0, B, None, w))
+
+            length = np.hypot(r[0], r[1])
+            for t_i, point, edge, w in seg_points:
+                points.append(point)
+                distance.append(start + t_i * length)
+                edges.append(edge)
+                weights.append(w)
+                piece.append(k)
+            start += length
+
+        self.points = np.array(points).reshape(-1, 2)
+        self.distance = np.array(distance)
+        self.edges = edges
+        self.weights = weights
+
+        lengths, normals = [], []
+        rows_x, cols_x, w_x, cols_y, w_y = [], [], [], [], []
+        for i in range(len(points) - 1):
+            # pieces are integrated within a segment of the polyline, or
+            # across a vertex of the polyline inside the mesh
+            if piece[i] != piece[i + 1] and edges[i + 1] is not None and edges[i] is not None:
+                continue
+            d = self.points[i + 1] - self.points[i]
+            length = np.hypot(d[0], d[1])
+            if length == 0:
+                continue
+            normal = np.array([d[1], -d[0]]) / length
+            lengths.append(length)
+            normals.append(normal)
+            # trapezoidal rule between the two points
+            for w in (weights[i], weights[i + 1]):
+                for node, wn in w.items():
+                    rows_x.append(0)
+                    cols_x.append(node - 1)
+                    w_x.append(0.5 * length * wn * normal[0])
+                    cols_y.append(node - 1)
+                    w_y.append(0.5 * length * wn * normal[1])
+
+        self.lengths = np.array(lengths)
+        self.normals = np.array(normals).reshape(-1, 2)
+        self.operator_x = SparseOperator(rows_x, cols_x, w_x, 1)
+        self.operator_y = SparseOperator(rows_x, cols_y, w_y, 1)
+
+    def apply(self, qx, qy):
+        """
+        Parameters
+        ----------
+        qx : array
+            x component of the flux per unit width of all the nodes
+        qy : array
+            y component of the flux per unit width of all the nodes
+
+        Returns
+        -------
+        flux through the section (e.g. discharge in m3/s from qx and qy)
+        """
+        return float(self.operator_x.apply(qx)[0] + self.operator_y.apply(qy)[0])
+
+
+class SectionSet:
+    """
+    Several cross-sections stacked in a single operator, evaluated with one
+    bincount per component and per timestep
+
+    ...
+    Attributes
+    ----------
+    names: list of str
+        names of the sections
+    operator_x: SparseOperator
+        one row per section
+    operator_y: SparseOperator
+        one row per section
+
+
+    Methods
+    -------
+    apply(qx, qy)
+        return the array of the fluxes through the sections
+    """
+    def __init__(self, sections):
+        """
+        Parameters
+        ----------
+        sections : list of CrossSection
+            sections to evaluate together
+        """
+        self.names = [s.name if s.name is not None else 'section{}'.format(i + 1)
+                      for i, s in enumerate(sections)]
+        self.operator_x = SparseOperator.stack([s.operator_x for s in sections])
+        self.operator_y = SparseOperator.stack([s.operator_y for s in sections])
+
+    def apply(self, qx, qy):
+        """
+        Parameters
+        ----------
+        qx : array
+            x component of the flux per unit width of all the nodes
+        qy : array
+            y component of the flux per unit width of all the nodes
+
+        Returns
+        -------
+        array of the flux through each section
+        """
+        return self.operator_x.apply(qx) + self.operator_y.apply(qy)
@@ -0,0 +1,202 @@
+"""
+Share mesh arrays and decoded RMA timesteps between the processes of a
+multiprocessing pool: the arrays are copied once into shared memory blocks,
+and the workers attach to them without copy through a small picklable handle
+
+Requires Python 3.8 or later (multiprocessing.shared_memory, imported when
+the arrays are allocated or attached)
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import numpy as np
+
+
+class SharedArrays:
+    """
+    Handle of a set of numpy arrays held in shared memory. The process which
+    publishes the arrays owns the memory and unlinks it once the workers are
+    done; the handle is sent to the workers (only the names, shapes and
+    dtypes are pickled), which attach to the arrays and close them.
+
+    ...
+    Attributes
+    ----------
+    specs: dict
+        key: name of the array
+        (shared memory block name, shape, dtype)
+    owner: bool
+        True in the process which created the blocks
+
+
+    Methods
+    -------
+    publish(arrays) (class method)
+        copy arrays into new shared memory blocks
+    allocate(specs) (class method)
+        create uninitialised shared arrays
+    attach()
+        return the dict of the arrays (views on the shared memory)
+    close()
+        release the views of this process
+    unlink()
+        free the shared memory (owner only, once every process closed it)
+    """
+    def __init__(self, specs, owner=False):
+        """
+        Parameters
+        ----------
+        specs : dict
+            name: (shared memory block name, shape, dtype str)
+        owner : bool, optional - default False
+            True if this process created the blocks
+        """
+        self.specs = specs
+        self.owner = owner
+        self._blocks = {}
+        self._arrays = None
+
+    def __getstate__(self):
+        return {'specs': self.specs}
+
+    def __setstate__(self, state):
+        self.__init__(state['specs'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    @classmethod
+    def allocate(cls, specs):
+        """
+        Parameters
+        ----------
+        specs : dict
+            name: (shape, dtype) of the arrays
+
+        Returns
+        -------
+        SharedArrays owning the new blocks (the arrays are not initialised)
+        """
+        from multiprocessing.shared_memory import SharedMemory
+        shared = cls({}, owner=True)
+        for name, (shape, dtype) in specs.items():
+            dtype = np.dtype(dtype)
+            size = max(1, int(np.prod(shape)) * dtype.itemsize)
+            block = SharedMemory(create=True, size=size)
+            shared._blocks[name] = block
+            shared.specs[name] = (block.name, tuple(shape), dtype.str)
+        return shared
+
+    @classmethod
+    def publish(cls, arrays):
+        """
+        Parameters
+        ----------
+        arrays : dict of array
+            arrays to share (keys are converted to str)
+
+        Returns
+        -------
+        SharedArrays owning the blocks holding a copy of the arrays
+        """
+        arrays = {str(name): np.asarray(a) for name, a in arrays.items()}
+        shared = cls.allocate({name: (a.shape, a.dtype) for name, a in arrays.items()})
+        views = shared.attach()
+        for name, a in arrays.items():
+            views[name][...] = a
+        return shared
+
+    def attach(self):
+        """
+        Returns
+        -------
+        dict of name: array using the shared memory (no copy)
+        """
+        if self._arrays is None:
+            from multiprocessing.shared_memory import SharedMemory
+            self._arrays = {}
+            for name, (block_name, shape, dtype) in self.specs.items():
+                if name not in self._blocks:
+                    self._blocks[name] = SharedMemory(name=block_name)
+                self._arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype),
+                                                buffer=self._blocks[name].buf)
+        return self._arrays
+
+    def close(self):
+        """
+        release the arrays and the blocks of this process, the arrays
+        returned by attach() must not be used after
+        """
+        self._arrays = None
+        for block in self._blocks.values():
+            block.close()
+        if not self.owner:
+            self._blocks = {}
+
+    def unlink(self):
+        """
+        free the shared memory blocks (owner only)
+        """
+        if not self.owner:
+            raise RuntimeError('Only the process which published the arrays can unlink them')
+        for block in self._blocks.values():
+            block.unlink()
+        self._blocks = {}
+
+
+def share_mesh(mesh):
+    """
+    Parameters
+    ----------
+    mesh : Mesh
+        mesh to share
+
+    Returns
+    -------
+    SharedArrays of the arrays of Mesh.to_arrays()
+    """
+    return SharedArrays.publish(mesh.to_arrays())
+
+
+def share_frames(dataset, key, index=None, nodes=-1):
+    """
+    Decode timesteps of a variable directly into a shared (timesteps x
+    nodes) array
+
+    Parameters
+    ----------
+    dataset : RMADataset
+        result files
+    key : str or int
+        variable name or RMA11 constituent number
+    index : list of int or slice, optional
+        positions of the timesteps in the dataset (default all)
+    nodes : list of int, optional
+        nodes to extract (default all the nodes)
+
+    Returns
+    -------
+    SharedArrays with the arrays 'values' (float32) and 'times'
+    (datetime64[ms])
+    """
+    if index is None:
+        index = slice(None)
+    if isinstance(index, slice):
+        index = range(*index.indices(len(dataset)))
+    index = list(index)
+    idx = None if isinstance(nodes, int) and nodes == -1 else np.asarray(nodes, dtype=np.int64) - 1
+    num_nodes = dataset.num_nodes if idx is None else len(idx)
+    shared = SharedArrays.allocate({'values': ((len(index), num_nodes), np.float32),
+                                    'times': ((len(index),), 'datetime64[ms]')})
+    arrays = shared.attach()
+    for i, k in enumerate(index):
+        values = dataset.read_variable(k, key)
+        arrays['values'][i] = values if idx is None else values[idx]
+    arrays['times'][:] = dataset.times[index]
+    return shared
@@ -0,0 +1,96 @@
+"""
+Spatial subset of RMA result files: copy the values of a selection of nodes
+(e.g. Mesh.select_nodes) to a smaller result file of the same type, numbered
+like the sub-mesh returned by Mesh.submesh
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+from struct import pack, unpack
+
+import numpy as np
+
+from .rma import RMA, FRAME_HEADER_FORMAT
+
+
+def _subset_header(header, num_nodes, num_elements):
+    """
+    Parameters
+    ----------
+    header : str
+        1000 characters header of the result file
+    num_nodes : int
+        number of nodes of the subset
+    num_elements : int
+        number of elements of the subset
+
+    Returns
+    -------
+    bytes of the header of the subset
+    """
+    header = header[:40] + '{:>10}{:>10}'.format(num_nodes, num_elements) + header[60:]
+    return header.encode('utf-8')
+
+
+def write_subset(filename, output, nodes, elements=None):
+    """
+    Parameters
+    ----------
+    filename : str
+        RMA2, RMA10 or RMA11 result file
+    output : str
+        name of the subset result file
+    nodes : list of int
+        nodes to keep, in the order of the new numbering (e.g.
+        Mesh.submesh(nodes).parent_nodes)
+    elements : list of int, optional
+        elements kept in the sub-mesh (e.g. Mesh.submesh(nodes).parent_elements),
+        used for the number of elements of the header and the per-element
+        values of RMA10 (default all the elements are kept)
+
+    Returns
+    -------
+    number of timesteps written
+    """
+    R = RMA(filename, verbose=False)
+    idx = np.asarray(nodes, dtype=np.int64) - 1
+    n = len(idx)
+    fmt = FRAME_HEADER_FORMAT[R.type]
+    num_elements = R.num_elements if elements is None else len(elements)
+    written = 0
+    with open(output, 'wb') as f:
+        f.write(_subset_header(R.header, n, num_elements))
+        R.seek(0)
+        for frame in range(R.num_frames):
+            raw = R.file.read(R.frame_size)
+            if len(raw) < R.frame_size:
+                break
+            head = list(unpack(fmt, raw[:R.frame_header_size]))
+            b = np.frombuffer(raw, dtype=np.float32, offset=R.frame_header_size)
+            if R.type == 'RMA2      ':
+                # vel (3 x np, interleaved), wsel (np), vdot (np)
+                np_ = head[1]
+                head[1] = n
+                parts = [b[:3 * np_].reshape(np_, 3)[idx].ravel(),
+                         b[3 * np_:4 * np_][idx], b[4 * np_:5 * np_][idx]]
+            elif R.type == 'RMA11     ':
+                # nqal blocks of np values
+                nqal, np_ = head[1], head[2]
+                head[2] = n
+                parts = [b.reshape(nqal, np_)[:, idx].ravel()]
+            else:
+                # 8 interleaved values per node, DFCT (ne), vsing 7 (np)
+                np_, ne = head[1], head[3]
+                dfct = b[8 * np_:8 * np_ + ne]
+                if elements is not None:
+                    dfct = dfct[np.asarray(elements, dtype=np.int64) - 1]
+                head[1], head[3] = n, len(dfct)
+                parts = [b[:8 * np_].reshape(np_, 8)[idx].ravel(), dfct,
+                         b[8 * np_ + ne:9 * np_ + ne][idx]]
+            f.write(pack(fmt, *head))
+            for part in parts:
+                f.write(part.astype(np.float32).tobytes())
+            written += 1
+    R.close()
+    return written
@@ -0,0 +1,179 @@
+"""
+xarray backend for RMA result files (*.rma)
+
+    ds = xr.open_dataset('run_2000.rma', engine='pyrma', mesh='mesh.rm1')
+    ds = open_rma_dataset(['run_2000.rma', 'run_2001.rma'], chunks={'time': 96})
+
+Variables are exposed as lazily loaded (time, node) arrays; only the nodes and
+timesteps requested are read from the files.
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import os
+import threading
+
+import numpy as np
+import xarray as xr
+from xarray.backends import BackendArray, BackendEntrypoint
+from xarray.core import indexing
+
+from .dataset import RMADataset
+from .mesh import Mesh
+
+
+class RMABackendArray(BackendArray):
+    """
+    Lazy (time, node) array of one variable of a RMADataset
+
+    ...
+    Attributes
+    ----------
+    dataset: RMADataset
+        dataset holding the result files
+    key: str or int
+        variable name or constituent number
+    shape: tuple
+        number of timesteps and of nodes
+    dtype: dtype
+        float32
+    """
+    def __init__(self, dataset, key, lock):
+        """
+        Parameters
+        ----------
+        dataset : RMADataset
+            dataset holding the result files
+        key : str or int
+            variable name or constituent number
+        lock : Lock
+            lock shared by all the variables of the dataset
+        """
+        self.dataset = dataset
+        self.key = key
+        self.lock = lock
+        self.shape = (len(dataset), dataset.num_nodes)
+        self.dtype = np.dtype(np.float32)
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.OUTER, self._raw_indexing_method)
+
+    def _raw_indexing_method(self, key):
+        time_key, node_key = key
+        times = np.arange(self.shape[0])[time_key]
+        nodes = np.arange(self.shape[1])[node_key]
+        scalar_time = np.ndim(times) == 0
+        scalar_node = np.ndim(nodes) == 0
+        times = np.atleast_1d(times)
+        nodes = np.atleast_1d(nodes)
+
+        out = np.empty((len(times), len(nodes)), dtype=self.dtype)
+        if len(nodes) > 0:
+            # read the contiguous range of nodes covering the selection
+            start, stop = int(nodes.min()), int(nodes.max()) + 1
+            with self.lock:
+                for i, t in enumerate(times):
+                    out[i] = self.dataset.read_variable(int(t), self.key, start, stop)[nodes - start]
+
+        if scalar_node:
+            out = out[:, 0]
+        if scalar_time:
+            out = out[0]
+        return out
+
+
+def variable_name(dataset, key):
+    """
+    Parameters
+    ----------
+    dataset : RMADataset or RMA
+        result file(s)
+    key : str or int
+        variable name or constituent number
+
+    Returns
+    -------
+    name of the variable in the xarray dataset (constituents are named after
+    constit_name)
+    """
+    if isinstance(key, str):
+        return key
+    names = dataset.constit_name
+    if key < len(names) and names[key].strip():
+        return names[key].strip()
+    return 'constit{}'.format(key)
+
+
+def open_rma_dataset(filenames, mesh=None, chunks=None, drop_variables=None, max_open=8):
+    """
+    Parameters
+    ----------
+    filenames : str or list of str
+        result file(s), in chronological order (timesteps repeated at restart
+        boundaries are removed)
+    mesh : str or Mesh, optional
+        mesh used to add the x, y and z coordinates of the nodes
+    chunks : dict, optional
+        dask chunks, e.g. {'time': 96}
+    drop_variables : list of str, optional
+        variables not to expose
+    max_open : int, optional - default 8
+        maximum number of result files kept open
+
+    Returns
+    -------
+    xarray Dataset
+    """
+    backend = PyrmaBackendEntrypoint()
+    ds = backend.open_dataset(filenames, mesh=mesh, drop_variables=drop_variables,
+                              max_open=max_open)
+    if chunks is not None:
+        ds = ds.chunk(chunks)
+    return ds
+
+
+class PyrmaBackendEntrypoint(BackendEntrypoint):
+    """
+    xarray backend entrypoint, registered as engine 'pyrma'
+    """
+    description = 'Open RMA2, RMA10 and RMA11 result files (*.rma) with pyrma'
+    open_dataset_parameters = ['filename_or_obj', 'drop_variables', 'mesh', 'max_open']
+
+    def open_dataset(self, filename_or_obj, *, drop_variables=None, mesh=None, max_open=8):
+        if isinstance(filename_or_obj, (str, os.PathLike)):
+            filenames = [os.fspath(filename_or_obj)]
+        else:
+            filenames = [os.fspath(f) for f in filename_or_obj]
+        dataset = RMADataset(filenames, max_open=max_open)
+        lock = threading.Lock()
+
+        data_vars = {}
+        for key in dataset.variables:
+            name = variable_name(dataset, key)
+            if drop_variables and name in drop_variables:
+                continue
+            data = indexing.LazilyIndexedArray(RMABackendArray(dataset, key, lock))
+            data_vars[name] = xr.Variable(('time', 'node'), data)
+
+        nodes = np.arange(1, dataset.num_nodes + 1)
+        coords = {'time': dataset.times.astype('datetime64[ns]'), 'node': nodes}
+        if mesh is not None:
+            if not isinstance(mesh, Mesh):
+                mesh = Mesh(mesh)
+            for c in ['x', 'y', 'z']:
+                coords[c] = ('node', np.array([mesh.nodes[n][c] if n in mesh.nodes else np.nan
+                                               for n in nodes]))
+
+        ds = xr.Dataset(data_vars, coords=coords,
+                        attrs={'type': dataset.type.strip(),
+                               'files': ','.join(filenames)})
+        ds.set_close(dataset.close)
+        return ds
+
+    def guess_can_open(self, filename_or_obj):
+        try:
+            return os.path.splitext(os.fspath(filename_or_obj))[1].lower() == '.rma'
+        except TypeError:
+            return False
@@ -17,4 +17,10 @@ setup(name ='pyrma',
       author_email = 'm.deiber@wrl.unsw.edu.au',
       zip_safe=False,
       license="MIT",
-      include_package_data=True)
\ No newline at end of file
+      include_package_data=True,
+      python_requires='>=3.7',
+      extras_require={'xarray': ['xarray', 'dask']},
+      entry_points={
+          'console_scripts': ['pyrma = pyrma.cli:main'],
+          'xarray.backends': ['pyrma = pyrma.xarray_backend:PyrmaBackendEntrypoint'],
+      })
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Shared fixtures of the tests: small synthetic meshes and result files written
+with benchmarks/synthetic.py
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'benchmarks'))
+
+import synthetic
+from pyrma.mesh import Mesh
+
+# a 10 x 10 grid of 20 m x 20 m 8-node quads, without 1D elements
+GRID_NODES = 300
+GRID_SIZE = 200.0
+
+
+@pytest.fixture
+def grid(tmp_path):
+    filename = str(tmp_path / 'grid.rm1')
+    synthetic.write_mesh(filename, num_nodes=GRID_NODES, num_1d=0)
+    return Mesh(filename)
+
+
+@pytest.fixture
+def yearly_results(tmp_path):
+    return synthetic.write_yearly_rma(str(tmp_path / 'results'), 'RMA2', num_nodes=50,
+                                      num_years=2, frames_per_year=40, overlap=2)
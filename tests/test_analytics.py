@@ -0,0 +1,64 @@
+"""
+Exceedance statistics: merging the statistics of consecutive periods
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import numpy as np
+import pytest
+
+import synthetic
+from pyrma.analytics import ExceedanceStats, exceedance
+
+
+def _assert_same(a, b):
+    assert a.hours == b.hours
+    for key, values in a.results().items():
+        np.testing.assert_array_equal(values, b.results()[key], err_msg=key)
+
+
+def test_merge_periods():
+    rng = np.random.default_rng(0)
+    series = rng.random((50, 20))
+    whole = ExceedanceStats(20, 0.3)
+    for values in series:
+        whole.update(values, 0.25)
+    for split in (1, 17, 49):
+        first, second = ExceedanceStats(20, 0.3), ExceedanceStats(20, 0.3)
+        for values in series[:split]:
+            first.update(values, 0.25)
+        for values in series[split:]:
+            second.update(values, 0.25)
+        _assert_same(first.merge(second), whole)
+
+
+def test_merge_always_exceeded():
+    first, second, whole = (ExceedanceStats(1, 0.0) for _ in range(3))
+    for stats, hours in ((first, [1, 1]), (second, [1, 1, 1]), (whole, [1] * 5)):
+        for h in hours:
+            stats.update(np.ones(1), h)
+    merged = first.merge(second)
+    _assert_same(merged, whole)
+    assert merged.events[0] == 1 and merged.longest[0] == 5
+
+
+@pytest.mark.parametrize('stride', [1, 3])
+def test_workers(yearly_results, stride):
+    single = exceedance(yearly_results, 'depth', 0.5, workers=1, stride=stride)
+    parallel = exceedance(yearly_results, 'depth', 0.5, workers=3, stride=stride)
+    _assert_same(single, parallel)
+    # 80 timesteps of 0.25 h, the last one lasting as long as the previous one
+    assert single.hours == 80 * 0.25
+
+
+def test_variable_timestep(tmp_path):
+    # 0.25 h timesteps followed by 1 h timesteps
+    first, second = str(tmp_path / 'a.rma'), str(tmp_path / 'b.rma')
+    synthetic.write_rma(first, 'RMA2', num_nodes=10, num_frames=8, timestep=0.25)
+    synthetic.write_rma(second, 'RMA2', num_nodes=10, num_frames=6, start_hour=2.0, timestep=1.0)
+    stats = exceedance([first, second], 'depth', -1.0)
+    assert stats.hours == 8 * 0.25 + 6 * 1.0
+    np.testing.assert_array_equal(stats.duration, stats.hours)
+    assert exceedance([first, second], 'depth', -1.0, stride=4).hours == stats.hours
+    assert exceedance([first, second], 'depth', -1.0, timestep=0.5).hours == 14 * 0.5
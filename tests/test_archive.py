@@ -0,0 +1,120 @@
+"""
+Round trip of result files through the compressed archive
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import struct
+
+import numpy as np
+import pytest
+
+import synthetic
+from pyrma.archive import RMAArchive, write_archive
+from pyrma.dataset import RMADataset
+from pyrma.processRMA import ProcessRMA
+from pyrma.rma import RMA, open_results
+
+
+@pytest.fixture(params=['RMA2', 'RMA10', 'RMA11'])
+def results(tmp_path, request):
+    filename = str(tmp_path / 'r.rma')
+    synthetic.write_rma(filename, request.param, num_nodes=50, num_frames=30, timestep=0.1)
+    return filename
+
+
+def _frames(R):
+    frames = []
+    while R.next(nodes=[]):
+        frames.append({key: val.copy() for key, val in R.values.items()})
+    R.close()
+    return frames
+
+
+@pytest.mark.parametrize('tolerance', [None, 0.001])
+def test_round_trip(results, tmp_path, tolerance):
+    archive = str(tmp_path / 'r.arc')
+    write_archive(results, archive, time_block=8, node_block=16, tolerance=tolerance)
+    expected = _frames(RMA(results, verbose=False))
+    A = RMAArchive(archive)
+    assert A.num_frames == len(expected)
+    for values, original in zip(_frames(A), expected):
+        for key in original:
+            if tolerance is None:
+                np.testing.assert_array_equal(values[key], original[key])
+            else:
+                np.testing.assert_allclose(values[key], original[key], rtol=0, atol=1.01 * tolerance)
+
+
+def test_node_history(results, tmp_path):
+    archive = str(tmp_path / 'r.arc')
+    write_archive(results, archive, time_block=8, node_block=16)
+    A = RMAArchive(archive)
+    key = A.variables()[0]
+    R = RMA(results, verbose=False)
+    for node in (1, 17, 50):
+        expected = [R.read_variable(k, key, node - 1, node)[0] for k in range(R.num_frames)]
+        np.testing.assert_array_equal(A.node_history(key, node), expected)
+
+
+def test_same_api(results, tmp_path):
+    archive = str(tmp_path / 'r.arc')
+    write_archive(results, archive)
+    R = RMA(results, verbose=False)
+    A = open_results(archive)
+    assert isinstance(A, RMAArchive)
+    np.testing.assert_array_equal(A.frame_dates(), R.frame_dates())
+    assert A.frame_date(3) == R.frame_date(3)
+    with RMADataset([archive]) as a, RMADataset([results]) as r:
+        np.testing.assert_array_equal(a.times, r.times)
+        key = r.variables[0]
+        np.testing.assert_array_equal(a.read_variable(5, key), r.read_variable(5, key))
+
+
+def test_process_archive(tmp_path):
+    filename = str(tmp_path / 'r.rma')
+    synthetic.write_rma(filename, 'RMA2', num_nodes=20, num_frames=10)
+    archive = str(tmp_path / 'r.arc')
+    write_archive(filename, archive)
+    ProcessRMA([filename], [1, 5]).rma2_to_csv(str(tmp_path / 'rma.csv'), ['depth'])
+    ProcessRMA([archive], [1, 5]).rma2_to_csv(str(tmp_path / 'arc.csv'), ['depth'])
+    with open(str(tmp_path / 'rma_depth.csv')) as a, open(str(tmp_path / 'arc_depth.csv')) as b:
+        assert a.read() == b.read()
+
+
+def test_lossless_fallback(tmp_path):
+    filename = str(tmp_path / 'r.rma')
+    synthetic.write_rma(filename, 'RMA2', num_nodes=50, num_frames=20)
+    R = RMA(filename, verbose=False)
+    frame_size = R.frame_size
+    R.close()
+    # NaN and large values in the water surface elevation (after 3 x np velocities)
+    with open(filename, 'r+b') as f:
+        f.seek(1000 + 3 * frame_size + 12 + 4 * 3 * 50)
+        f.write(struct.pack('f', float('nan')))
+        f.seek(1000 + 12 * frame_size + 12 + 4 * 3 * 50 + 40)
+        f.write(struct.pack('f', 3.0e7))
+    archive = str(tmp_path / 'r.arc')
+    write_archive(filename, archive, time_block=8, node_block=16, tolerance=0.001)
+    A = RMAArchive(archive)
+    assert sum(not entry[2] for entry in A.index['chunks'].values()) == 2
+    for values, original in zip(_frames(A), _frames(RMA(filename, verbose=False))):
+        for key in original:
+            np.testing.assert_allclose(values[key], original[key], rtol=0, atol=0.00101)
+
+
+def test_quantised_large_values(tmp_path):
+    # 1000 / (2 x 1e-5) > 2**24: exact in float64, not in float32
+    filename = str(tmp_path / 'r.rma')
+    synthetic.write_rma(filename, 'RMA2', num_nodes=50, num_frames=5)
+    with open(filename, 'r+b') as f:
+        f.seek(1000 + 12 + 4 * 3 * 50)
+        f.write(struct.pack('f', 1000.123))
+    archive = str(tmp_path / 'r.arc')
+    write_archive(filename, archive, tolerance=1e-5)
+    A = RMAArchive(archive)
+    A.next()
+    R = RMA(filename, verbose=False)
+    R.next()
+    np.testing.assert_allclose(A.values['elevation'][0], R.values['elevation'][0], rtol=0, atol=1e-4)
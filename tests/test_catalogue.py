@@ -0,0 +1,31 @@
+"""
+SQLite catalogue of result files
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+from datetime import datetime
+
+import synthetic
+from pyrma.catalogue import RMACatalogue, read_info
+
+
+def test_dates_rounded(tmp_path):
+    synthetic.write_rma(str(tmp_path / 'a.rma'), 'RMA2', num_nodes=20, num_frames=11, timestep=0.1)
+    synthetic.write_rma(str(tmp_path / 'b.rma'), 'RMA11', num_nodes=20, num_frames=10,
+                        start_hour=24.0, timestep=0.1)
+    catalogue = RMACatalogue(str(tmp_path / 'cat.sqlite'))
+    assert catalogue.update(str(tmp_path))['added'] == 2
+    a, b = catalogue.query()
+    assert (a['start'], a['end']) == ('2000-01-01 00:00:00', '2000-01-01 01:00:00')
+    assert b['type'] == 'RMA11'
+    assert [f['start'] for f in catalogue.query(end='2000-01-01')] == [a['start']]
+    assert [f['end'] for f in catalogue.query(start=datetime(2000, 1, 1, 1))] == [a['end'], b['end']]
+    assert [f['type'] for f in catalogue.query(start='2000-01-01 01:00:01')] == ['RMA11']
+    catalogue.close()
+
+
+def test_missing_file(tmp_path):
+    info = read_info(str(tmp_path / 'deleted.rma'))
+    assert info['error'].startswith('FileNotFoundError')
@@ -0,0 +1,85 @@
+"""
+pyrma command line on synthetic result and boundary files
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import json
+import os
+
+import pytest
+
+import synthetic
+from pyrma.cli import main
+
+
+def _read(filename):
+    with open(filename) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('drop_overlap', [False, True])
+def test_export_workers(tmp_path, yearly_results, drop_overlap):
+    options = ['--drop-overlap'] if drop_overlap else []
+    main(['export'] + yearly_results + ['-o', str(tmp_path / 'one' / 'x.csv'), '-v', 'depth', 'xvel']
+         + options)
+    main(['export'] + yearly_results + ['-o', str(tmp_path / 'two' / 'x.csv'), '-v', 'depth', 'xvel',
+                                        '--workers', '2'] + options)
+    for name in ['x_depth.csv', 'x_xvel.csv']:
+        one = _read(str(tmp_path / 'one' / name))
+        assert one == _read(str(tmp_path / 'two' / name))
+        # 80 unique timesteps, plus the 2 repeated at the start of the second year
+        assert len(one.splitlines()) == 1 + (80 if drop_overlap else 82)
+    assert sorted(os.listdir(str(tmp_path / 'two'))) == ['x_depth.csv', 'x_xvel.csv']
+
+
+def test_export_rma11_quiet(tmp_path, capsys):
+    filename = str(tmp_path / 'r.rma')
+    synthetic.write_rma(filename, 'RMA11', num_nodes=10, num_frames=5)
+    capsys.readouterr()
+    main(['export', filename, '-o', str(tmp_path / 'x.csv'), '--nodes', '1', '2'])
+    assert capsys.readouterr().out == ''
+    assert len(_read(str(tmp_path / 'C1_x.csv')).splitlines()) == 6
+
+
+def test_export_rejected_options(tmp_path, yearly_results):
+    for options in (['--format', 'archive', '--drop-overlap'], ['--format', 'store', '--drop-overlap'],
+                    ['--format', 'store', '--workers', '2'], ['--tolerance', '0.01'],
+                    ['--workers', '2', '--period', 'daily']):
+        with pytest.raises(SystemExit, match='not supported'):
+            main(['export'] + yearly_results + ['-o', str(tmp_path / 'x')] + options)
+
+
+def test_stats(tmp_path, yearly_results):
+    output = str(tmp_path / 'stats.csv')
+    main(['stats'] + yearly_results + ['-o', output, '--threshold', '0', '--nodes', '1', '2', '3'])
+    rows = _read(output).splitlines()
+    assert len(rows) == 4
+    assert [row.split(',')[0] for row in rows[1:]] == ['1', '2', '3']
+    with pytest.raises(SystemExit, match='--threshold or --baseline'):
+        main(['stats'] + yearly_results + ['-o', output])
+
+
+def test_info(tmp_path, yearly_results, capsys):
+    capsys.readouterr()
+    main(['info', str(tmp_path / 'results'), '--format', 'json', '--workers', '2'])
+    infos = json.loads(capsys.readouterr().out)
+    assert sorted(i['path'] for i in infos) == sorted(yearly_results)
+    assert all(i['type'] == 'RMA2' and i['num_nodes'] == 50 for i in infos)
+
+    main(['info'] + yearly_results + ['--format', 'csv'])
+    rows = capsys.readouterr().out.splitlines()
+    assert len(rows) == 1 + len(yearly_results)
+    assert rows[0].startswith('path,')
+
+
+def test_bc_elt_files(tmp_path):
+    # several elt files are appended
+    first, second = str(tmp_path / '2000.elt'), str(tmp_path / '2001.elt')
+    synthetic.write_elt(first, elements=(1, 2), year=2000, num_days=2)
+    synthetic.write_elt(second, elements=(1, 2), year=2001, num_days=2)
+    main(['bc', '--elt', first, second, '--format', 'csv', '-o', str(tmp_path / 'out')])
+    rows = _read(str(tmp_path / 'out' / 'flow.csv')).splitlines()
+    assert len(rows) == 1 + 2 * 48
+    assert rows[1].startswith('2000-01-01') and rows[-1].startswith('2001-01-02 23:00')
@@ -0,0 +1,79 @@
+"""
+Scenario versus baseline comparison
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import synthetic
+from pyrma.compare import DifferenceStats, PairedDataset, difference, write_ascii_grid
+from pyrma.dataset import RMADataset
+
+
+@pytest.fixture
+def runs(tmp_path):
+    scenario, baseline = str(tmp_path / 'scenario.rma'), str(tmp_path / 'baseline.rma')
+    synthetic.write_rma(scenario, 'RMA2', num_nodes=20, num_frames=20, seed=1)
+    # starts 1 h later: 16 common timesteps
+    synthetic.write_rma(baseline, 'RMA2', num_nodes=20, num_frames=20, start_hour=1.0, seed=2)
+    return scenario, baseline
+
+
+def test_paired_dataset(runs):
+    scenario, baseline = RMADataset([runs[0]]), RMADataset([runs[1]])
+    with PairedDataset(scenario, baseline) as pair:
+        assert len(pair) == 16
+        assert pair.times[0] == np.datetime64('2000-01-01T01:00')
+        values, base = pair.read(0, 'depth', [3, 7])
+        np.testing.assert_array_equal(values, scenario.read_variable(4, 'depth')[[2, 6]])
+        np.testing.assert_array_equal(base, baseline.read_variable(0, 'depth')[[2, 6]])
+    # the datasets given are left open
+    assert scenario.isel(0)[0] == datetime(2000, 1, 1)
+    scenario.close()
+    baseline.close()
+
+
+def test_difference_stats():
+    stats = DifferenceStats(2, thresholds=[0.5, -0.5])
+    stats.update(datetime(2000, 1, 1), np.array([1.0, -0.2]))
+    stats.update(datetime(2000, 1, 2), np.array([-2.0, -0.6]))
+    stats.update(datetime(2000, 1, 3), np.array([0.6, 0.1]))
+    results = stats.results()
+    np.testing.assert_allclose(results['mean'], [-0.4 / 3, -0.7 / 3])
+    np.testing.assert_array_equal(results['min'], [-2.0, -0.6])
+    np.testing.assert_array_equal(results['max'], [1.0, 0.1])
+    np.testing.assert_array_equal(results['peak'], [-2.0, -0.6])
+    np.testing.assert_array_equal(results['peak_time'], np.array(['2000-01-02', '2000-01-02'], dtype='datetime64[ms]'))
+    np.testing.assert_array_equal(results['exceed_0.5'], [2, 0])
+    np.testing.assert_array_equal(results['exceed_-0.5'], [1, 1])
+
+
+def test_difference(runs, tmp_path):
+    series = str(tmp_path / 'series.csv')
+    stats = difference([runs[0]], [runs[1]], 'depth', nodes=[1, 2], series_output=series,
+                       start=datetime(2000, 1, 1, 2), stride=2)
+    assert stats.count == 6
+    with open(series) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == 'Date,1,2'
+    assert lines[1].startswith('2000-01-01 02:00:00,') and len(lines) == 7
+    same = difference([runs[0]], [runs[0]], 'depth')
+    np.testing.assert_array_equal(same.maximum, 0.0)
+
+
+def test_ascii_grid(tmp_path):
+    filename = str(tmp_path / 'grid.asc')
+    x = np.array([0.5, 1.5, 1.6, 0.5, np.nan])
+    y = np.array([0.5, 0.5, 0.6, 2.5, 0.5])
+    write_ascii_grid(filename, x, y, [1.0, 2.0, 4.0, 5.0, 9.0], 1.0)
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    assert lines[:6] == ['ncols 2', 'nrows 3', 'xllcorner 0.0', 'yllcorner 0.0', 'cellsize 1.0',
+                         'NODATA_value -9999']
+    # rows from north to south
+    assert lines[6:] == ['5 -9999', '-9999 -9999', '1 3']
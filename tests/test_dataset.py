@@ -0,0 +1,41 @@
+"""
+Time axis of RMADataset over yearly result files
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import synthetic
+from pyrma.dataset import RMADataset
+
+
+def test_overlap_removed(yearly_results):
+    with RMADataset(yearly_results) as dataset:
+        assert len(dataset) == 80
+        assert (np.diff(dataset.times) == np.timedelta64(15, 'm')).all()
+
+
+@pytest.mark.parametrize('rma_type', ['RMA2', 'RMA10', 'RMA11'])
+def test_float32_hours(tmp_path, rma_type):
+    filename = str(tmp_path / 'r.rma')
+    synthetic.write_rma(filename, rma_type, num_nodes=20, num_frames=30, timestep=0.1)
+    with RMADataset([filename]) as dataset:
+        assert dataset.times[1] == np.datetime64('2000-01-01T00:06')
+        assert dataset.sel(datetime(2000, 1, 1, 0, 6))[0] == datetime(2000, 1, 1, 0, 6)
+        with pytest.raises(KeyError):
+            dataset.sel(datetime(2000, 1, 1, 0, 7))
+        assert dataset.sel(datetime(2000, 1, 1, 0, 7), method='nearest')[0] == datetime(2000, 1, 1, 0, 6)
+        with pytest.raises(KeyError):
+            dataset.sel(datetime(2000, 1, 1, 0, 7), method='nearest', tolerance=timedelta(seconds=30))
+        with pytest.raises(ValueError):
+            dataset.sel(datetime(2000, 1, 1, 0, 6), method='pad')
+
+
+def test_no_files():
+    with pytest.raises(ValueError):
+        RMADataset([])
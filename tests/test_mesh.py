@@ -0,0 +1,20 @@
+"""
+Sub-meshes of the synthetic grid
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+from pyrma.mesh import Mesh
+
+
+def test_submesh_saved(grid, tmp_path):
+    sub = grid.submesh(grid.select_nodes(bbox=(0.0, 0.0, 60.0, 60.0)))
+    assert len(sub.elements) == 9 and len(sub.nodes) == 40
+    filename = str(tmp_path / 'sub.rm1')
+    sub.save_mesh(filename)
+    saved = Mesh(filename)
+    assert saved.lines[1].split() == ['9', '40']
+    assert saved.elements == sub.elements
+    assert saved.nodes == sub.nodes
+    assert saved.lines[saved.end_nodeSection:] == ['      9999\n']
@@ -0,0 +1,50 @@
+"""
+Node-major store of result files
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import os
+from datetime import datetime
+
+import numpy as np
+
+from pyrma import derived
+from pyrma.dataset import RMADataset
+from pyrma.nodestore import NodeStore
+
+
+def test_round_trip(yearly_results, tmp_path):
+    path = str(tmp_path / 'store')
+    store = NodeStore(path)
+    assert store.append(yearly_results[:1], time_block=16) == 40
+    # the timesteps repeated at the start of the second year are skipped
+    assert store.append(yearly_results, time_block=16) == 40
+    assert store.append(yearly_results) == 0
+    assert len(store.segments) == 2
+
+    with RMADataset(yearly_results) as dataset:
+        depth = np.array([dataset.read_variable(k, 'depth') for k in range(len(dataset))])
+        speed = np.array([derived.evaluate('speed', values) for _, values in dataset.isel(slice(None))])
+        times = dataset.times
+
+    for s in (store, NodeStore(path)):
+        np.testing.assert_array_equal(s.times, times)
+        dates, values = s.history('depth', [1, 50])
+        np.testing.assert_array_equal(values, depth[:, [0, 49]].T)
+        dates, values = s.history('speed', 7)
+        np.testing.assert_allclose(values, speed[:, 6], rtol=1e-6)
+
+    start, end = datetime(2000, 1, 1, 9), datetime(2000, 1, 1, 11)
+    dates, values = store.history('depth', 3, start, end)
+    keep = (times >= np.datetime64(start)) & (times <= np.datetime64(end))
+    np.testing.assert_array_equal(dates, times[keep])
+    np.testing.assert_array_equal(values, depth[keep, 2])
+
+    store.compact(node_block=16)
+    assert len(store.segments) == 1
+    assert len(os.listdir(path)) == len(store.variables) + 2
+    compacted = NodeStore(path)
+    np.testing.assert_array_equal(compacted.times, times)
+    np.testing.assert_array_equal(compacted.history('depth', [1, 50])[1], depth[:, [0, 49]].T)
@@ -0,0 +1,57 @@
+"""
+Element and zone operators of the synthetic grid
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import numpy as np
+import pytest
+
+import synthetic
+from pyrma.mesh import Mesh
+
+from conftest import GRID_SIZE
+
+WEIGHTINGS = ['uniform', 'corner', 'quadratic', (1.0, 2.0)]
+
+
+@pytest.mark.parametrize('weighting', WEIGHTINGS)
+def test_element_operator_constant(grid, weighting):
+    operator = grid.element_operator(weighting)
+    values = operator.apply(np.full(len(grid.nodes), 2.5))
+    assert len(values) == len(grid.elements_2D)
+    np.testing.assert_allclose(values, 2.5)
+
+
+def test_element_areas(grid):
+    np.testing.assert_allclose(grid.element_areas(), 400.0)
+
+
+@pytest.mark.parametrize('weighting', WEIGHTINGS)
+def test_zone_area(grid, weighting):
+    ones = np.ones(len(grid.nodes))
+    total = grid.zone_operator(weighting=weighting, total=True).apply(ones)
+    assert total.sum() == pytest.approx(GRID_SIZE * GRID_SIZE)
+    mean = grid.zone_operator(weighting=weighting).apply(ones)
+    np.testing.assert_allclose(mean, 1.0)
+
+
+def test_zones(grid):
+    half = len(grid.elements_2D) // 2
+    zones = {'a': grid.elements_2D[:half], 'b': grid.elements_2D[half:]}
+    operator = grid.zone_operator(zones, total=True)
+    assert operator.labels == ['a', 'b']
+    np.testing.assert_allclose(operator.apply(np.ones(len(grid.nodes))),
+                               [half * 400.0, (len(grid.elements_2D) - half) * 400.0])
+
+
+def test_zone_without_2d_elements(tmp_path):
+    filename = str(tmp_path / 'mesh.rm1')
+    synthetic.write_mesh(filename, num_nodes=30, num_1d=3)
+    mesh = Mesh(filename)
+    operator = mesh.zone_operator({'mixed': mesh.elements_2D[:2] + mesh.elements_1D}, total=True)
+    assert operator.apply(np.ones(len(mesh.nodes)))[0] == pytest.approx(800.0)
+    for zone in ([], mesh.elements_1D):
+        with pytest.raises(ValueError):
+            mesh.zone_operator({'empty': zone})
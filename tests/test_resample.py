@@ -0,0 +1,21 @@
+"""
+Period statistics of result files
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import synthetic
+from pyrma.processRMA import ProcessRMA
+
+
+def test_float32_period_boundary(tmp_path):
+    # hours stored as 0.999999 (00:59:59.996) belong to the 01:00 period
+    filename = str(tmp_path / 'r.rma')
+    synthetic.write_rma(filename, 'RMA2', num_nodes=10, num_frames=3, start_hour=1 - 1e-6, timestep=1.0)
+    ProcessRMA([filename], [1, 2]).resample_to_csv(str(tmp_path / 'r.csv'), ['depth'], 'hourly', ['count'])
+    with open(str(tmp_path / 'r_depth_hourly_count.csv')) as f:
+        rows = f.read().splitlines()[1:]
+    assert [row.split(',')[0] for row in rows] == ['2000-01-01 01:00:00', '2000-01-01 02:00:00',
+                                                   '2000-01-01 03:00:00']
+    assert all(row.split(',')[1:] == ['1', '1'] for row in rows)
@@ -0,0 +1,77 @@
+"""
+Resampling and ensembles of the elt and wqg boundary files
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import synthetic
+from pyrma.rma_bc import RMA_bc
+
+
+def _bc(tmp_path, num_days=2, step_hours=1):
+    bc = RMA_bc()
+    synthetic.write_elt(str(tmp_path / 'bc.elt'), elements=(1, 2), num_days=num_days, step_hours=step_hours)
+    synthetic.write_wqg(str(tmp_path / 'bc.wqg'), elements=(1, 2), num_days=num_days, step_hours=step_hours)
+    bc.read_elts([str(tmp_path / 'bc.elt')])
+    bc.read_wqgs([str(tmp_path / 'bc.wqg')], ['SALIN', 'TEMP'])
+    return bc
+
+
+def test_resample_limit_and_fill():
+    # element 1 from 02:00 with a 5 h gap, element 2 until 06:00
+    index = pd.date_range('2000-01-01 00:00', periods=12, freq='1h')
+    df = pd.DataFrame({1: np.nan, 2: np.nan}, index=index)
+    df.loc[index[[2, 3, 9, 11]], 1] = [1.0, 2.0, 3.0, 4.0]
+    df.loc[index[[0, 6]], 2] = [5.0, 6.0]
+    bc = RMA_bc()
+    bc.update_elts(df.dropna(how='all'))
+    bc.resample('1h', limit=2, fill=-1.0)
+    assert len(bc.df.index) == 12
+    # edges filled with the value, the records kept
+    assert list(bc.df[1].iloc[:4]) == [-1.0, -1.0, 1.0, 2.0]
+    assert list(bc.df[1].iloc[9:]) == [3.0, 3.5, 4.0]
+    # only 2 values of the 5 h gap are interpolated
+    assert bc.df[1].iloc[4:6].notna().all()
+    assert bc.df[1].iloc[6:9].isna().all()
+    assert bc.df[2].iloc[0] == 5.0 and bc.df[2].iloc[6] == 6.0
+    assert (bc.df[2].iloc[7:] == -1.0).all()
+
+    bc.update_elts(df.dropna(how='all'))
+    bc.resample('1h', limit=2, fill='nearest')
+    assert list(bc.df[1].iloc[:2]) == [1.0, 1.0]
+    assert list(bc.df[2].iloc[6:]) == [6.0] * 6
+    assert bc.df[1].iloc[6:9].isna().all()
+
+
+def test_create_ensemble(tmp_path):
+    bc = _bc(tmp_path, step_hours=3)
+    bc.resample('1h')
+    folders = bc.create_ensemble(2, str(tmp_path / 'ensemble'), scale=(0.5, 1.5), noise=0.1, seed=1)
+    assert [os.path.basename(folder) for folder in folders] == ['member_001', 'member_002']
+    members = []
+    for folder in folders:
+        assert sorted(os.listdir(folder)) == ['2000.elt', '2000.wqg']
+        member = RMA_bc()
+        member.read_elts([os.path.join(folder, '2000.elt')])
+        assert member.df.shape == bc.df.shape
+        assert (member.df.to_numpy() > 0).all()
+        members.append(member.df.to_numpy())
+    assert not np.allclose(members[0], members[1])
+    assert not np.allclose(members[0], bc.df.to_numpy(), rtol=0.01)
+
+    # the same seed gives the same members, limited to the selected elements
+    again = bc.create_ensemble(1, str(tmp_path / 'again'), scale=(0.5, 1.5), noise=0.1, seed=1)
+    member = RMA_bc()
+    member.read_elts([os.path.join(again[0], '2000.elt')])
+    np.testing.assert_allclose(member.df.to_numpy(), members[0])
+    only = bc.create_ensemble(1, str(tmp_path / 'only'), scale=(0.5, 1.5), seed=1, elements=[2], wqgs=False)
+    member = RMA_bc()
+    member.read_elts([os.path.join(only[0], '2000.elt')])
+    assert os.listdir(only[0]) == ['2000.elt']
+    np.testing.assert_allclose(member.df[1].to_numpy(), bc.df[1].to_numpy(), atol=0.5)
@@ -0,0 +1,48 @@
+"""
+Discharge through cross-sections of the synthetic grid
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import numpy as np
+import pytest
+
+from pyrma.section import CrossSection, SectionSet
+
+from conftest import GRID_SIZE
+
+
+def test_uniform_discharge(grid):
+    n = len(grid.nodes)
+    qx, qy = np.ones(n), np.zeros(n)
+    # across the whole grid, from the bottom to the top: +x is on the right
+    section = CrossSection(grid, [(45.0, -10.0), (45.0, GRID_SIZE + 10.0)])
+    assert section.apply(qx, qy) == pytest.approx(GRID_SIZE)
+    reverse = CrossSection(grid, [(45.0, GRID_SIZE + 10.0), (45.0, -10.0)])
+    assert reverse.apply(qx, qy) == pytest.approx(-GRID_SIZE)
+
+
+def test_flow_along_section(grid):
+    n = len(grid.nodes)
+    section = CrossSection(grid, [(45.0, -10.0), (45.0, GRID_SIZE + 10.0)])
+    assert section.apply(np.zeros(n), np.ones(n)) == pytest.approx(0.0)
+
+
+def test_section_set(grid):
+    n = len(grid.nodes)
+    qx, qy = np.ones(n), np.full(n, 0.5)
+    sections = [CrossSection(grid, [(45.0, -10.0), (45.0, GRID_SIZE + 10.0)]),
+                CrossSection(grid, [(-10.0, 75.0), (GRID_SIZE + 10.0, 75.0)])]
+    expected = [s.apply(qx, qy) for s in sections]
+    np.testing.assert_allclose(SectionSet(sections).apply(qx, qy), expected)
+    assert expected[1] == pytest.approx(-0.5 * GRID_SIZE)
+
+
+def test_interpolation_weights(grid):
+    weights = grid.interpolation_weights(45.0, 75.0)
+    assert len(weights) == 8
+    assert sum(weights.values()) == pytest.approx(1.0)
+    node = grid.xy_to_node(40.0, 60.0)
+    assert grid.interpolation_weights(40.0, 60.0) == {node: 1.0}
+    assert grid.interpolation_weights(-50.0, 75.0) == {}
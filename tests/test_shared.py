@@ -0,0 +1,55 @@
+"""
+Arrays shared with the workers of fork and spawn process pools
+
+"""
+
+#Authors: Mathieu Deiber <m.deiber@wrl.unsw.edu.au>
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from pyrma.dataset import RMADataset
+from pyrma.shared import share_frames, share_mesh
+
+METHODS = [m for m in ('fork', 'spawn') if m in multiprocessing.get_all_start_methods()]
+
+
+def _sums(shared, name, rows):
+    arrays = shared.attach()
+    try:
+        return [float(arrays[name][r].sum()) for r in rows]
+    finally:
+        shared.close()
+
+
+def _write(shared, row):
+    arrays = shared.attach()
+    arrays['values'][row] = row
+    shared.close()
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_mesh(grid, method):
+    connectivity = grid.to_arrays()['connectivity']
+    with share_mesh(grid) as shared:
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context(method)) as executor:
+            sums = list(executor.map(_sums, [shared] * 2, ['connectivity'] * 2, [[0, 1], [99]]))
+    assert sums == [[connectivity[0].sum(), connectivity[1].sum()], [connectivity[99].sum()]]
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_frames(yearly_results, method):
+    with RMADataset(yearly_results) as dataset, share_frames(dataset, 'depth', range(10), [1, 5]) as shared:
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context(method)) as executor:
+            sums = list(executor.map(_sums, [shared] * 2, ['values'] * 2, [range(5), range(5, 10)]))
+        expected = [float(dataset.read_variable(k, 'depth')[[0, 4]].sum()) for k in range(10)]
+        np.testing.assert_allclose(sums[0] + sums[1], expected, rtol=1e-6)
+        np.testing.assert_array_equal(shared.attach()['times'], dataset.times[:10])
+        # the workers write into the parent's memory
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context(method)) as executor:
+            list(executor.map(_write, [shared] * 10, range(10)))
+        np.testing.assert_array_equal(shared.attach()['values'][:, 0], np.arange(10))
+        shared.close()